@@ -3,7 +3,12 @@ from sqlalchemy.orm import Session
 from ....db.session import get_db
 from ....services.prompt_manager import get_prompt_manager
 from ....models.models import AgentType
+from ....services.agents.registry import agent_registry
+from ....services.agent_repository import agent_repository
+from ....utils.cost_management import get_cost_manager
 from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -16,22 +21,24 @@ class CreateAgentRequest(BaseModel):
 class UpdatePromptRequest(BaseModel):
     prompt: str
 
-from ....services.dynamodb_service import dynamodb_service
-
 @router.post("/")
 def create_agent(request: CreateAgentRequest, db: Session = Depends(get_db)):
-    import uuid
-    agent_id = str(uuid.uuid4())
-    agent_data = {
-        "agent_id": agent_id,
-        "name": request.name,
-        "type": request.type.value,
-        "system_prompt": request.system_prompt,
-        "config": request.config or {}
-    }
-    dynamodb_service.save_agent(agent_data)
+    # Written to the configured AGENT_STORE, the same store agents are loaded from
+    agent_id = get_prompt_manager(db).create_agent(request.name, request.type, request.system_prompt, request.config)
     return {"agent_id": agent_id}
 
+@router.get("/")
+def get_agents(ids: str):
+    """Fetch several agents (comma-separated ids) with one batch read for those not cached."""
+    records = agent_repository.get_many(agent_id.strip() for agent_id in ids.split(",") if agent_id.strip())
+    return {"agents": list(records.values())}
+
+@router.put("/{agent_id}/prompt")
+def update_agent_prompt(agent_id: str, request: UpdatePromptRequest, db: Session = Depends(get_db)):
+    if not get_prompt_manager(db).update_agent_prompt(agent_id, request.prompt):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {"message": "Prompt updated successfully"}
+
 class CreateToolRequest(BaseModel):
     name: str
     description: str
@@ -56,12 +63,30 @@ def create_tool(request: CreateToolRequest, db: Session = Depends(get_db)):
 
 @router.post("/{agent_id}/tools/{tool_id}")
 def assign_tool_to_agent(agent_id: str, tool_id: str, db: Session = Depends(get_db)):
-    from ....models.models import Agent, Tool
-    agent = db.query(Agent).filter(Agent.id == agent_id).first()
+    from ....models.models import Tool
     tool = db.query(Tool).filter(Tool.id == tool_id).first()
-    if not agent or not tool:
+    # Write-through: the store, the repository cache and the compiled agent are all updated
+    if not tool or not agent_repository.assign_tool(agent_id, tool_id):
         raise HTTPException(status_code=404, detail="Agent or Tool not found")
-    
-    agent.tools.append(tool)
-    db.commit()
     return {"message": "Tool assigned successfully"}
+
+@router.get("/registry/stats")
+def get_registry_stats():
+    return agent_registry.stats()
+
+@router.get("/repository/stats")
+def get_repository_stats():
+    return agent_repository.stats()
+
+@router.get("/{agent_id}/usage")
+def get_agent_usage(agent_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    db: Session = Depends(get_db)):
+    """Requests, tokens, cost and latency of the agent's runs in [start, end)."""
+    return get_cost_manager(db).get_usage_metrics(agent_id, start, end)
+
+@router.get("/{agent_id}")
+def get_agent(agent_id: str):
+    record = agent_repository.get(agent_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return record
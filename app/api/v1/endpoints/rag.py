@@ -1,9 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ....db.session import get_db
-from ....services.agents.super_agent import SuperAgent
-from ....services.memory_service import get_memory_service
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ....db.session import get_async_db
+from ....services.agents.super_agent import aget_super_agent
+from ....services.memory_service import get_memory_service, hot_memory, memory_writer
+from ....utils.caching import cache_service
+from ....services.embedding_service import embedding_service
+from ....services.reranker import reranker
+from ....services.agents.sub_agents import expansion_cache
+from ....services.tool_sandbox import tool_workers
+from ....utils.tool_cache import tool_result_cache
+from ....utils.usage import execution_log_writer
 from pydantic import BaseModel
+import json
 
 router = APIRouter()
 
@@ -13,8 +22,8 @@ class RAGRequest(BaseModel):
     agent_id: str
 
 @router.post("/query")
-async def execute_rag_query(request: RAGRequest, db: Session = Depends(get_db)):
-    super_agent = SuperAgent(db, request.agent_id)
+async def execute_rag_query(request: RAGRequest, db: AsyncSession = Depends(get_async_db)):
+    super_agent = await aget_super_agent(db, request.agent_id)
     try:
         result = await super_agent.execute(
             session_id=request.session_id,
@@ -23,8 +32,52 @@ async def execute_rag_query(request: RAGRequest, db: Session = Depends(get_db)):
         )
         return {
             "query": request.query,
-            "response": result["messages"][-1].content,
-            "context": result["context"]
+            "response": result["answer"],
+            "context": result["context"],
+            "usage": result["usage"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+STREAM_FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+def _format_event(event: str, data: dict, fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps({"event": event, "data": data}, default=str) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/query/stream")
+async def stream_rag_query(request: RAGRequest, format: str = "sse", db: AsyncSession = Depends(get_async_db)):
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {format}")
+    super_agent = await aget_super_agent(db, request.agent_id)
+
+    async def events():
+        async for event, data in super_agent.astream(
+            session_id=request.session_id,
+            agent_id=request.agent_id,
+            query=request.query
+        ):
+            yield _format_event(event, data, format)
+
+    return StreamingResponse(
+        events(),
+        media_type=STREAM_FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    return {
+        "semantic": cache_service.semantic.stats(),
+        "embedding": embedding_service.stats(),
+        "reranker": reranker.stats(),
+        "expansion": expansion_cache.stats(),
+        "memory": {"writer": memory_writer.stats(), "hot": hot_memory.stats()},
+        "tools": tool_workers.stats(),
+        "tool_results": tool_result_cache.stats(),
+        "execution_logs": execution_log_writer.stats()
+    }
@@ -0,0 +1,120 @@
+import asyncio
+import inspect
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+class LazyService:
+    """
+    Stand-in for a service singleton that builds the real object on first
+    attribute access. Modules keep exporting e.g. `bedrock_service`, so callers
+    don't change, but importing a module no longer opens connections.
+
+    Only underscore attributes live on the proxy itself, so service methods
+    such as `get` are always forwarded.
+    """
+    __slots__ = ("_name", "_factory", "_probe", "_instance", "_lock")
+
+    def __init__(self, name: str, factory: Callable[[], Any], probe: Optional[Callable[[Any], Any]] = None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_probe", probe)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def __getattr__(self, item):
+        return getattr(self._resolve(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._resolve(), key, value)
+
+    def __repr__(self):
+        state = "ready" if self._instance is not None else "lazy"
+        return f"<LazyService {self._name} ({state})>"
+
+class ServiceRegistry:
+    """Lazily built process singletons, with parallel warm-up and readiness probes."""
+    def __init__(self):
+        self._services: Dict[str, LazyService] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], probe: Optional[Callable[[Any], Any]] = None) -> LazyService:
+        """Register a factory and return its lazy proxy. `probe(instance)` may be sync or async."""
+        service = LazyService(name, factory, probe)
+        self._services[name] = service
+        return service
+
+    def names(self):
+        return list(self._services)
+
+    def is_initialized(self, name: str) -> bool:
+        return self._services[name]._instance is not None
+
+    def instance(self, name: str):
+        return self._services[name]._resolve()
+
+    def reset(self, name: str):
+        """Forget a built instance (tests, or after a fatal backend error)."""
+        object.__setattr__(self._services[name], "_instance", None)
+
+    async def warm_up(self, names: Iterable[str] = None, timeout: float = None) -> Dict[str, Optional[str]]:
+        """
+        Build services concurrently in threads. Returns name -> error (None if it
+        built). Services still building after `timeout` keep going in the
+        background and are reported as timed out.
+        """
+        names = list(names) if names is not None else self.names()
+        if timeout is None:
+            timeout = float(os.getenv("WARMUP_TIMEOUT", "10.0"))
+
+        async def build(name: str):
+            try:
+                await asyncio.to_thread(self.instance, name)
+                return None
+            except Exception as e:
+                return str(e) or type(e).__name__
+
+        tasks = {name: asyncio.ensure_future(build(name)) for name in names}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+        return {
+            name: task.result() if task.done() else f"timed out after {timeout}s"
+            for name, task in tasks.items()
+        }
+
+    async def readiness(self, timeout: float = None) -> Dict[str, Dict[str, Any]]:
+        """Build each service if needed and run its probe, all in parallel."""
+        if timeout is None:
+            timeout = float(os.getenv("READINESS_TIMEOUT", "2.0"))
+
+        async def check(name: str):
+            service = self._services[name]
+            start = time.perf_counter()
+            try:
+                instance = await asyncio.wait_for(asyncio.to_thread(service._resolve), timeout)
+                if service._probe is not None:
+                    if inspect.iscoroutinefunction(service._probe):
+                        await asyncio.wait_for(service._probe(instance), timeout)
+                    else:
+                        await asyncio.wait_for(asyncio.to_thread(service._probe, instance), timeout)
+                status = {"ready": True}
+            except Exception as e:
+                status = {"ready": False, "error": str(e) or type(e).__name__}
+            status["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return status
+
+        names = self.names()
+        results = await asyncio.gather(*(check(name) for name in names))
+        return dict(zip(names, results))
+
+service_registry = ServiceRegistry()
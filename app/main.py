@@ -1,18 +1,102 @@
+from contextlib import asynccontextmanager
+import asyncio
+import os
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import text
 from .api.v1.api import api_router
-from .db.session import engine
+from .core.providers import service_registry
+from .db.session import engine, async_engine
+from .utils.logging import cloudwatch_logger
 from .models import models
+from .utils.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from .utils.profiling import ProfilerMiddleware
 
-models.Base.metadata.create_all(bind=engine)
+def init_database():
+    if os.getenv("DB_CREATE_ALL", "true").lower() == "true":
+        models.Base.metadata.create_all(bind=engine)
+    return engine
+
+async def _probe_database(_):
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+service_registry.register("database", init_database, probe=_probe_database)
+# Statement timings for /metrics; the async engine runs its statements on a sync engine underneath.
+# Engine events cost SQLAlchemy ~15us per statement, hence the switch.
+if os.getenv("METRICS_DB_STATEMENTS", "true").lower() == "true":
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
+async def _purge_memories(interval: float):
+    """Periodically delete expired TEMP/SHORT_TERM memories in small chunks."""
+    from .services.memory_service import run_purge
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await asyncio.to_thread(run_purge)
+            if deleted:
+                cloudwatch_logger.log(f"Purged {deleted} expired memories", level="INFO")
+        except Exception as e:
+            cloudwatch_logger.log(f"Memory purge failed: {str(e)}", level="ERROR")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build services in parallel at startup instead of at import. A backend that
+    # is down doesn't stop the app from starting; /health/ready reports it.
+    warm_up = os.getenv("WARMUP_SERVICES", "all")
+    if warm_up != "none":
+        names = None if warm_up == "all" else [name.strip() for name in warm_up.split(",")]
+        app.state.warm_up_errors = {
+            name: error for name, error in (await service_registry.warm_up(names)).items() if error
+        }
+    purge_interval = float(os.getenv("MEMORY_PURGE_INTERVAL", "300"))
+    purge = asyncio.create_task(_purge_memories(purge_interval)) if purge_interval > 0 else None
+    yield
+    if purge is not None:
+        purge.cancel()
+    if service_registry.is_initialized("memory_writer"):
+        service_registry.instance("memory_writer").flush()
+    if service_registry.is_initialized("execution_log_writer"):
+        service_registry.instance("execution_log_writer").flush()
+    if service_registry.is_initialized("cloudwatch_logger"):
+        service_registry.instance("cloudwatch_logger").flush()
+    if service_registry.is_initialized("search"):
+        service_registry.instance("search").close()
+    if service_registry.is_initialized("embedding"):
+        service_registry.instance("embedding").close()
+    if service_registry.is_initialized("tool_workers"):
+        service_registry.instance("tool_workers").close()
 
 app = FastAPI(
     title="LLM Ops RAG API",
     description="End-to-End RAG Pipeline with Multi-Agent Orchestration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.include_router(api_router, prefix="/api/v1")
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilerMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the LLM Ops RAG API"}
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    services = await service_registry.readiness()
+    ready = all(status["ready"] for status in services.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "degraded", "services": services}
+    )
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Enum, Text, Index, UniqueConstraint, Float
 from sqlalchemy.orm import relationship
-from .session import Base
+from ..db.session import Base
 import datetime
 import enum
 
@@ -55,20 +55,46 @@ class ExecutionLog(Base):
     __tablename__ = "execution_logs"
 
     id = Column(String, primary_key=True, index=True)
-    agent_id = Column(String, ForeignKey("agents.id"))
+    # Not a foreign key: agents may live in DynamoDB (AGENT_STORE), and expired agents are deleted while their logs stay
+    agent_id = Column(String)
+    session_id = Column(String)
     query = Column(Text)
     response = Column(Text)
-    plan = Column(JSON) # Agent's plan
-    metrics = Column(JSON) # Latency, tokens, cost
+    plan = Column(JSON) # Tool calls made, one list of names per planning round
+    metrics = Column(JSON) # Per-node and per-LLM-call tokens, latency and cost
     trace_id = Column(String) # LangSmith trace ID
+    status = Column(String(16)) # ok | error
+    input_tokens = Column(Integer)
+    output_tokens = Column(Integer)
+    cost_usd = Column(Float)
+    latency_ms = Column(Float)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # get_usage_metrics: equality on agent, range on time. On PostgreSQL the
+        # aggregated columns ride along in the index, so the query never touches the heap.
+        Index("ix_execution_logs_agent_created", "agent_id", "created_at",
+              postgresql_include=["status", "input_tokens", "output_tokens", "cost_usd", "latency_ms"]),
+    )
+
 class Memory(Base):
     __tablename__ = "memories"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, index=True)
+    # Indexed through the (session_id, tier, expires_at) prefix below
+    session_id = Column(String)
     tier = Column(Enum(MemoryTier))
     content = Column(JSON) # {query: ..., response: ...}
+    content_hash = Column(String(64)) # sha256 of the canonical JSON content
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     expires_at = Column(DateTime)
+    promoted_at = Column(DateTime) # Set on source rows once promoted
+
+    __table_args__ = (
+        # One copy of a content per session and tier; promotion and batch inserts skip duplicates
+        UniqueConstraint("session_id", "tier", "content_hash", name="uq_memories_session_tier_hash"),
+        # get_memories: equality on session/tier, range on expiry
+        Index("ix_memories_session_tier_expires", "session_id", "tier", "expires_at"),
+        # purge_expired scans by expiry alone
+        Index("ix_memories_expires_at", "expires_at"),
+    )
@@ -0,0 +1,294 @@
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from ..core.providers import service_registry
+from ..models.models import Agent, AgentType, Tool
+from .agents.registry import agent_registry
+
+load_dotenv()
+
+# Agent fields besides agent_id; records are plain dicts so both stores and the cache share one shape
+AGENT_FIELDS = ("name", "type", "system_prompt", "config", "tool_ids", "created_at", "expires_at")
+SQL_BATCH_SIZE = 500
+
+def agent_record(agent_id: str, name: str, agent_type: str, system_prompt: str = "", config: Dict[str, Any] = None,
+                 tool_ids: List[str] = None, created_at: str = None, expires_at: str = None) -> Dict[str, Any]:
+    return {
+        "agent_id": agent_id,
+        "name": name,
+        "type": agent_type.value if isinstance(agent_type, AgentType) else agent_type,
+        "system_prompt": system_prompt,
+        "config": config or {},
+        # Sorted: the SQL join table has no order, and every store and worker should agree
+        "tool_ids": sorted(set(tool_ids or [])),
+        "created_at": created_at or datetime.datetime.utcnow().isoformat(),
+        "expires_at": expires_at
+    }
+
+def _isoformat(value: Optional[datetime.datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+class SQLAgentStore:
+    """Agents in the relational `agents` table (PostgreSQL, or SQLite locally); tool ids come from agent_tools."""
+    def __init__(self, session_factory: Callable[[], Session] = None):
+        if session_factory is None:
+            from ..db.session import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _record(agent: Agent) -> Dict[str, Any]:
+        return agent_record(
+            agent.id, agent.name, agent.type, agent.system_prompt, agent.config,
+            [tool.id for tool in agent.tools], _isoformat(agent.created_at), _isoformat(agent.expires_at)
+        )
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        return self.batch_get([agent_id]).get(agent_id)
+
+    def batch_get(self, agent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One IN query (plus one for tools) per SQL_BATCH_SIZE ids."""
+        records = {}
+        with self.session_factory() as db:
+            for start in range(0, len(agent_ids), SQL_BATCH_SIZE):
+                statement = (
+                    select(Agent).options(selectinload(Agent.tools))
+                    .where(Agent.id.in_(agent_ids[start:start + SQL_BATCH_SIZE]))
+                )
+                for agent in db.execute(statement).scalars():
+                    records[agent.id] = self._record(agent)
+        return records
+
+    def put(self, record: Dict[str, Any]):
+        with self.session_factory() as db:
+            agent = db.get(Agent, record["agent_id"], options=[selectinload(Agent.tools)])
+            if agent is None:
+                agent = Agent(id=record["agent_id"])
+                db.add(agent)
+            agent.name = record["name"]
+            agent.type = AgentType(record["type"])
+            agent.system_prompt = record["system_prompt"]
+            agent.config = record["config"]
+            agent.created_at = datetime.datetime.fromisoformat(record["created_at"]) if record.get("created_at") else None
+            agent.expires_at = datetime.datetime.fromisoformat(record["expires_at"]) if record.get("expires_at") else None
+            if sorted(tool.id for tool in agent.tools) != record["tool_ids"]:
+                tools = {tool.id: tool for tool in db.execute(select(Tool).where(Tool.id.in_(record["tool_ids"]))).scalars()}
+                agent.tools = [tools[tool_id] for tool_id in record["tool_ids"] if tool_id in tools]
+            db.commit()
+
+    def delete(self, agent_id: str):
+        with self.session_factory() as db:
+            agent = db.get(Agent, agent_id)
+            if agent is not None:
+                db.delete(agent)
+                db.commit()
+
+def _to_dynamo(value: Any) -> Any:
+    # boto3 rejects floats; DynamoDB numbers go in as Decimal
+    return json.loads(json.dumps(value), parse_float=Decimal)
+
+def _from_dynamo(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: _from_dynamo(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_dynamo(item) for item in value]
+    return value
+
+class DynamoAgentStore:
+    """Agents as items of the DynamoDB agents table, one item per agent keyed by agent_id."""
+    def __init__(self, service=None):
+        if service is None:
+            from .dynamodb_service import dynamodb_service
+            service = dynamodb_service
+        self.service = service
+
+    @staticmethod
+    def _record(item: Dict[str, Any]) -> Dict[str, Any]:
+        item = _from_dynamo(item)
+        return agent_record(
+            item["agent_id"], item.get("name"), item.get("type"), item.get("system_prompt", ""), item.get("config"),
+            item.get("tool_ids"), item.get("created_at"), item.get("expires_at")
+        )
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        item = self.service.get_agent(agent_id)
+        return self._record(item) if item else None
+
+    def batch_get(self, agent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {item["agent_id"]: self._record(item) for item in self.service.batch_get_agents(agent_ids)}
+
+    def put(self, record: Dict[str, Any]):
+        self.service.save_agent(_to_dynamo({key: value for key, value in record.items() if value is not None}))
+
+    def delete(self, agent_id: str):
+        self.service.delete_agent(agent_id)
+
+class AgentRepository:
+    """
+    The one place agent metadata is read and written, in front of either
+    store (AGENT_STORE=postgres|dynamodb).
+
+    Reads go through a process-wide LRU + TTL cache; `get_many` serves what
+    it can from the cache and loads the rest with one batch read. Writes go
+    to the store first, then replace the cached record and invalidate the
+    compiled agent in `agent_registry`. The TTL bounds staleness for writes
+    made by other worker processes. Returned records are shared: don't
+    mutate them.
+    """
+    def __init__(self, store, max_size: int = None, ttl: float = None):
+        self.store = store
+        self.max_size = max_size or int(os.getenv("AGENT_CACHE_MAX_SIZE", "10000"))
+        self.ttl = float(os.getenv("AGENT_CACHE_TTL", "60")) if ttl is None else ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.store_reads = 0
+        self.evictions = 0
+
+    def _cached(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(agent_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[agent_id]
+            self.misses += 1
+            return None
+
+    def _remember(self, record: Dict[str, Any]):
+        with self._lock:
+            self._entries[record["agent_id"]] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(record["agent_id"])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _load(self, agent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        self.store_reads += 1
+        if len(agent_ids) == 1:
+            record = self.store.get(agent_ids[0])
+            records = {agent_ids[0]: record} if record else {}
+        else:
+            records = self.store.batch_get(agent_ids)
+        for record in records.values():
+            self._remember(record)
+        return records
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        record = self._cached(agent_id)
+        if record is None:
+            record = self._load([agent_id]).get(agent_id)
+        return record
+
+    async def aget(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """`get` for the event loop: cache hits stay on the loop, store reads go to a thread."""
+        record = self._cached(agent_id)
+        if record is None:
+            record = (await asyncio.to_thread(self._load, [agent_id])).get(agent_id)
+        return record
+
+    def _split(self, agent_ids: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        found, missing = {}, []
+        for agent_id in dict.fromkeys(agent_ids):
+            record = self._cached(agent_id)
+            if record is not None:
+                found[agent_id] = record
+            else:
+                missing.append(agent_id)
+        return found, missing
+
+    def get_many(self, agent_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """agent_id -> record for the agents that exist; cache misses are loaded with one batch read."""
+        found, missing = self._split(agent_ids)
+        if missing:
+            found.update(self._load(missing))
+        return found
+
+    async def aget_many(self, agent_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found, missing = self._split(agent_ids)
+        if missing:
+            found.update(await asyncio.to_thread(self._load, missing))
+        return found
+
+    def save(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Write-through: store, then cache, then drop compiled builds of the agent."""
+        record = {**record, "tool_ids": sorted(set(record.get("tool_ids") or []))}
+        self.store.put(record)
+        self._remember(record)
+        agent_registry.invalidate(record["agent_id"])
+        return record
+
+    def create(self, name: str, agent_type, system_prompt: str, config: Dict[str, Any] = None,
+               tool_ids: List[str] = None, expires_at: datetime.datetime = None) -> Dict[str, Any]:
+        return self.save(agent_record(
+            str(uuid.uuid4()), name, agent_type, system_prompt, config, tool_ids, expires_at=_isoformat(expires_at)
+        ))
+
+    def update(self, agent_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Change some fields; read from the store, not the cache, so a stale copy can't undo another write."""
+        self.store_reads += 1
+        record = self.store.get(agent_id)
+        if record is None:
+            return None
+        unknown = set(fields) - set(AGENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown agent fields: {', '.join(sorted(unknown))}")
+        return self.save({**record, **fields})
+
+    def assign_tool(self, agent_id: str, tool_id: str) -> Optional[Dict[str, Any]]:
+        self.store_reads += 1
+        record = self.store.get(agent_id)
+        if record is None or tool_id in record["tool_ids"]:
+            return record
+        return self.save({**record, "tool_ids": record["tool_ids"] + [tool_id]})
+
+    def delete(self, agent_id: str):
+        self.store.delete(agent_id)
+        self.invalidate(agent_id)
+
+    def invalidate(self, agent_id: str):
+        with self._lock:
+            self._entries.pop(agent_id, None)
+        agent_registry.invalidate(agent_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "store": type(self.store).__name__,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "store_reads": self.store_reads,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+def build_agent_repository() -> AgentRepository:
+    backend = os.getenv("AGENT_STORE", "postgres").lower()
+    if backend == "dynamodb":
+        return AgentRepository(DynamoAgentStore())
+    if backend in ("postgres", "sql"):
+        return AgentRepository(SQLAgentStore())
+    raise ValueError(f"Unknown AGENT_STORE: {backend}")
+
+agent_repository = service_registry.register("agent_repository", build_agent_repository)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+import os
+import threading
+import time
+
+class AgentRegistry:
+    """
+    Process-wide LRU + TTL cache of compiled agents.
+
+    Entries are keyed by (agent_id, version). Anything that changes what an
+    agent compiles to (tool assignment, prompt edits, deletion) must call
+    `invalidate(agent_id)`, which bumps the version so the next request
+    rebuilds. The TTL bounds how stale an entry can get when the change was
+    made by another worker process.
+    """
+    def __init__(self, max_size: int = 128, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, agent_id: str) -> int:
+        return self._versions.get(agent_id, 0)
+
+    def get(self, agent_id: str):
+        """Return the cached agent or None if missing/expired."""
+        key = (agent_id, self.version(agent_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created_at, agent = entry
+            if time.monotonic() - created_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return agent
+
+    def put(self, agent_id: str, agent: Any, version: int = None):
+        """Store a compiled agent, evicting the least recently used entries."""
+        if version is None:
+            version = self.version(agent_id)
+        if version != self.version(agent_id):
+            # Invalidated while we were building; don't cache a stale agent.
+            return
+        with self._lock:
+            self._entries[(agent_id, version)] = (time.monotonic(), agent)
+            self._entries.move_to_end((agent_id, version))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, agent_id: str, factory: Callable[[], Any]):
+        """Return a cached agent or build one with `factory` and cache it."""
+        agent = self.get(agent_id)
+        if agent is not None:
+            return agent
+        version = self.version(agent_id)
+        agent = factory()
+        self.put(agent_id, agent, version=version)
+        return agent
+
+    async def aget_or_create(self, agent_id: str, factory: Callable[[], Awaitable[Any]]):
+        """Async variant of `get_or_create` for factories that do async I/O."""
+        agent = self.get(agent_id)
+        if agent is not None:
+            return agent
+        version = self.version(agent_id)
+        agent = await factory()
+        self.put(agent_id, agent, version=version)
+        return agent
+
+    def invalidate(self, agent_id: str):
+        """Drop every cached build of an agent and bump its version."""
+        with self._lock:
+            self._versions[agent_id] = self._versions.get(agent_id, 0) + 1
+            for key in [k for k in self._entries if k[0] == agent_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+agent_registry = AgentRegistry(
+    max_size=int(os.getenv("AGENT_REGISTRY_MAX_SIZE", "128")),
+    ttl=int(os.getenv("AGENT_REGISTRY_TTL", "300"))
+)
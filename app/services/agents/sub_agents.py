@@ -1,39 +1,217 @@
-from .bedrock_service import bedrock_service
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+from ..bedrock_service import bedrock_service
+from ..reranker import reranker
+from ..search_service import search_service
 from langchain_core.messages import HumanMessage
-import json
+
+load_dotenv()
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MAX_EXPANSIONS = int(os.getenv("RETRIEVAL_MAX_EXPANSIONS", "3"))
+# Questions shorter than this are searched as written; a rewrite costs an LLM round trip
+RETRIEVAL_EXPAND_MIN_WORDS = int(os.getenv("RETRIEVAL_EXPAND_MIN_WORDS", "4"))
+
+def retrieval_options(agent_config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Retrieval-stage settings for an agent, read from `config["retrieval"]`, e.g.
+    {"enabled": true, "expand": false, "top_k": 8}.
+    """
+    options = (agent_config or {}).get("retrieval") or {}
+    return {
+        "enabled": bool(options.get("enabled", RETRIEVAL_ENABLED)),
+        "expand": bool(options.get("expand", True)),
+        "top_k": int(options.get("top_k", RETRIEVAL_TOP_K))
+    }
+
+class ExpansionCache:
+    """LRU + TTL cache of query expansions, keyed by the normalised query."""
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = int(os.getenv("RETRIEVAL_EXPANSION_CACHE_SIZE", "2048")) if max_size is None else max_size
+        self.ttl = float(os.getenv("RETRIEVAL_EXPANSION_CACHE_TTL", "3600")) if ttl is None else ttl
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, max_queries: int) -> Tuple[str, int]:
+        return " ".join(query.lower().split()), max_queries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, queries: List[str]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(queries))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+expansion_cache = ExpansionCache()
 
 class SubAgent:
-    def __init__(self, role: str):
+    def __init__(self, role: str, llm=None):
         self.role = role
-        self.llm = bedrock_service.get_llm()
+        self.llm = llm if llm is not None else bedrock_service.get_llm()
 
     def run(self, input_data: dict):
         pass
 
 class RetrievalAgent(SubAgent):
-    def __init__(self):
-        super().__init__("retrieval")
+    """
+    Multi-query retrieval: the LLM rewrites the question, every phrasing is
+    searched in one concurrent `multi_search` and all lists are fused into
+    one deduplicated top_k. Short questions skip the rewrite, and rewrites
+    are cached per normalised question.
+    """
+    def __init__(self, llm=None, search=None, cache: ExpansionCache = None,
+                 max_expansions: int = None, min_words: int = None):
+        super().__init__("retrieval", llm)
+        self.search = search if search is not None else search_service
+        self.cache = cache if cache is not None else expansion_cache
+        self.max_expansions = RETRIEVAL_MAX_EXPANSIONS if max_expansions is None else max_expansions
+        self.min_words = RETRIEVAL_EXPAND_MIN_WORDS if min_words is None else min_words
+
+    def _prompt(self, query: str) -> List[HumanMessage]:
+        return [HumanMessage(content=f"Generate {self.max_expansions} optimized search queries for: {query}")]
 
     def plan_queries(self, query: str):
-        prompt = f"Generate 3 optimized search queries for: {query}"
-        response = self.llm.invoke([HumanMessage(content=prompt)])
+        response = self.llm.invoke(self._prompt(query))
         return response.content.split("\n")
 
-class RerankingAgent(SubAgent):
-    def __init__(self):
-        super().__init__("reranking")
+    async def aplan_queries(self, query: str):
+        response = await self.llm.ainvoke(self._prompt(query))
+        return response.content.split("\n")
+
+    def should_expand(self, query: str) -> bool:
+        return self.max_expansions > 0 and len(query.split()) >= self.min_words
+
+    @staticmethod
+    def _clean(query: str, lines: List[str], max_queries: int) -> List[str]:
+        """The original query followed by the planned rewrites, cleaned and deduplicated."""
+        queries = [query]
+        for line in lines:
+            line = re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line).strip().strip('"')
+            if line and line.lower() not in (q.lower() for q in queries):
+                queries.append(line)
+        return queries[:max_queries + 1]
+
+    def expand_queries(self, query: str, max_queries: int = None):
+        max_queries = self.max_expansions if max_queries is None else max_queries
+        queries, _ = self._expansion(query, max_queries)
+        if queries is None:
+            queries = self._planned(query, self.plan_queries(query), max_queries)
+        return queries
+
+    async def aexpand_queries(self, query: str, max_queries: int = None):
+        max_queries = self.max_expansions if max_queries is None else max_queries
+        queries, _ = self._expansion(query, max_queries)
+        if queries is None:
+            queries = self._planned(query, await self.aplan_queries(query), max_queries)
+        return queries
+
+    def _planned(self, query: str, lines: List[str], max_queries: int) -> List[str]:
+        queries = self._clean(query, lines, max_queries)
+        self.cache.put(self.cache.key(query, max_queries), queries)
+        return queries
+
+    def _expansion(self, query: str, max_queries: int):
+        """(queries, how) without calling the LLM; queries is None when it has to be asked."""
+        if not self.should_expand(query) or max_queries <= 0:
+            return [query], "skipped"
+        queries = self.cache.get(self.cache.key(query, max_queries))
+        return queries, "cached" if queries is not None else "llm"
+
+    def retrieve(self, query: str, vector: list = None, top_k: int = 5, expand: bool = True, **options):
+        """Search every expansion in one batched hybrid search; `vector` embeds the original query."""
+        start = time.perf_counter()
+        queries, expansion, error = [query], "off", None
+        if expand:
+            queries, expansion = self._expansion(query, self.max_expansions)
+            if queries is None:
+                try:
+                    queries = self._planned(query, self.plan_queries(query), self.max_expansions)
+                except Exception as e:
+                    queries, expansion, error = [query], "failed", str(e) or type(e).__name__
+        expanded = time.perf_counter()
+        result = self.search.multi_search(queries, [vector], top_k=top_k, **options)
+        return self._annotate(result, queries, expansion, error, start, expanded)
+
+    async def aretrieve(self, query: str, vector: list = None, top_k: int = 5, expand: bool = True, **options):
+        """Async `retrieve`; the searches for all expansions run concurrently on the search pool."""
+        start = time.perf_counter()
+        queries, expansion, error = [query], "off", None
+        if expand:
+            queries, expansion = self._expansion(query, self.max_expansions)
+            if queries is None:
+                try:
+                    queries = self._planned(query, await self.aplan_queries(query), self.max_expansions)
+                except Exception as e:
+                    queries, expansion, error = [query], "failed", str(e) or type(e).__name__
+        expanded = time.perf_counter()
+        result = await self.search.amulti_search(queries, [vector], top_k=top_k, **options)
+        return self._annotate(result, queries, expansion, error, start, expanded)
+
+    @staticmethod
+    def _annotate(result: Dict[str, Any], queries: List[str], expansion: str, error: str, start: float, expanded: float):
+        """
+        Add the expansion to a search result. `timings_ms` gains "expand" and
+        "search", and "total" then covers both; a failed expansion falls back
+        to the original query and is reported under "errors".
+        """
+        timings = dict(result["timings_ms"])
+        timings["expand"] = round((expanded - start) * 1000, 2)
+        timings["search"] = timings.get("total", round((time.perf_counter() - expanded) * 1000, 2))
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        errors = dict(result["errors"])
+        if error:
+            errors["expand"] = error
+        return {**result, "queries": queries, "expansion": expansion, "errors": errors,
+                "partial": bool(errors), "timings_ms": timings}
 
-    def rerank(self, query: str, documents: list):
-        # In a real scenario, this would use a Cross-Encoder or a specialized LLM call
-        prompt = f"Rerank these documents based on relevance to '{query}':\n{json.dumps(documents)}"
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        return response.content
+class RerankingAgent:
+    """Reranks with the shared scoring stage; no LLM involved."""
+    role = "reranking"
 
-class SynthesisAgent(SubAgent):
-    def __init__(self):
-        super().__init__("synthesis")
+    def __init__(self, model=None):
+        self.reranker = model if model is not None else reranker
 
-    def synthesize(self, query: str, context: str):
-        prompt = f"Synthesize a final answer for '{query}' using the context:\n{context}"
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        return response.content
+    def rerank(self, query: str, documents: list, top_k: int = None):
+        """Documents (search hits or plain strings) sorted by relevance, each with a `rerank_score`."""
+        # Plain strings are keyed by content, so cached scores never follow a position to another document
+        hits = [
+            doc if isinstance(doc, dict) else {"id": hashlib.sha1(str(doc).encode()).hexdigest(), "text": str(doc)}
+            for doc in documents
+        ]
+        return self.reranker.rerank(query, hits, top_k=top_k)
@@ -1,31 +1,84 @@
-from typing import Annotated, List, Union, Dict, Any
+from typing import Annotated, List, Dict, Any
+import re
+import time
+import uuid
 from typing_extensions import TypedDict
-from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from .bedrock_service import bedrock_service
-from .search_service import search_service
-from .memory_service import MemoryService
+from ..bedrock_service import bedrock_service
+from ..embedding_service import SEARCH_QUERY, embedding_service
+from ..search_service import search_options
+from ...utils.caching import cache_service
+from ...utils.cache_codec import build_cache_payload
+from ...utils.logging import cloudwatch_logger
+from ...utils.metrics import GRAPH_NODE_SECONDS, timed
+from ...utils.usage import EXECUTION_LOG_ENABLED, UsageCallback, execution_log_writer, execution_row
+from .registry import agent_registry
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SYNTHESIZE_TAG = "synthesize"
+GRAPH_NODES = ("retrieve", "plan_and_tool", "execute_tools", "synthesize")
 
 class AgentState(TypedDict):
-    messages: Annotated[List[BaseMessage], "The messages in the conversation"]
+    # Nodes return only their new messages; add_messages appends them to the history
+    messages: Annotated[List[BaseMessage], add_messages]
     context: Dict[str, Any]
     next_step: str
     session_id: str
     agent_id: str
 
-from .mcp_server import MCPServer
+def _prompt(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """The history as sent to the LLM: system messages (e.g. retrieval grounding) first, the conversation after."""
+    system = [m for m in messages if isinstance(m, SystemMessage)]
+    return system + [m for m in messages if not isinstance(m, SystemMessage)]
+
+class StreamMetrics:
+    """Time-to-first-token and throughput for a streamed response."""
+    def __init__(self, start: float):
+        self.start = start
+        self.first_token_at = None
+        self.tokens = 0
+
+    def on_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        streaming = elapsed - (self.first_token_at - self.start) if self.first_token_at else 0.0
+        return {
+            "ttft_ms": round((self.first_token_at - self.start) * 1000, 2) if self.first_token_at else None,
+            "total_ms": round(elapsed * 1000, 2),
+            "tokens": self.tokens,
+            "tokens_per_sec": round(self.tokens / streaming, 2) if streaming > 0 else None
+        }
+
+from ..mcp_server import MCPServer
+from .sub_agents import RetrievalAgent, retrieval_options
 from langchain_core.utils.function_calling import convert_to_openai_tool
 
 class SuperAgent:
-    def __init__(self, db: Session, agent_id: str):
-        self.db = db
+    """
+    Compiled planning agent. Instances are shared across requests through
+    `agent_registry`, so the DB session is only used while building.
+    """
+    def __init__(self, db: Session, agent_id: str, tools_metadata: List[Dict[str, Any]] = None, mcp: MCPServer = None):
         self.agent_id = agent_id
         self.llm = bedrock_service.get_llm()
-        self.mcp = MCPServer(db)
+        self.mcp = mcp or MCPServer(db)
         
         # Load tools dynamic from DB for this agent
-        self.tools_metadata = self.mcp.load_tools(agent_id)
+        if tools_metadata is None:
+            tools_metadata = self.mcp.load_tools(agent_id)
+        self.tools_metadata = tools_metadata
+        self.mcp.db = None
+        # Per-agent fusion weights for hybrid_search, from Agent.config["search"]
+        self.search_options = search_options(self.mcp.agent_config)
+        # Multi-query retrieval before planning, from Agent.config["retrieval"]
+        self.retrieval_options = retrieval_options(self.mcp.agent_config)
+        self.retrieval = RetrievalAgent(llm=self.llm) if self.retrieval_options["enabled"] else None
         
         # Bind tools to LLM if available
         if self.tools_metadata:
@@ -36,13 +89,20 @@ class SuperAgent:
         self.workflow = self._create_workflow()
 
     def _create_workflow(self):
+        from langgraph.graph import StateGraph, END
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("plan_and_tool", self.plan_and_tool_node)
-        workflow.add_node("execute_tools", self.execute_tools_node)
-        workflow.add_node("synthesize", self.synthesize_node)
+        # Every node is timed into llmops_graph_node_seconds{node}
+        workflow.add_node("plan_and_tool", timed(GRAPH_NODE_SECONDS, "plan_and_tool")(self.plan_and_tool_node))
+        workflow.add_node("execute_tools", timed(GRAPH_NODE_SECONDS, "execute_tools")(self.execute_tools_node))
+        workflow.add_node("synthesize", timed(GRAPH_NODE_SECONDS, "synthesize")(self.synthesize_node))
 
-        workflow.set_entry_point("plan_and_tool")
+        if self.retrieval is not None:
+            workflow.add_node("retrieve", timed(GRAPH_NODE_SECONDS, "retrieve")(self.retrieve_node))
+            workflow.set_entry_point("retrieve")
+            workflow.add_edge("retrieve", "plan_and_tool")
+        else:
+            workflow.set_entry_point("plan_and_tool")
         
         workflow.add_conditional_edges(
             "plan_and_tool",
@@ -58,9 +118,48 @@ class SuperAgent:
 
         return workflow.compile()
 
-    def plan_and_tool_node(self, state: AgentState):
+    @classmethod
+    async def acreate(cls, db: AsyncSession, agent_id: str) -> "SuperAgent":
+        """Build an agent, loading its tools through an AsyncSession."""
+        mcp = MCPServer(db)
+        tools_metadata = await mcp.aload_tools(agent_id)
+        return cls(None, agent_id, tools_metadata=tools_metadata, mcp=mcp)
+
+    async def retrieve_node(self, state: AgentState):
+        """
+        Expand the question, search every phrasing concurrently and fuse the
+        hits. The documents are added as a system message, which `_prompt`
+        sends ahead of the conversation; queries, sources and per-stage
+        timings go to `context["retrieval"]`.
+        """
         messages = state["messages"]
-        response = self.llm_with_tools.invoke(messages)
+        query = messages[-1].content
+        try:
+            result = await self.retrieval.aretrieve(
+                query, top_k=self.retrieval_options["top_k"], expand=self.retrieval_options["expand"], **self.search_options
+            )
+        except Exception as e:
+            # Retrieval only grounds the answer; the agent still runs without it
+            cloudwatch_logger.log(f"Retrieval failed: {str(e)}", level="WARNING")
+            return {"context": {**state["context"], "retrieval": {"error": str(e)}}}
+
+        hits = result["results"]
+        context = {**state["context"], "retrieval": {
+            "queries": result["queries"],
+            "expansion": result["expansion"],
+            "sources": [{"id": hit.get("id"), "score": hit.get("rerank_score", hit.get("score"))} for hit in hits],
+            "errors": result["errors"],
+            "timings_ms": result["timings_ms"]
+        }}
+        if not hits:
+            return {"context": context}
+        documents = "\n\n".join(f"[{i}] {hit.get('text', '')}" for i, hit in enumerate(hits, 1))
+        grounding = SystemMessage(content=f"Retrieved documents, use them where relevant:\n{documents}")
+        return {"messages": [grounding], "context": context}
+
+    async def plan_and_tool_node(self, state: AgentState):
+        messages = state["messages"]
+        response = await self.llm_with_tools.ainvoke(_prompt(messages))
         return {"messages": [response]}
 
     def should_continue(self, state: AgentState):
@@ -73,46 +172,128 @@ class SuperAgent:
     async def execute_tools_node(self, state: AgentState):
         messages = state["messages"]
         last_message = messages[-1]
-        
-        tool_outputs = []
-        for tool_call in last_message.tool_calls:
-            tool_name = tool_call["name"]
-            arguments = tool_call["args"]
-            
-            # Execute tool via MCP
-            output = await self.mcp.call_tool(tool_name, **arguments)
-            
-            from langchain_core.messages import ToolMessage
-            tool_outputs.append(ToolMessage(
-                content=str(output),
-                tool_call_id=tool_call["id"]
-            ))
-            
-        return {"messages": tool_outputs}
 
-    def synthesize_node(self, state: AgentState):
+        # Execute tools via MCP concurrently; outputs keep the original call order.
+        # Per-tool counts (including result-cache hits) add up across the run's tool rounds.
+        tools = {name: dict(counts) for name, counts in state["context"].get("tools", {}).items()}
+        outputs = await self.mcp.call_tools(last_message.tool_calls, metrics=tools)
+
+        from langchain_core.messages import ToolMessage
+        tool_outputs = [
+            ToolMessage(content=output, tool_call_id=tool_call["id"])
+            for tool_call, output in zip(last_message.tool_calls, outputs)
+        ]
+        return {"messages": tool_outputs, "context": {**state["context"], "tools": tools}}
+
+    async def synthesize_node(self, state: AgentState):
         messages = state["messages"]
-        # LLM summarizes the conversation so far
-        response = self.llm.invoke(messages)
+        # LLM summarizes the conversation so far; tagged so streams can pick out its tokens
+        response = await self.llm.ainvoke(_prompt(messages), config={"tags": [SYNTHESIZE_TAG]})
         return {"messages": [response]}
 
-from ..utils.caching import cache_service
-from .sub_agents import RetrievalAgent, SynthesisAgent
-
     async def execute(self, session_id: str, agent_id: str, query: str):
-        from ...models.models import ExecutionLog
-        import datetime
-        import uuid
-        from langchain_core.messages import HumanMessage
-
-        trace_id = f"trace-{uuid.uuid4()}"
+        """Run the agent, returning a cache payload: {"answer", "context", "usage"}."""
         cache_key = cache_service.generate_cache_key(query, agent_id)
-        cached_response = cache_service.get(cache_key)
+        cached_response = await cache_service.get(cache_key)
         if cached_response:
             return cached_response
 
-        execution_id = str(uuid.uuid4())
-        
+        # N concurrent identical queries share one run (and one Bedrock call)
+        return await cache_service.single_flight.do(
+            cache_key, lambda: self._execute_uncached(session_id, agent_id, query, cache_key)
+        )
+
+    async def _execute_uncached(self, session_id: str, agent_id: str, query: str, cache_key: str):
+        query_embedding = await self._embed_for_cache(query)
+        if query_embedding is not None:
+            similar = await cache_service.get_semantic(agent_id, query_embedding)
+            if similar:
+                return similar
+
+        initial_state, config, usage = self._prepare_run(session_id, agent_id, query)
+        try:
+            # Workflow with potential HITL interruption
+            result = await self.workflow.ainvoke(initial_state, config=config)
+        except Exception as e:
+            cloudwatch_logger.log(f"Planning Agent failed: {str(e)}", level="ERROR")
+            self._record_usage(session_id, agent_id, query, None, usage, config, error=str(e))
+            raise e
+        answer = result["messages"][-1].content
+        return await self._store_result(
+            session_id, agent_id, query, cache_key, query_embedding, answer, result["context"],
+            self._record_usage(session_id, agent_id, query, answer, usage, config)
+        )
+
+    async def astream(self, session_id: str, agent_id: str, query: str):
+        """
+        Stream a run as (event, data) pairs: "step" when a graph node starts or
+        ends (the retrieve node's end carries its stage timings), "token" for
+        each synthesize-node token and a final "done" carrying the cache payload
+        plus timing metrics. Cache hits are replayed as tokens.
+        """
+        start = time.perf_counter()
+        cache_key = cache_service.generate_cache_key(query, agent_id)
+        payload = await cache_service.get(cache_key)
+        query_embedding = None
+        if not payload:
+            query_embedding = await self._embed_for_cache(query)
+            if query_embedding is not None:
+                payload = await cache_service.get_semantic(agent_id, query_embedding)
+
+        metrics = StreamMetrics(start)
+        if payload:
+            for token in re.findall(r"\S+\s*", payload["answer"]):
+                metrics.on_token()
+                yield "token", {"text": token}
+            yield "done", dict(payload, cached=True, metrics=metrics.summary())
+            return
+
+        initial_state, config, usage = self._prepare_run(session_id, agent_id, query)
+        tokens, ai_messages, context = [], [], {}
+        try:
+            async for event in self.workflow.astream_events(initial_state, config=config, version="v1"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream" and SYNTHESIZE_TAG in event.get("tags", []):
+                    text = event["data"]["chunk"].content
+                    if text:
+                        metrics.on_token()
+                        tokens.append(text)
+                        yield "token", {"text": text}
+                elif kind == "on_chat_model_end":
+                    ai_messages.append(event["data"].get("output"))
+                elif kind in ("on_chain_start", "on_chain_end") and event["name"] in GRAPH_NODES:
+                    step = {"node": event["name"], "status": "start" if kind == "on_chain_start" else "end"}
+                    node_input = event["data"].get("input")
+                    if event["name"] == "execute_tools" and isinstance(node_input, dict) and node_input.get("messages"):
+                        last_message = node_input["messages"][-1]
+                        step["tools"] = [call["name"] for call in getattr(last_message, "tool_calls", None) or []]
+                    node_output = event["data"].get("output")
+                    if isinstance(node_output, dict) and node_output.get("context"):
+                        context = node_output["context"]
+                        if event["name"] == "retrieve":
+                            step["timings_ms"] = context.get("retrieval", {}).get("timings_ms")
+                        elif event["name"] == "execute_tools":
+                            step["tool_metrics"] = context.get("tools")
+                    yield "step", step
+        except Exception as e:
+            cloudwatch_logger.log(f"Planning Agent stream failed: {str(e)}", level="ERROR")
+            self._record_usage(session_id, agent_id, query, None, usage, config, error=str(e))
+            yield "error", {"detail": str(e)}
+            return
+
+        answer = "".join(tokens)
+        if not answer and ai_messages:
+            answer = getattr(ai_messages[-1], "content", "")
+        payload = await self._store_result(
+            session_id, agent_id, query, cache_key, query_embedding, answer, context,
+            self._record_usage(session_id, agent_id, query, answer, usage, config)
+        )
+        yield "done", dict(payload, cached=False, metrics=metrics.summary())
+
+    def _prepare_run(self, session_id: str, agent_id: str, query: str):
+        """Build the initial graph state, the run config and its usage callback, and log the start of the run."""
+        trace_id = f"trace-{uuid.uuid4()}"
+
         # Determine if action is critical for HITL
         is_critical = self._check_if_critical(query)
 
@@ -124,32 +305,54 @@ from .sub_agents import RetrievalAgent, SynthesisAgent
             "agent_id": agent_id,
             "requires_approval": is_critical
         }
-        
+        usage = UsageCallback(default_model=getattr(self.llm, "model_id", None))
+        config = {
+            "configurable": {"thread_id": session_id}, "run_name": f"PlanningAgent-{agent_id}",
+            "metadata": {"trace_id": trace_id}, "callbacks": [usage]
+        }
+
         cloudwatch_logger.log(f"Agent {agent_id} starting Planning flow | Trace: {trace_id}", level="INFO")
-        
-        try:
-            config = {"configurable": {"thread_id": session_id}, "run_name": f"PlanningAgent-{agent_id}", "metadata": {"trace_id": trace_id}}
-            
-            # Workflow with potential HITL interruption
-            result = await self.workflow.ainvoke(initial_state, config=config)
+        return initial_state, config, usage
 
-            # Continuous Learning: Store in Long-Term Memory for fine-tuning pipeline
-            from ..memory_service import MemoryService, MemoryTier
-            from ..db.session import SessionLocal
-            with SessionLocal() as db:
-                memory_service = MemoryService(db)
-                memory_service.add_memory(
-                    session_id=session_id,
-                    tier=MemoryTier.LONG_TERM,
-                    content={"query": query, "response": result["messages"][-1].content, "agent_id": agent_id}
-                )
-
-            cache_service.set(cache_key, result, expire=3600)
-            return result
-            
+    async def _store_result(self, session_id: str, agent_id: str, query: str, cache_key: str,
+                            query_embedding, answer: str, context: Dict[str, Any], usage: Dict[str, Any]):
+        """Persist a finished run to long-term memory and both cache tiers."""
+        # Continuous Learning: Store in Long-Term Memory for fine-tuning pipeline
+        from ..memory_service import MemoryService, MemoryTier
+        from ...db.session import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            memory_service = MemoryService(db)
+            await memory_service.aadd_memory(
+                session_id=session_id,
+                tier=MemoryTier.LONG_TERM,
+                content={"query": query, "response": answer, "agent_id": agent_id}
+            )
+
+        payload = build_cache_payload(answer, context, usage)
+        if query_embedding is not None:
+            await cache_service.set_semantic(agent_id, query_embedding, payload)
+        await cache_service.set(cache_key, payload, expire=3600)
+        return payload
+
+    def _record_usage(self, session_id: str, agent_id: str, query: str, answer, usage: UsageCallback,
+                      config: Dict[str, Any], error: str = None) -> Dict[str, Any]:
+        """Queue the run's execution_logs row and return the usage for its payload."""
+        summary = usage.summary()
+        if EXECUTION_LOG_ENABLED:
+            execution_log_writer.add(execution_row(
+                agent_id, session_id, query, answer, summary, config["metadata"]["trace_id"], error
+            ))
+        return {key: summary[key] for key in ("input_tokens", "output_tokens", "cost_usd")}
+
+    async def _embed_for_cache(self, query: str):
+        """Embed the query for the semantic cache; a failure only skips that tier."""
+        if not cache_service.semantic_enabled:
+            return None
+        try:
+            return await embedding_service.aembed(query, input_type=SEARCH_QUERY)
         except Exception as e:
-            cloudwatch_logger.log(f"Planning Agent failed: {str(e)}", level="ERROR")
-            raise e
+            cloudwatch_logger.log(f"Semantic cache embedding failed: {str(e)}", level="WARNING")
+            return None
 
     def _check_if_critical(self, query: str) -> bool:
         # Simple logic: Tool calls or financial/system changes are critical
@@ -166,3 +369,11 @@ from .sub_agents import RetrievalAgent, SynthesisAgent
         plan = self.llm.invoke([HumanMessage(content=plan_prompt)])
         
         return {"messages": [plan], "next_step": "execute_tools"}
+
+def get_super_agent(db: Session, agent_id: str) -> SuperAgent:
+    """Return the compiled agent for `agent_id`, building it on a registry miss."""
+    return agent_registry.get_or_create(agent_id, lambda: SuperAgent(db, agent_id))
+
+async def aget_super_agent(db: AsyncSession, agent_id: str) -> SuperAgent:
+    """Async variant of `get_super_agent` for the request path."""
+    return await agent_registry.aget_or_create(agent_id, lambda: SuperAgent.acreate(db, agent_id))
@@ -1,14 +1,14 @@
-from langchain_aws import ChatBedrock
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.callbacks.tracers import LangChainTracer
 import os
 from dotenv import load_dotenv
+from ..core.providers import service_registry
 
 load_dotenv()
 
 class BedrockService:
     def __init__(self):
+        # langchain_aws pulls in boto3 and friends; import it when the service is built
+        from langchain_aws import ChatBedrock
         self.model_id = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
         self.client = ChatBedrock(
             model_id=self.model_id,
@@ -32,4 +32,4 @@ class BedrockService:
     def get_llm(self):
         return self.client
 
-bedrock_service = BedrockService()
+bedrock_service = service_registry.register("bedrock", BedrockService)
@@ -1,12 +1,14 @@
-import boto3
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
+from ..core.providers import service_registry
 
 load_dotenv()
 
 class DynamoDBService:
     def __init__(self):
+        import boto3
         self.dynamodb = boto3.resource(
             'dynamodb',
             region_name=os.getenv("AWS_REGION", "us-east-1"),
@@ -36,8 +38,31 @@ class DynamoDBService:
         response = table.get_item(Key={'agent_id': agent_id})
         return response.get('Item')
 
+    def batch_get_agents(self, agent_ids: List[str], max_retries: int = 5) -> List[Dict[str, Any]]:
+        """
+        Fetch many agents with BatchGetItem, 100 keys per request. Keys DynamoDB
+        returns as unprocessed (throttling) are retried with exponential backoff.
+        """
+        agent_ids = list(dict.fromkeys(agent_ids))
+        items = []
+        for start in range(0, len(agent_ids), 100):
+            request = {self.table_name: {"Keys": [{"agent_id": agent_id} for agent_id in agent_ids[start:start + 100]]}}
+            for attempt in range(max_retries + 1):
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                items.extend(response.get("Responses", {}).get(self.table_name, []))
+                request = response.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            if request:
+                raise RuntimeError(f"DynamoDB left {len(request[self.table_name]['Keys'])} agent keys unprocessed")
+        return items
+
     def delete_agent(self, agent_id: str):
         table = self.dynamodb.Table(self.table_name)
         table.delete_item(Key={'agent_id': agent_id})
 
-dynamodb_service = DynamoDBService()
+def _probe_dynamodb(service: DynamoDBService):
+    service.dynamodb.meta.client.describe_table(TableName=service.table_name)
+
+dynamodb_service = service_registry.register("dynamodb", DynamoDBService, probe=_probe_dynamodb)
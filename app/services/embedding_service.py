@@ -0,0 +1,379 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from ..core.providers import service_registry
+
+load_dotenv()
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+LATENCY_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Cohere embeds questions and passages differently; other models ignore the distinction
+SEARCH_DOCUMENT, SEARCH_QUERY = "search_document", "search_query"
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] is observations <= buckets[i], the last slot is overflow."""
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class BedrockEmbeddingBackend:
+    """
+    Bedrock embeddings. Cohere models take a list of texts per call and an
+    `input_type`; Titan takes one text, so a batch fans out over a small
+    thread pool instead.
+    """
+    def __init__(self, model_id: str = None, dim: int = None):
+        import boto3
+        self.model_id = model_id or os.getenv("BEDROCK_EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v2:0")
+        self.dim = dim
+        self.client = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv("EMBEDDING_BEDROCK_CONCURRENCY", "8")), thread_name_prefix="embed")
+
+    @property
+    def name(self) -> str:
+        return f"bedrock:{self.model_id}:{self.dim or 'default'}"
+
+    @property
+    def asymmetric(self) -> bool:
+        """Whether queries and documents are embedded differently."""
+        return self.model_id.startswith("cohere.")
+
+    def embed(self, texts: List[str], input_type: str = SEARCH_DOCUMENT) -> np.ndarray:
+        if self.asymmetric:
+            body = {"texts": texts, "input_type": input_type}
+            return np.asarray(self._invoke(body)["embeddings"], dtype=np.float32)
+        return np.asarray(list(self._pool.map(self._embed_one, texts)), dtype=np.float32)
+
+    def _embed_one(self, text: str) -> List[float]:
+        body = {"inputText": text}
+        if self.dim:
+            body["dimensions"] = self.dim
+        return self._invoke(body)["embedding"]
+
+    def _invoke(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.client.invoke_model(modelId=self.model_id, body=json.dumps(body))
+        return json.loads(response["body"].read())
+
+class LocalEmbeddingBackend:
+    """Offline CPU embeddings with a sentence-transformers model (optional dependency)."""
+    def __init__(self, model_name: str = None):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name or os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.model = SentenceTransformer(self.model_name, device="cpu")
+
+    @property
+    def name(self) -> str:
+        return f"local:{self.model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True), dtype=np.float32)
+
+class HashingEmbeddingBackend:
+    """
+    Dependency-free offline embeddings: signed feature hashing of word
+    unigrams and bigrams. Lexical rather than semantic, but deterministic and
+    fast, which is enough for tests, demos and air-gapped ingestion.
+    """
+    _WORD_RE = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing:{self.dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = self._WORD_RE.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+def backend_from_env():
+    """EMBEDDING_BACKEND=bedrock (default) | local | hashing."""
+    kind = os.getenv("EMBEDDING_BACKEND", "bedrock")
+    dim = int(os.getenv("EMBEDDING_DIM", "0")) or None
+    if kind == "bedrock":
+        return BedrockEmbeddingBackend(dim=dim)
+    if kind == "local":
+        return LocalEmbeddingBackend()
+    if kind == "hashing":
+        return HashingEmbeddingBackend(dim=dim or 1024)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {kind}")
+
+class EmbeddingCache:
+    """
+    Content-addressed float32 store: vectors live in a NumPy memmap that grows
+    by doubling, and an append-only file of 16-byte digests maps content hash
+    -> row. Vectors are written before their index record, so a crash can
+    only lose the last entries, never point at garbage. Several processes
+    may share a directory: rows are reserved under an exclusive flock on the
+    index, after reading whatever the others appended since.
+    """
+    DIGEST_SIZE = 16
+
+    def __init__(self, directory: str, dim: int, initial_capacity: int = 1024, max_rows: int = 0):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.max_rows = max_rows
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._index_path = os.path.join(directory, "index.bin")
+        self._lock = threading.Lock()
+        self.rows: Dict[bytes, int] = {}
+        # Bytes of index.bin already loaded into `rows`
+        self._indexed = 0
+
+        self._index = open(self._index_path, "a+b", buffering=0)
+        with self._locked():
+            self._open(initial_capacity)
+            self._refresh()
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"dim": dim}, f)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._index, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._index, fcntl.LOCK_UN)
+
+    def _open(self, capacity: int):
+        # Only ever grows the file: another process may already map more rows than we do
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = max(capacity, size // (4 * self.dim))
+        if size < capacity * 4 * self.dim:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * 4 * self.dim)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def _refresh(self):
+        """Load index records appended since the last look; call with the lock held."""
+        size = os.fstat(self._index.fileno()).st_size
+        if size == self._indexed:
+            return
+        if os.path.getsize(self._vectors_path) > self.capacity * 4 * self.dim:
+            self.vectors.flush()
+            self._open(self.capacity)
+        self._index.seek(self._indexed)
+        data = self._index.read(size - self._indexed)
+        first = self._indexed // self.DIGEST_SIZE
+        usable = min(len(data) // self.DIGEST_SIZE, self.capacity - first)
+        for i in range(usable):
+            self.rows[data[i * self.DIGEST_SIZE:(i + 1) * self.DIGEST_SIZE]] = first + i
+        self._indexed += usable * self.DIGEST_SIZE
+        if self._indexed != size:
+            # A writer died mid-record; nobody else is appending while we hold the lock
+            self._index.truncate(self._indexed)
+
+    @classmethod
+    def open_existing(cls, directory: str, **kwargs) -> Optional["EmbeddingCache"]:
+        """Reopen a store written by an earlier process, or None if there isn't one."""
+        meta = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta):
+            return None
+        with open(meta) as f:
+            return cls(directory, json.load(f)["dim"], **kwargs)
+
+    @staticmethod
+    def key(namespace: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{namespace}\x00{text}".encode(), digest_size=EmbeddingCache.DIGEST_SIZE).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        rows = {key: self.rows[key] for key in keys if key in self.rows}
+        if not rows:
+            return {}
+        found = self.vectors[list(rows.values())]
+        return dict(zip(rows, found))
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        with self._locked():
+            self._refresh()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self.rows and key not in new:
+                    new[key] = vector
+            new = list(new.items())
+            if self.max_rows:
+                new = new[:max(0, self.max_rows - len(self.rows))]
+            if not new:
+                return
+            first = self._indexed // self.DIGEST_SIZE
+            if first + len(new) > self.capacity:
+                self.vectors.flush()
+                capacity = self.capacity
+                while first + len(new) > capacity:
+                    capacity *= 2
+                self._open(capacity)
+            self.vectors[first:first + len(new)] = np.stack([vector for _, vector in new])
+            self._index.write(b"".join(key for key, _ in new))
+            self._indexed += len(new) * self.DIGEST_SIZE
+            for row, (key, _) in enumerate(new, start=first):
+                self.rows[key] = row
+
+    def __len__(self):
+        return len(self.rows)
+
+    def close(self):
+        self.vectors.flush()
+        self._index.close()
+
+class EmbeddingService:
+    """
+    Embeddings with a content-hash cache and async micro-batching: concurrent
+    `aembed` calls arriving within `max_wait_ms` share one model call. Pass
+    `input_type=SEARCH_QUERY` for query-time text; backends with an
+    `asymmetric` model embed (and cache) it apart from documents.
+    """
+    def __init__(self, backend=None, cache_dir: Optional[str] = None, max_batch: int = None, max_wait_ms: float = None):
+        self.backend = backend or backend_from_env()
+        self.max_batch = max_batch or int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))) / 1000
+        if cache_dir is None:
+            cache_dir = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+        self._cache_dir = cache_dir or None
+        self._cache_max_rows = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "0"))
+        self._cache_lock = threading.Lock()
+        self.cache: Optional[EmbeddingCache] = None
+        if self._cache_dir:
+            self.cache = EmbeddingCache.open_existing(self._cache_path(), max_rows=self._cache_max_rows)
+        self._pending: List[Any] = []
+        self._flush_handle = None
+
+        self.hits = 0
+        self.misses = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.latency_ms = Histogram(LATENCY_MS_BUCKETS)
+
+    def _cache_path(self) -> str:
+        # One store per model, so switching backends never mixes vector spaces
+        return os.path.join(self._cache_dir, re.sub(r"[^\w.-]+", "_", self.backend.name))
+
+    def _cache_for(self, dim: int) -> Optional[EmbeddingCache]:
+        # A new store is sized from the first vector the backend returns
+        if self._cache_dir and self.cache is None:
+            with self._cache_lock:
+                if self.cache is None:
+                    self.cache = EmbeddingCache(self._cache_path(), dim, max_rows=self._cache_max_rows)
+        return self.cache
+
+    def embed_many(self, texts: List[str], input_type: str = SEARCH_DOCUMENT) -> List[List[float]]:
+        """Embed texts, reusing cached vectors; misses go to the model in batches of `max_batch`."""
+        if not texts:
+            return []
+        asymmetric = getattr(self.backend, "asymmetric", False) and input_type != SEARCH_DOCUMENT
+        # Document keys stay as they were, so existing caches remain valid
+        namespace = f"{self.backend.name}:{input_type}" if asymmetric else self.backend.name
+        keys = [EmbeddingCache.key(namespace, text) for text in texts]
+        found = self.cache.get_many(keys) if self.cache is not None else {}
+        self.hits += sum(1 for key in keys if key in found)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.max_batch):
+            batch = missing_keys[i:i + self.max_batch]
+            start = time.perf_counter()
+            batch_texts = [missing[key] for key in batch]
+            vectors = self.backend.embed(batch_texts, input_type=input_type) if asymmetric else self.backend.embed(batch_texts)
+            self.latency_ms.observe((time.perf_counter() - start) * 1000)
+            self.batch_sizes.observe(len(batch))
+            cache = self._cache_for(vectors.shape[1])
+            if cache is not None:
+                cache.put_many(batch, vectors)
+            found.update(zip(batch, vectors))
+        return [found[key].tolist() for key in keys]
+
+    def embed(self, text: str, input_type: str = SEARCH_DOCUMENT) -> List[float]:
+        return self.embed_many([text], input_type)[0]
+
+    async def aembed(self, text: str, input_type: str = SEARCH_DOCUMENT) -> List[float]:
+        """Queue one text; the batch goes out when full or `max_wait_ms` after it opened."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, input_type, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    async def aembed_many(self, texts: List[str], input_type: str = SEARCH_DOCUMENT) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.aembed(text, input_type) for text in texts)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        groups: Dict[str, List[Any]] = {}
+        for text, input_type, future in batch:
+            groups.setdefault(input_type, []).append((text, future))
+        for input_type, group in groups.items():
+            try:
+                vectors = await asyncio.to_thread(self.embed_many, [text for text, _ in group], input_type)
+            except Exception as e:
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(group, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "cached_vectors": len(self.cache) if self.cache is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "latency_ms": self.latency_ms.snapshot()
+        }
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+embedding_service = service_registry.register("embedding", EmbeddingService)
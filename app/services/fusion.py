@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+# Every retrieval backend returns ranked lists of hits in this shape:
+# {"id": str, "text": str, "score": float, "metadata": dict}
+Hit = Dict[str, Any]
+
+DEFAULT_WEIGHTS = {"bm25": 1.0, "vector": 1.0, "hybrid": 1.0, "graph": 0.5}
+RRF_K = 60
+
+def reciprocal_rank_fusion(ranked: Dict[str, List[Hit]], weights: Dict[str, float] = None,
+                           top_k: int = 5, k: int = RRF_K) -> List[Hit]:
+    """
+    Merge ranked lists with weighted Reciprocal Rank Fusion:
+    score(d) = sum over lists of weight / (k + rank). Only ranks matter, so
+    BM25, cosine and graph scores never need to be on the same scale.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    fused: Dict[str, Hit] = {}
+    for source, hits in ranked.items():
+        weight = weights.get(source, 1.0)
+        if weight <= 0:
+            continue
+        for rank, hit in enumerate(hits, start=1):
+            _accumulate(fused, hit, source, weight / (k + rank))
+    return _top(fused, top_k)
+
+def weighted_score_fusion(ranked: Dict[str, List[Hit]], weights: Dict[str, float] = None,
+                          top_k: int = 5) -> List[Hit]:
+    """Merge by min-max normalising each list's scores to [0, 1] and summing them weighted."""
+    weights = weights or DEFAULT_WEIGHTS
+    fused: Dict[str, Hit] = {}
+    for source, hits in ranked.items():
+        weight = weights.get(source, 1.0)
+        if weight <= 0 or not hits:
+            continue
+        scores = [hit.get("score") or 0.0 for hit in hits]
+        low, high = min(scores), max(scores)
+        for hit, score in zip(hits, scores):
+            normalised = (score - low) / (high - low) if high > low else 1.0
+            _accumulate(fused, hit, source, weight * normalised)
+    return _top(fused, top_k)
+
+FUSION_METHODS = {
+    "rrf": reciprocal_rank_fusion,
+    "weighted": weighted_score_fusion,
+}
+
+def fuse(ranked: Dict[str, List[Hit]], weights: Dict[str, float] = None, top_k: int = 5, method: str = "rrf") -> List[Hit]:
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}")
+    return FUSION_METHODS[method](ranked, weights=weights, top_k=top_k)
+
+def _accumulate(fused: Dict[str, Hit], hit: Hit, source: str, score: float):
+    entry = fused.get(hit["id"])
+    if entry is None:
+        entry = fused[hit["id"]] = {
+            "id": hit["id"],
+            "text": hit.get("text", ""),
+            "metadata": hit.get("metadata", {}),
+            "score": 0.0,
+            "sources": {}
+        }
+    entry["score"] += score
+    entry["sources"][source] = hit.get("score")
+
+def _top(fused: Dict[str, Hit], top_k: int) -> List[Hit]:
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
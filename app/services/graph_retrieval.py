@@ -0,0 +1,246 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+import os
+import queue
+import re
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GRAPH_FULLTEXT_INDEX = os.getenv("GRAPH_FULLTEXT_INDEX", "entity_names")
+GRAPH_ENTITY_LABELS = [label.strip() for label in os.getenv("GRAPH_ENTITY_LABELS", "Entity").split(",") if label.strip()]
+
+_STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i
+if in into is it its itself just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your tell show give find list explain describe know
+""".split())
+_QUOTED_RE = re.compile(r'"([^"]+)"|“([^”]+)”')
+_CAPITALISED_RE = re.compile(r"\b[A-Z][\w'&.-]*(?:\s+[A-Z][\w'&.-]*)*")
+_WORD_RE = re.compile(r"\b\w[\w'-]{2,}")
+_LUCENE_SPECIAL_RE = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+# Seeds come from the full-text index, never a scan over every relationship
+SEED_QUERY = (
+    "CALL db.index.fulltext.queryNodes($index, $search, {limit: $limit}) YIELD node, score "
+    "RETURN elementId(node) AS id, node.name AS name, score"
+)
+# One hop from every frontier node, at most $fanout relationships each
+EXPAND_QUERY = (
+    "UNWIND $frontier AS id "
+    "MATCH (n) WHERE elementId(n) = id "
+    "CALL { WITH n MATCH (n)-[r]-(m) RETURN r, m LIMIT $fanout } "
+    "RETURN id AS from_id, elementId(m) AS to_id, n.name AS name, type(r) AS relation, "
+    "m.name AS neighbour, startNode(r) = n AS outgoing "
+    "LIMIT $limit"
+)
+
+def extract_entities(query: str, max_entities: int = 5) -> List[str]:
+    """
+    Entity names to look up for a question: quoted phrases and runs of
+    capitalised words, or its content words when it names nothing.
+    """
+    entities = [a or b for a, b in _QUOTED_RE.findall(query)]
+    unquoted = _QUOTED_RE.sub(" ", query)
+    for match in _CAPITALISED_RE.findall(unquoted):
+        words = match.split()
+        # Drop sentence-initial question words ("Who", "What Acme" -> "Acme")
+        while words and words[0].lower() in _STOPWORDS:
+            words = words[1:]
+        if words:
+            entities.append(" ".join(words).rstrip(".'"))
+    if not entities:
+        entities = [word for word in _WORD_RE.findall(unquoted) if word.lower() not in _STOPWORDS]
+
+    seen, unique = set(), []
+    for entity in entities:
+        if entity and entity.lower() not in seen:
+            seen.add(entity.lower())
+            unique.append(entity)
+    return unique[:max_entities]
+
+def lucene_query(entities: List[str]) -> str:
+    """OR of escaped entity names; multi-word names are phrases."""
+    terms = []
+    for entity in entities:
+        escaped = _LUCENE_SPECIAL_RE.sub(r"\\\1", entity)
+        terms.append(f'"{escaped}"' if " " in entity else escaped)
+    return " OR ".join(terms)
+
+class SessionPool:
+    """
+    Reuses neo4j sessions across calls. Sessions are not thread-safe, so
+    each one is held by a single caller at a time; at most `size` idle
+    sessions are kept and a session that raised is closed, not reused.
+    """
+    def __init__(self, driver, size: int = 8, **session_kwargs):
+        self.driver = driver
+        self.session_kwargs = session_kwargs
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=size)
+        self.created = 0
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = self.driver.session(**self.session_kwargs)
+            self.created += 1
+        try:
+            yield session
+        except Exception:
+            session.close()
+            raise
+        try:
+            self._idle.put_nowait(session)
+        except queue.Full:
+            session.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class GraphRetriever:
+    """
+    Query -> entities -> full-text seed nodes -> multi-hop expansion.
+
+    Every statement runs in a read transaction (retried on transient errors,
+    routed to readers in a cluster) with a server-side timeout. Depth,
+    per-node fan-out, seeds and total edges are all capped, and results are
+    cached per entity set so rephrasings of a question share one lookup.
+    """
+    def __init__(self, driver, index: str = None, max_depth: int = None, max_fanout: int = None,
+                 seed_limit: int = None, max_results: int = None, hop_decay: float = 0.5,
+                 cache_size: int = None, cache_ttl: float = None, timeout: float = None):
+        self.driver = driver
+        self.index = index or GRAPH_FULLTEXT_INDEX
+        self.max_depth = max_depth or int(os.getenv("GRAPH_MAX_DEPTH", "2"))
+        self.max_fanout = max_fanout or int(os.getenv("GRAPH_MAX_FANOUT", "25"))
+        self.seed_limit = seed_limit or int(os.getenv("GRAPH_SEED_LIMIT", "10"))
+        self.max_results = max_results or int(os.getenv("GRAPH_MAX_RESULTS", "50"))
+        self.hop_decay = hop_decay
+        self.cache_size = int(os.getenv("GRAPH_CACHE_SIZE", "1024")) if cache_size is None else cache_size
+        self.cache_ttl = float(os.getenv("GRAPH_CACHE_TTL", "300")) if cache_ttl is None else cache_ttl
+        self.timeout = timeout or float(os.getenv("GRAPH_QUERY_TIMEOUT", "2.0"))
+        from neo4j import unit_of_work
+        # Server-side transaction timeout, so an expensive expansion is killed, not just abandoned
+        self._read = unit_of_work(timeout=self.timeout)(self._expand)
+        database = os.getenv("NEO4J_DATABASE")
+        self.sessions = SessionPool(
+            driver, size=int(os.getenv("GRAPH_SESSION_POOL", "8")),
+            **({"database": database} if database else {})
+        )
+        self._cache: "OrderedDict[Tuple[frozenset, int], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_ready = os.getenv("GRAPH_CREATE_INDEX", "true").lower() != "true"
+        self.hits = 0
+        self.misses = 0
+
+    def retrieve(self, query: str, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` facts {"subject", "relation", "object", "score", "hops"},
+        best first. Seed scores are normalised to 1 and halve with each hop.
+        """
+        limit = min(limit or self.max_results, self.max_results)
+        entities = extract_entities(query)
+        if not entities:
+            return []
+        key = (frozenset(entity.lower() for entity in entities), limit)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        self.ensure_index()
+        with self.sessions.session() as session:
+            facts = session.execute_read(self._read, lucene_query(entities), limit)
+        self._cache_put(key, facts)
+        return facts
+
+    def _expand(self, tx, search: str, limit: int) -> List[Dict[str, Any]]:
+        seeds = [record.data() for record in tx.run(SEED_QUERY, index=self.index, search=search, limit=self.seed_limit)]
+        if not seeds:
+            return []
+        top = max(seed["score"] for seed in seeds) or 1.0
+        scores = {seed["id"]: seed["score"] / top for seed in seeds}
+        frontier = list(scores)
+        facts: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+        for hop in range(1, self.max_depth + 1):
+            if not frontier or len(facts) >= limit:
+                break
+            records = tx.run(
+                EXPAND_QUERY, frontier=frontier, fanout=self.max_fanout,
+                limit=min(len(frontier) * self.max_fanout, limit * self.max_fanout)
+            )
+            next_scores: Dict[str, float] = {}
+            for record in records:
+                row = record.data()
+                # Frontier scores already carry the decay of every hop taken to reach them
+                score = scores[row["from_id"]]
+                triple = (row["name"], row["relation"], row["neighbour"]) if row["outgoing"] else (row["neighbour"], row["relation"], row["name"])
+                if triple not in facts or facts[triple]["score"] < score:
+                    facts[triple] = {"subject": triple[0], "relation": triple[1], "object": triple[2], "score": score, "hops": hop}
+                if row["to_id"] not in scores:
+                    next_scores[row["to_id"]] = max(next_scores.get(row["to_id"], 0.0), score * self.hop_decay)
+            # Only the strongest neighbours go on to the next hop
+            frontier = sorted(next_scores, key=next_scores.get, reverse=True)[:self.seed_limit * self.max_fanout]
+            scores.update({node: next_scores[node] for node in frontier})
+
+        return sorted(facts.values(), key=lambda fact: (-fact["score"], fact["hops"]))[:limit]
+
+    def ensure_index(self):
+        """Create the full-text index over entity names once, if allowed (GRAPH_CREATE_INDEX)."""
+        if self._index_ready:
+            return
+        self._index_ready = True
+        labels = "|".join(f"`{label}`" for label in GRAPH_ENTITY_LABELS)
+        try:
+            with self.sessions.session() as session:
+                session.run(f"CREATE FULLTEXT INDEX `{self.index}` IF NOT EXISTS FOR (n:{labels}) ON EACH [n.name]").consume()
+        except Exception as e:
+            print(f"Could not create graph full-text index {self.index}: {e}")
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.cache_ttl:
+                self._cache.pop(key, None)
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _cache_put(self, key, facts: List[Dict[str, Any]]):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic(), facts)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "sessions_created": self.sessions.created
+        }
+
+    def close(self):
+        self.sessions.close()
@@ -0,0 +1,324 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import copy
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from ..utils.chunking import chunking_utility
+
+load_dotenv()
+
+TEXT_EXTENSIONS = (".txt", ".md", ".rst")
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+# Plain-text files are cut into documents of roughly this size at blank lines
+TEXT_SECTION_BYTES = int(os.getenv("INGEST_TEXT_SECTION_BYTES", str(1024 * 1024)))
+
+def _chunk_documents(docs: List[Dict[str, Any]], chunk_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    """Process-pool worker: split a batch of documents into token-sized chunks with stable ids."""
+    chunks = []
+    for doc in docs:
+        text = doc["text"]
+        for i, (start, end) in enumerate(chunking_utility.iter_spans(text, chunk_tokens, overlap_tokens)):
+            chunks.append({
+                "id": f"{doc['id']}:{i}",
+                "doc_id": doc["id"],
+                "chunk": i,
+                "start": start,
+                "end": end,
+                "text": text[start:end],
+                "metadata": doc.get("metadata") or {}
+            })
+    return chunks
+
+class Checkpoint:
+    """
+    Progress through the input files: path -> {"offset": bytes consumed, "done": bool}.
+    Saved atomically once every chunk of a batch is acknowledged, so a rerun
+    resumes after the last fully indexed batch. Chunk ids are deterministic,
+    so documents replayed after a crash overwrite themselves.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self, files: Dict[str, Dict[str, Any]]):
+        self.files = files
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"files": files, "updated_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+class IngestionStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.docs = 0
+        self.chunks = 0
+        self.failed = 0
+        self.errors: List[Any] = []
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "docs": self.docs,
+            "chunks": self.chunks,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "docs_per_sec": round(self.docs / elapsed, 2) if elapsed > 0 else None,
+            "chunks_per_sec": round(self.chunks / elapsed, 2) if elapsed > 0 else None
+        }
+
+def iter_files(paths: Iterable[str]) -> Iterator[str]:
+    """Supported files under `paths`, in a stable order so checkpoints stay valid."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(TEXT_EXTENSIONS + JSONL_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def read_documents(path: str, offset: int = 0, text_field: str = "text") -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Stream (document, end offset) pairs from one file, starting at byte `offset`.
+    JSONL lines are documents; plain text is cut into sections at blank lines.
+    Files are read line by line, so memory doesn't grow with file size.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if path.endswith(JSONL_EXTENSIONS):
+            while True:
+                start = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                doc = {
+                    "id": str(record.get("id") or f"{path}@{start}"),
+                    "text": record.get(text_field) or "",
+                    "metadata": record.get("metadata") or {k: v for k, v in record.items() if k not in ("id", text_field)}
+                }
+                yield doc, f.tell()
+        else:
+            start, lines, size = f.tell(), [], 0
+            while True:
+                line = f.readline()
+                if line:
+                    lines.append(line)
+                    size += len(line)
+                # Cut at a blank line once big enough, or hard at 4x the section size
+                if not line or (size >= TEXT_SECTION_BYTES and not line.strip()) or size >= 4 * TEXT_SECTION_BYTES:
+                    if size:
+                        text = b"".join(lines).decode("utf-8", errors="replace")
+                        yield {"id": f"{path}@{start}", "text": text, "metadata": {"source": path}}, f.tell()
+                    if not line:
+                        break
+                    start, lines, size = f.tell(), [], 0
+
+class IngestionPipeline:
+    """
+    Streams documents into the search index: read -> chunk (process pool) ->
+    embed -> `helpers.parallel_bulk`. Batches are read ahead only up to
+    `max_pending`, so memory stays bounded on multi-GB corpora. The
+    checkpoint never moves past a batch with a chunk that failed to index.
+    """
+    def __init__(self, os_client, index: str = None, embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 chunk_tokens: int = 256, overlap_tokens: int = 32, batch_docs: int = 256, workers: int = None,
+                 bulk_threads: int = 4, bulk_chunk_size: int = 500, checkpoint_path: str = None,
+                 text_field: str = "text", progress: Callable[[Dict[str, Any]], None] = None,
+                 vector_store=None, bulk_retries: int = 3, bulk_backoff: float = 2.0, max_failures: int = 1000):
+        from .search_service import SEARCH_INDEX
+        self.os_client = os_client
+        self.index = index or SEARCH_INDEX
+        self.embed = embed
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_docs = batch_docs
+        self.workers = (os.cpu_count() or 2) if workers is None else workers
+        self.max_pending = max(self.workers, 1) * 2
+        self.bulk_threads = bulk_threads
+        self.bulk_chunk_size = bulk_chunk_size
+        # Rejected (429) chunks are resent up to `bulk_retries` times with exponential backoff;
+        # past `max_failures` permanently failed chunks the run stops
+        self.bulk_retries = bulk_retries
+        self.bulk_backoff = bulk_backoff
+        self.max_failures = max_failures
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.text_field = text_field
+        self.progress = progress
+        # A local VectorStore takes the embeddings instead of the index mapping
+        self.vector_store = vector_store
+
+    def run(self, paths: Iterable[str]) -> Dict[str, Any]:
+        from opensearchpy import helpers
+
+        stats = IngestionStats()
+        self.ensure_index()
+        # One entry per batch: {"remaining": chunks not yet acknowledged, "failed": chunks that never made it, ...}
+        pending: deque = deque()
+        # (action, batch entry) per action handed to parallel_bulk, whose results come back in the same order
+        sent: deque = deque()
+        rejected: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        # Set by the first batch with a failed chunk: a rerun must start there
+        frozen = [False]
+
+        def settle():
+            while pending and pending[0]["remaining"] == 0:
+                entry = pending.popleft()
+                stats.docs += entry["docs"]
+                frozen[0] = frozen[0] or entry["failed"] > 0
+                if not frozen[0]:
+                    self.checkpoint.save(entry["state"])
+                if self.progress:
+                    self.progress(stats.summary())
+
+        def acknowledge(entry, ok, info):
+            entry["remaining"] -= 1
+            if ok:
+                stats.chunks += 1
+                return
+            entry["failed"] += 1
+            stats.failed += 1
+            if len(stats.errors) < 10:
+                stats.errors.append(info)
+            if stats.failed > self.max_failures:
+                raise helpers.BulkIndexError(f"{stats.failed} chunks failed to index", stats.errors)
+
+        def retry():
+            entries: Dict[str, deque] = {}
+            for action, entry in rejected:
+                entries.setdefault(action["_id"], deque()).append(entry)
+            time.sleep(self.bulk_backoff)
+            for ok, info in helpers.streaming_bulk(
+                self.os_client, [action for action, _ in rejected],
+                chunk_size=self.bulk_chunk_size,
+                max_retries=self.bulk_retries - 1,
+                initial_backoff=self.bulk_backoff,
+                raise_on_error=False
+            ):
+                acknowledge(entries[next(iter(info.values()))["_id"]].popleft(), ok, info)
+            rejected.clear()
+
+        def actions():
+            for chunks, state, docs in self._chunked_batches(paths):
+                vectors = self.embed([chunk["text"] for chunk in chunks]) if self.embed and chunks else None
+                if vectors is not None and self.vector_store is not None:
+                    self.vector_store.add(
+                        [chunk["id"] for chunk in chunks], vectors,
+                        [chunk["text"] for chunk in chunks], [chunk["metadata"] for chunk in chunks]
+                    )
+                entry = {"remaining": len(chunks), "failed": 0, "state": state, "docs": docs}
+                pending.append(entry)
+                for i, chunk in enumerate(chunks):
+                    source = {key: chunk[key] for key in ("text", "doc_id", "chunk", "start", "end", "metadata")}
+                    if vectors is not None and self.vector_store is None:
+                        source["embedding"] = vectors[i]
+                    action = {"_index": self.index, "_id": chunk["id"], "_source": source}
+                    sent.append((action, entry))
+                    yield action
+
+        with self._bulk_settings():
+            for ok, info in helpers.parallel_bulk(
+                self.os_client, actions(),
+                thread_count=self.bulk_threads,
+                chunk_size=self.bulk_chunk_size,
+                raise_on_error=False
+            ):
+                settle()
+                action, entry = sent.popleft()
+                if not ok and self.bulk_retries and next(iter(info.values())).get("status") == 429:
+                    # The cluster is shedding load: resend these a chunk at a time, with backoff
+                    rejected.append((action, entry))
+                    if len(rejected) >= self.bulk_chunk_size:
+                        retry()
+                else:
+                    acknowledge(entry, ok, info)
+                settle()
+            if rejected:
+                retry()
+            settle()
+        return {**stats.summary(), "errors": stats.errors}
+
+    def _chunked_batches(self, paths: Iterable[str]):
+        """(chunks, checkpoint state, doc count) per batch, in input order."""
+        batches = self._read_batches(paths)
+        if not self.workers:
+            for docs, state in batches:
+                yield _chunk_documents(docs, self.chunk_tokens, self.overlap_tokens), state, len(docs)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            inflight: deque = deque()
+            for docs, state in batches:
+                inflight.append((pool.submit(_chunk_documents, docs, self.chunk_tokens, self.overlap_tokens), state, len(docs)))
+                if len(inflight) >= self.max_pending:
+                    future, state, count = inflight.popleft()
+                    yield future.result(), state, count
+            while inflight:
+                future, state, count = inflight.popleft()
+                yield future.result(), state, count
+
+    def _read_batches(self, paths: Iterable[str]):
+        progress = copy.deepcopy(self.checkpoint.files)
+        docs = []
+        for path in iter_files(paths):
+            entry = progress.setdefault(path, {"offset": 0, "done": False})
+            if entry["done"]:
+                continue
+            for doc, offset in read_documents(path, entry["offset"], self.text_field):
+                docs.append(doc)
+                entry["offset"] = offset
+                if len(docs) >= self.batch_docs:
+                    yield docs, copy.deepcopy(progress)
+                    docs = []
+            entry["done"] = True
+        yield docs, copy.deepcopy(progress)
+
+    def ensure_index(self):
+        """Create the index with a knn_vector mapping sized to the embedder, if missing."""
+        if self.os_client.indices.exists(index=self.index):
+            return
+        properties = {
+            "text": {"type": "text"},
+            "doc_id": {"type": "keyword"},
+            "chunk": {"type": "integer"},
+            "start": {"type": "integer", "index": False},
+            "end": {"type": "integer", "index": False},
+            "metadata": {"type": "object"}
+        }
+        body = {"mappings": {
+            "properties": properties,
+            # Exact-match metadata so search filters can use terms queries
+            "dynamic_templates": [{"metadata_strings": {
+                "path_match": "metadata.*", "match_mapping_type": "string", "mapping": {"type": "keyword"}
+            }}]
+        }}
+        if self.embed and self.vector_store is None:
+            properties["embedding"] = {"type": "knn_vector", "dimension": len(self.embed(["dimension probe"])[0])}
+            body["settings"] = {"index": {"knn": True}}
+        self.os_client.indices.create(index=self.index, body=body)
+
+    @contextmanager
+    def _bulk_settings(self):
+        """Pause index refreshes for the duration of the load, then restore the index's own interval."""
+        current = self.os_client.indices.get_settings(index=self.index, name="index.refresh_interval")
+        # None (not set on the index) puts the cluster default back
+        interval = next(iter(current.values()), {}).get("settings", {}).get("index", {}).get("refresh_interval")
+        self.os_client.indices.put_settings(index=self.index, body={"index": {"refresh_interval": "-1"}})
+        try:
+            yield
+        finally:
+            self.os_client.indices.put_settings(index=self.index, body={"index": {"refresh_interval": interval}})
+            if self.vector_store is not None:
+                self.vector_store.save()
@@ -1,58 +1,244 @@
 from typing import Dict, Any, List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import inspect
 import json
+import os
+import time
 import importlib.util
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..models.models import Tool
+from .agent_repository import agent_repository
+from .tool_sandbox import bytecode_cache, tool_workers
+from ..utils.metrics import TOOL_CALL_SECONDS
+from ..utils.tool_cache import MISS, SKIPPED, tool_result_cache
+
+# Execution options a tool can declare under this key of its JSON schema, e.g.
+# {"type": "object", "properties": {...}, "x-mcp": {"cpu_bound": true, "timeout": 10}}
+TOOL_OPTIONS_KEY = "x-mcp"
+
+# Run tool code in the pre-forked worker pool (tool_sandbox) instead of exec'ing it in the API process
+SANDBOX_TOOLS = os.getenv("MCP_TOOL_SANDBOX", "true").lower() == "true"
+
+# Tools that declare {"cacheable": true, "cache_ttl": seconds} in x-mcp have their results memoized
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+DEFAULT_TOOL_CACHE_TTL = int(os.getenv("TOOL_CACHE_TTL", "300"))
+
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "30"))
+DEFAULT_TOOL_CONCURRENCY = int(os.getenv("MCP_MAX_TOOL_CONCURRENCY", "4"))
+
+# Shared by every agent in the process so total tool threads/processes stay bounded
+_thread_pool = ThreadPoolExecutor(max_workers=int(os.getenv("MCP_TOOL_THREADS", "16")), thread_name_prefix="mcp-tool")
+_process_pool = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=int(os.getenv("MCP_TOOL_PROCESSES", str(os.cpu_count() or 2))))
+    return _process_pool
+
+# Per worker process: code hash -> compiled tool function
+_worker_functions: Dict[str, Any] = {}
+
+def _run_tool_source(code: str, name: str, kwargs: Dict[str, Any]) -> Any:
+    """Run a tool inside a process-pool worker. Functions built by exec() can't be
+    pickled, so the worker receives the source and compiles it once per version."""
+    key = hashlib.sha256(code.encode()).hexdigest()
+    func = _worker_functions.get(key)
+    if func is None:
+        namespace = {}
+        exec(code, {}, namespace)
+        func = _worker_functions[key] = namespace[name]
+    if inspect.iscoroutinefunction(func):
+        return asyncio.run(func(**kwargs))
+    return func(**kwargs)
+
+class SandboxedTool:
+    """Stand-in for a tool function in `active_tools`; calling it runs the tool in a worker."""
+    def __init__(self, compiled):
+        self.compiled = compiled
+
+    def __call__(self, **kwargs):
+        return tool_workers.call(self.compiled, kwargs, timeout=DEFAULT_TOOL_TIMEOUT)
 
 class MCPServer:
     """
     Model Context Protocol (MCP) Server implementation for handling dynamic tools.
     """
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, sandbox: bool = None, result_cache=None, repository=None):
         self.db = db
+        self.repository = repository or agent_repository
+        self.sandbox = SANDBOX_TOOLS if sandbox is None else sandbox
+        self.result_cache = result_cache if result_cache is not None else (tool_result_cache if TOOL_CACHE_ENABLED else None)
         self.active_tools: Dict[str, Any] = {}
+        self.tool_sources: Dict[str, str] = {}
+        self.tool_options: Dict[str, Dict[str, Any]] = {}
+        # Code hash per tool (part of the result cache key) and argument defaults from its schema
+        self.tool_versions: Dict[str, str] = {}
+        self.tool_defaults: Dict[str, Dict[str, Any]] = {}
+        self.agent_config: Dict[str, Any] = {}
+        self.max_concurrency = DEFAULT_TOOL_CONCURRENCY
+        self._semaphore = None
 
     def load_tools(self, agent_id: str):
-        """Load tools assigned to a specific agent from the DB."""
-        from ..models.models import Agent
-        agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
-        if not agent:
+        """Load the tools assigned to an agent: the agent from the repository, tool code from the DB."""
+        record = self.repository.get(agent_id)
+        if not record:
             return []
-            
+        self._configure(record)
+        tools = self.db.query(Tool).filter(Tool.id.in_(record["tool_ids"])).all() if record["tool_ids"] else []
+        return self._register_tools(self._in_order(record, tools))
+
+    async def aload_tools(self, agent_id: str):
+        """Async variant of `load_tools` for an AsyncSession."""
+        record = await self.repository.aget(agent_id)
+        if not record:
+            return []
+        self._configure(record)
+        tools = []
+        if record["tool_ids"]:
+            tools = (await self.db.execute(select(Tool).where(Tool.id.in_(record["tool_ids"])))).scalars().all()
+        return self._register_tools(self._in_order(record, tools))
+
+    @staticmethod
+    def _in_order(record: Dict[str, Any], tools: List[Tool]) -> List[Tool]:
+        # Keep the record's (sorted) order, so the LLM sees the same tool list on every build
+        by_id = {tool.id: tool for tool in tools}
+        return [by_id[tool_id] for tool_id in record["tool_ids"] if tool_id in by_id]
+
+    def _configure(self, record: Dict[str, Any]):
+        self.agent_config = record.get("config") or {}
+        self.max_concurrency = int(self.agent_config.get("max_tool_concurrency", DEFAULT_TOOL_CONCURRENCY))
+        self._semaphore = None
+
+    def _register_tools(self, tools: List[Tool]):
         tools_metadata = []
-        for tool in agent.tools:
+        for tool in tools:
             self._register_tool_logic(tool)
+            schema = dict(tool.schema or {})
+            self.tool_options[tool.name] = schema.pop(TOOL_OPTIONS_KEY, {})
+            self.tool_versions[tool.name] = hashlib.sha256((tool.code or "").encode()).hexdigest()[:16]
+            self.tool_defaults[tool.name] = {
+                arg: spec["default"] for arg, spec in (schema.get("properties") or {}).items()
+                if isinstance(spec, dict) and "default" in spec
+            }
             tools_metadata.append({
                 "name": tool.name,
                 "description": tool.description,
-                "parameters": tool.schema
+                "parameters": schema
             })
         return tools_metadata
 
     def _register_tool_logic(self, tool_record: Tool):
-        """Dynamically execute tool code and register it."""
+        """Compile tool code for the sandbox (or exec it in-process when the sandbox is off) and register it."""
         try:
-            # Simple execution of stored code - in production, use a sandboxed environment
+            if self.sandbox:
+                # Compiled once per (tool, code version); the code only ever runs in a worker
+                compiled = bytecode_cache.get(getattr(tool_record, "id", None) or tool_record.name, tool_record.name, tool_record.code)
+                self.active_tools[tool_record.name] = SandboxedTool(compiled)
+                self.tool_sources[tool_record.name] = tool_record.code
+                return
             local_namespace = {}
             exec(tool_record.code, {}, local_namespace)
-            
+
             # Expecting a function with the same name as tool_record.name
             if tool_record.name in local_namespace:
                 self.active_tools[tool_record.name] = local_namespace[tool_record.name]
+                self.tool_sources[tool_record.name] = tool_record.code
         except Exception as e:
             print(f"Failed to register tool {tool_record.name}: {e}")
 
     async def call_tool(self, tool_name: str, **kwargs) -> Any:
-        """Execute a registered tool."""
+        """Execute a registered tool without blocking the event loop."""
+        result, _ = await self._call(tool_name, kwargs)
+        return result
+
+    async def _call(self, tool_name: str, kwargs: Dict[str, Any]):
+        """(result, cache outcome); cacheable tools go through the result cache. Timed by tool and outcome."""
         if tool_name not in self.active_tools:
             raise ValueError(f"Tool {tool_name} not found or not registered.")
-            
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result, outcome = await self._call_registered(tool_name, kwargs)
+            return result, outcome
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            TOOL_CALL_SECONDS.labels(tool_name, outcome).observe(time.perf_counter() - start)
+
+    async def _call_registered(self, tool_name: str, kwargs: Dict[str, Any]):
+        options = self.tool_options.get(tool_name, {})
+        if not options.get("cacheable") or self.result_cache is None:
+            return await self._execute(tool_name, options, kwargs), SKIPPED
+        # Omitted arguments and their schema defaults are the same call
+        args = {**self.tool_defaults.get(tool_name, {}), **kwargs}
+        return await self.result_cache.get_or_call(
+            tool_name, self.tool_versions.get(tool_name, ""), args,
+            int(options.get("cache_ttl", DEFAULT_TOOL_CACHE_TTL)),
+            lambda: self._execute(tool_name, options, kwargs)
+        )
+
+    async def _execute(self, tool_name: str, options: Dict[str, Any], kwargs: Dict[str, Any]) -> Any:
         func = self.active_tools[tool_name]
+        timeout = options.get("timeout", DEFAULT_TOOL_TIMEOUT)
+
+        if isinstance(func, SandboxedTool):
+            # The pool enforces the timeout itself by killing the worker
+            return await tool_workers.acall(
+                func.compiled, kwargs, timeout=timeout,
+                cpu_seconds=options.get("cpu_seconds"), memory_mb=options.get("memory_mb")
+            )
+
         # Handle both sync and async functions
-        import inspect
-        if inspect.iscoroutinefunction(func):
-            return await func(**kwargs)
-        return func(**kwargs)
+        if inspect.iscoroutinefunction(func) and not options.get("cpu_bound"):
+            call = func(**kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            if options.get("cpu_bound"):
+                call = loop.run_in_executor(
+                    _get_process_pool(), _run_tool_source, self.tool_sources[tool_name], tool_name, kwargs
+                )
+            else:
+                call = loop.run_in_executor(_thread_pool, functools.partial(func, **kwargs))
+        # wait_for cancels the call on timeout; a pool job that already started runs to completion
+        return await asyncio.wait_for(call, timeout=timeout)
+
+    async def call_tools(self, tool_calls: List[Dict[str, Any]], metrics: Dict[str, Dict[str, int]] = None) -> List[str]:
+        """
+        Run the LLM's tool calls concurrently, at most `max_concurrency` at a time
+        for this agent. Outputs come back in the order of `tool_calls`; failures
+        and timeouts become error strings so the model can react to them.
+        Per-tool call, error and result-cache counts are added to `metrics`.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        metrics = {} if metrics is None else metrics
+
+        async def run(tool_call: Dict[str, Any]) -> str:
+            counts = metrics.setdefault(tool_call["name"], {"calls": 0, "errors": 0, "cache_hits": 0, "cache_misses": 0})
+            counts["calls"] += 1
+            async with self._semaphore:
+                try:
+                    result, outcome = await self._call(tool_call["name"], tool_call["args"])
+                except asyncio.TimeoutError:
+                    counts["errors"] += 1
+                    return f"Error: tool {tool_call['name']} timed out"
+                except Exception as e:
+                    counts["errors"] += 1
+                    return f"Error: tool {tool_call['name']} failed: {e}"
+            if outcome == MISS:
+                counts["cache_misses"] += 1
+            elif outcome != SKIPPED:
+                counts["cache_hits"] += 1
+            return str(result)
+
+        return await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
 
 def get_mcp_server(db: Session):
     return MCPServer(db)
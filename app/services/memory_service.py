@@ -1,52 +1,318 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import DateTime, cast, delete, insert, literal, or_, select, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from ..core.providers import service_registry
 from ..models.models import Memory, MemoryTier
+from ..utils.batch_writer import BatchWriter
+import hashlib
 import json
+import os
+import threading
+import time
+
+load_dotenv()
+
+TIER_TTL = {
+    MemoryTier.TEMP: timedelta(hours=8),
+    MemoryTier.SHORT_TERM: timedelta(days=7),
+    # Long term doesn't expire by default in this logic
+    MemoryTier.LONG_TERM: None
+}
+# add_memory queues rows for MemoryWriter instead of committing one transaction per call
+MEMORY_WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "true").lower() == "true"
+DEDUP_COLUMNS = ["session_id", "tier", "content_hash"]
+# Sessions per IN (...) list in promote_sessions
+PROMOTE_SESSION_CHUNK = 1000
+
+def content_hash(content: Any) -> str:
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+
+def insert_ignore(dialect_name: str):
+    """INSERT into memories that skips rows already present in the session and tier (same content hash)."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(Memory).prefix_with("IGNORE", dialect="mysql")
+    return dialect_insert(Memory).on_conflict_do_nothing(index_elements=DEDUP_COLUMNS)
+
+def typed_literal(value: Any, type_, dialect_name: str):
+    """
+    A parameter for an INSERT ... SELECT list. PostgreSQL reads a bare one as
+    text, so it gets a CAST; SQLite would turn a CAST to DATETIME into a number.
+    """
+    if dialect_name == "sqlite":
+        return literal(value, type_)
+    return cast(literal(value, type_), type_)
+
+def _snapshot(memory: Memory) -> Memory:
+    """A detached copy that stays readable after its session is closed."""
+    return Memory(
+        id=memory.id, session_id=memory.session_id, tier=memory.tier, content=memory.content,
+        content_hash=memory.content_hash, created_at=memory.created_at, expires_at=memory.expires_at,
+        promoted_at=memory.promoted_at
+    )
+
+def _live(memories: List[Memory], now: datetime) -> List[Memory]:
+    return [memory for memory in memories if memory.expires_at is None or memory.expires_at > now]
+
+class HotMemoryCache:
+    """
+    In-process LRU + TTL of the TEMP tier for recently active sessions. A
+    session is cached on its first read and kept current by this worker's
+    writes; the TTL bounds staleness from writes made by other workers.
+    """
+    def __init__(self, max_sessions: int = None, ttl: float = None):
+        self.max_sessions = int(os.getenv("MEMORY_HOT_SESSIONS", "10000")) if max_sessions is None else max_sessions
+        self.ttl = float(os.getenv("MEMORY_HOT_TTL", "60")) if ttl is None else ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[Memory]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> Optional[List[Memory]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(session_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return _live(entry[1], datetime.utcnow())
+
+    def put(self, session_id: str, memories: List[Memory]):
+        if self.max_sessions <= 0:
+            return
+        with self._lock:
+            self._entries[session_id] = (time.monotonic(), list(memories))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def append(self, session_id: str, memory: Memory):
+        """Add a new TEMP memory to a session that is already cached."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            # The unique (session_id, tier, content_hash) constraint drops repeats in the DB; match it
+            if entry is not None and all(cached.content_hash != memory.content_hash for cached in entry[1]):
+                entry[1].append(memory)
+
+    def invalidate(self, session_id: str = None):
+        """Drop one session, or every session when None."""
+        with self._lock:
+            if session_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"sessions": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+class MemoryWriter(BatchWriter):
+    """
+    Write-behind buffer for memories (see BatchWriter). Rows stay visible
+    through `pending` until they are committed; rows already stored for
+    the same session, tier and content are skipped.
+    """
+    env_prefix = "MEMORY"
+    default_flush_interval = 1.0
+    thread_name = "memory-writer"
+    noun = "memories"
+
+    def __init__(self, bind=None, batch_size: int = None, flush_interval: float = None, max_buffer: int = None):
+        if bind is None:
+            from ..db.session import engine
+            bind = engine
+        super().__init__(insert_ignore(bind.dialect.name), bind, batch_size, flush_interval, max_buffer)
+
+    def pending(self, session_id: str, tier: MemoryTier = None) -> List[Dict[str, Any]]:
+        """Queued or in-flight rows for a session, so reads see this worker's own writes."""
+        return [row for row in self.queued() if row["session_id"] == session_id and (tier is None or row["tier"] == tier)]
 
 class MemoryService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, writer: MemoryWriter = None, hot: HotMemoryCache = None,
+                 write_behind: bool = None):
         self.db = db
+        self.write_behind = MEMORY_WRITE_BEHIND if write_behind is None else write_behind
+        self.writer = writer if writer is not None else memory_writer
+        self.hot = hot if hot is not None else hot_memory
 
     def add_memory(self, session_id: str, tier: MemoryTier, content: dict):
-        expires_at = None
-        if tier == MemoryTier.TEMP:
-            expires_at = datetime.utcnow() + timedelta(hours=8)
-        elif tier == MemoryTier.SHORT_TERM:
-            expires_at = datetime.utcnow() + timedelta(days=7)
-        # Long term doesn't expire by default in this logic
-
-        memory = Memory(
-            session_id=session_id,
-            tier=tier,
-            content=content,
-            expires_at=expires_at
-        )
-        self.db.add(memory)
+        if self.write_behind:
+            return self._enqueue(session_id, tier, content)
+        row = self._row(session_id, tier, content)
+        self.db.execute(insert_ignore(self.db.get_bind().dialect.name), row)
         self.db.commit()
+        if tier == MemoryTier.TEMP:
+            self.hot.append(session_id, Memory(**row))
+
+    async def aadd_memory(self, session_id: str, tier: MemoryTier, content: dict):
+        """Same as `add_memory` for an AsyncSession; with write-behind it never touches the session."""
+        if self.write_behind:
+            return self._enqueue(session_id, tier, content)
+        row = self._row(session_id, tier, content)
+        await self.db.execute(insert_ignore(self.db.get_bind().dialect.name), row)
+        await self.db.commit()
+        if tier == MemoryTier.TEMP:
+            self.hot.append(session_id, Memory(**row))
+
+    def _enqueue(self, session_id: str, tier: MemoryTier, content: dict):
+        row = self._row(session_id, tier, content)
+        self.writer.add(row)
+        # Building an ORM object is most of the cost of a write; only do it for cached sessions
+        if tier == MemoryTier.TEMP and session_id in self.hot:
+            self.hot.append(session_id, Memory(**row))
+
+    @staticmethod
+    def _row(session_id: str, tier: MemoryTier, content: dict) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        ttl = TIER_TTL.get(tier)
+        return {
+            "session_id": session_id,
+            "tier": tier,
+            "content": content,
+            "content_hash": content_hash(content),
+            "created_at": now,
+            "expires_at": now + ttl if ttl else None
+        }
 
     def get_memories(self, session_id: str, tier: MemoryTier = None):
+        """
+        Unexpired memories for a session, including this worker's queued
+        writes. The TEMP tier of a recently read session is served from
+        the hot cache without a query.
+        """
+        if tier == MemoryTier.TEMP:
+            cached = self.hot.get(session_id)
+            if cached is not None:
+                return cached
+
         query = self.db.query(Memory).filter(Memory.session_id == session_id)
         if tier:
             query = query.filter(Memory.tier == tier)
-        
+
         # Filter out expired memories
-        query = query.filter((Memory.expires_at == None) | (Memory.expires_at > datetime.utcnow()))
-        
-        return query.all()
+        query = query.filter(Memory.expires_at.is_(None) | (Memory.expires_at > datetime.utcnow()))
+
+        if self.write_behind:
+            with self.writer.commit_lock:
+                memories = query.all()
+                pending = self.writer.pending(session_id, tier)
+            memories += _live([Memory(**row) for row in pending], datetime.utcnow())
+        else:
+            memories = query.all()
+        if tier == MemoryTier.TEMP:
+            self.hot.put(session_id, [_snapshot(memory) if memory.id else memory for memory in memories])
+        return memories
 
-    def promote_memory(self, session_id: str, source_tier: MemoryTier, target_tier: MemoryTier):
+    def promote_memory(self, session_id: str, source_tier: MemoryTier, target_tier: MemoryTier) -> int:
         """Move important context from temporary/short-term to long-term for learning."""
-        memories = self.get_memories(session_id, source_tier)
-        for mem in memories:
-            new_memory = Memory(
-                session_id=session_id,
-                tier=target_tier,
-                content=mem.content,
-                expires_at=None if target_tier == MemoryTier.LONG_TERM else datetime.utcnow() + timedelta(days=7)
-            )
-            self.db.add(new_memory)
-        self.db.commit()
+        return self.promote_sessions([session_id], source_tier, target_tier)
+
+    def promote_sessions(self, session_ids: Optional[List[str]], source_tier: MemoryTier, target_tier: MemoryTier,
+                         chunk_size: int = None) -> int:
+        """
+        Copy the unexpired, not yet promoted `source_tier` memories of
+        `session_ids` (every session when None) into `target_tier` with
+        server-side INSERT ... SELECT statements, then mark the sources with
+        `promoted_at`. Each chunk of `chunk_size` source rows is one
+        transaction. Content already in the target tier is skipped, so the
+        promotion is idempotent. Returns the rows inserted.
+        """
+        if self.write_behind:
+            # Queued rows are part of the session too
+            self.writer.flush()
+        chunk_size = chunk_size or int(os.getenv("MEMORY_PROMOTE_CHUNK", "10000"))
+        now = datetime.utcnow()
+        ttl = TIER_TTL.get(target_tier)
+        dialect = self.db.get_bind().dialect.name
+        statement = insert_ignore(dialect)
+        columns = ["session_id", "tier", "content", "content_hash", "created_at", "expires_at"]
+        scope = [
+            Memory.tier == source_tier,
+            Memory.promoted_at.is_(None),
+            or_(Memory.expires_at.is_(None), Memory.expires_at > now)
+        ]
+        if session_ids is None:
+            groups = [None]
+        else:
+            session_ids = list(dict.fromkeys(session_ids))
+            groups = [session_ids[i:i + PROMOTE_SESSION_CHUNK] for i in range(0, len(session_ids), PROMOTE_SESSION_CHUNK)]
+
+        promoted = 0
+        for group in groups:
+            where = scope + ([Memory.session_id.in_(group)] if group is not None else [])
+            last_id = 0
+            while True:
+                # Id of the last row in this chunk; None means the rest fits in one
+                upper = self.db.execute(
+                    select(Memory.id).where(*where, Memory.id > last_id).order_by(Memory.id).offset(chunk_size - 1).limit(1)
+                ).scalar()
+                bounds = [Memory.id > last_id] + ([Memory.id <= upper] if upper is not None else [])
+                source = select(
+                    Memory.session_id, typed_literal(target_tier, Memory.tier.type, dialect), Memory.content,
+                    # created_at is the promotion time: the training export's lag window relies on it
+                    Memory.content_hash, typed_literal(now, DateTime, dialect),
+                    typed_literal(now + ttl if ttl else None, DateTime, dialect)
+                ).where(*where, *bounds)
+                promoted += max(self.db.execute(statement.from_select(columns, source)).rowcount, 0)
+                self.db.execute(
+                    update(Memory).where(*where, *bounds).values(promoted_at=now),
+                    execution_options={"synchronize_session": False}
+                )
+                self.db.commit()
+                if upper is None:
+                    break
+                last_id = upper
+
+        if target_tier == MemoryTier.TEMP:
+            for session_id in session_ids if session_ids is not None else [None]:
+                self.hot.invalidate(session_id)
+        return promoted
+
+    def purge_expired(self, batch_size: int = None, max_batches: int = None) -> int:
+        """
+        Delete expired rows in chunks of `batch_size`, one short transaction
+        each, so the purge never holds long locks. Returns the rows deleted.
+        """
+        batch_size = batch_size or int(os.getenv("MEMORY_PURGE_BATCH", "5000"))
+        now = datetime.utcnow()
+        deleted, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            ids = select(Memory.id).where(Memory.expires_at <= now).limit(batch_size).scalar_subquery()
+            count = self.db.execute(delete(Memory).where(Memory.id.in_(ids)), execution_options={"synchronize_session": False}).rowcount
+            self.db.commit()
+            deleted += count
+            batches += 1
+            if count < batch_size:
+                break
+        return deleted
 
     def get_all_long_term_for_fine_tuning(self):
         """Fetch all historical data for the fine-tuning pipeline."""
         return self.db.query(Memory).filter(Memory.tier == MemoryTier.LONG_TERM).all()
+
+def get_memory_service(db: Session):
+    return MemoryService(db)
+
+def run_purge(batch_size: int = None) -> int:
+    """One purge pass on a fresh session (for the periodic job and scripts)."""
+    from ..db.session import SessionLocal
+    db = SessionLocal()
+    try:
+        return MemoryService(db).purge_expired(batch_size)
+    finally:
+        db.close()
+
+hot_memory = HotMemoryCache()
+memory_writer = service_registry.register("memory_writer", MemoryWriter)
@@ -0,0 +1,203 @@
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+import hashlib
+import math
+import os
+import re
+import threading
+from dotenv import load_dotenv
+from ..core.providers import service_registry
+from ..utils.chunking import truncate_tokens
+
+load_dotenv()
+
+# Where SearchService applies the reranker:
+# off: never; fused: to the fused top RERANK_CANDIDATES; lists: to each backend list before fusion
+RERANK_STAGES = ("off", "fused", "lists")
+RERANK_STAGE = os.getenv("RERANK_STAGE", "fused")
+
+_WORD_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a about an and any are as at be best by can could do does doing for from get how i if in into is it its make many me "
+    "my of on or should so some than that the their them then there these this to use used using was way we what when "
+    "where which who why will with would you your".split()
+)
+
+def _terms(text: str) -> List[str]:
+    # Light stemming: plural/verb endings only, so "indexes" matches "index"
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        for suffix in ("ies", "es", "s", "ing", "ed"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+                break
+        terms.append(word)
+    return terms
+
+class LexicalReranker:
+    """
+    Fast feature model over (query, passage) pairs, no model download:
+    BM25 with IDF from the candidate set, query-term coverage, the tightest
+    window holding the matched terms, and query-bigram matches.
+    """
+    name = "lexical"
+    # A passage's score depends on the rest of the batch (IDF, top BM25), so it can't be cached on its own
+    cacheable = False
+    WEIGHTS = {"bm25": 1.0, "coverage": 1.0, "proximity": 0.25, "bigrams": 0.5}
+    # Lexical features miss paraphrase, so the first-stage order still counts
+    prior_weight = 1.0
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        query_terms = [term for term in _terms(query) if term not in _STOPWORDS] or _terms(query)
+        unique = list(dict.fromkeys(query_terms))
+        bigrams = set(zip(query_terms, query_terms[1:]))
+        docs = [_terms(passage) for passage in passages]
+        if not unique or not docs:
+            return [0.0] * len(passages)
+
+        df = Counter(term for doc in docs for term in set(doc) & set(unique))
+        n = len(docs)
+        avg_len = sum(len(doc) for doc in docs) / n or 1.0
+        idf = {term: math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5)) for term in unique}
+
+        features = []
+        for doc in docs:
+            tf = Counter(doc)
+            norm = self.k1 * (1 - self.b + self.b * len(doc) / avg_len)
+            bm25 = sum(idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in unique if tf[t])
+            matched = [t for t in unique if tf[t]]
+            doc_bigrams = set(zip(doc, doc[1:]))
+            features.append({
+                "bm25": bm25,
+                "coverage": len(matched) / len(unique),
+                "proximity": len(matched) / self._window(doc, set(matched)) if len(matched) > 1 else float(bool(matched)),
+                "bigrams": len(bigrams & doc_bigrams) / len(bigrams) if bigrams else 0.0
+            })
+        top_bm25 = max(f["bm25"] for f in features) or 1.0
+        return [
+            sum(self.WEIGHTS[name] * (value / top_bm25 if name == "bm25" else value) for name, value in f.items())
+            for f in features
+        ]
+
+    @staticmethod
+    def _window(doc: List[str], matched: set) -> int:
+        """Length of the shortest span of `doc` containing every term in `matched`."""
+        best, counts, have, left = len(doc), Counter(), 0, 0
+        for right, term in enumerate(doc):
+            if term in matched:
+                counts[term] += 1
+                have += counts[term] == 1
+            while have == len(matched):
+                best = min(best, right - left + 1)
+                if doc[left] in matched:
+                    counts[doc[left]] -= 1
+                    have -= counts[doc[left]] == 0
+                left += 1
+        return best
+
+class CrossEncoderReranker:
+    """CPU cross-encoder from sentence-transformers (optional dependency)."""
+    prior_weight = 0.0
+    cacheable = True
+
+    def __init__(self, model_name: str = None, batch_size: int = 32):
+        from sentence_transformers import CrossEncoder
+        self.model_name = model_name or os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        self.batch_size = batch_size
+
+    @property
+    def name(self) -> str:
+        return f"cross-encoder:{self.model_name}"
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        return [float(s) for s in self.model.predict([(query, p) for p in passages], batch_size=self.batch_size)]
+
+def model_from_env():
+    """RERANK_MODEL=lexical (default) or a sentence-transformers cross-encoder name."""
+    model = os.getenv("RERANK_MODEL", "lexical")
+    return LexicalReranker() if model == "lexical" else CrossEncoderReranker(model)
+
+class Reranker:
+    """
+    Rescores retrieved hits against the query. Passages are cut to
+    `max_tokens` first and results come back sorted with a `rerank_score`.
+    The model score is blended with the input order: + prior_weight /
+    (1 + rank). Models whose scores depend on the pair alone (`cacheable`)
+    are only asked about uncached (query, doc id) pairs.
+    """
+    def __init__(self, model=None, max_tokens: int = None, cache_size: int = None, prior_weight: float = None):
+        self.model = model if model is not None else model_from_env()
+        if prior_weight is None:
+            prior_weight = float(os.getenv("RERANK_PRIOR_WEIGHT", str(getattr(self.model, "prior_weight", 0.0))))
+        self.prior_weight = prior_weight
+        self.max_tokens = max_tokens or int(os.getenv("RERANK_MAX_TOKENS", "256"))
+        self.cache_size = int(os.getenv("RERANK_CACHE_SIZE", "10000")) if cache_size is None else cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pairs_scored = 0
+
+    def rerank(self, query: str, hits: List[Dict[str, Any]], top_k: int = None) -> List[Dict[str, Any]]:
+        if not hits:
+            return []
+        cacheable = self.cache_size > 0 and getattr(self.model, "cacheable", False)
+        if cacheable:
+            query_key = hashlib.blake2b(" ".join(query.lower().split()).encode(), digest_size=16).hexdigest()
+            keys = [(self.model.name, query_key, str(hit.get("id", i))) for i, hit in enumerate(hits)]
+            scores = self._cached(keys)
+        else:
+            scores = [None] * len(hits)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            fresh = self.model.score(query, [truncate_tokens(hits[i].get("text", ""), self.max_tokens) for i in missing])
+            self.pairs_scored += len(missing)
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+            if cacheable:
+                self._store([(keys[i], scores[i]) for i in missing])
+
+        ranked = sorted(
+            ({**hit, "rerank_score": score + self.prior_weight / (1 + rank)} for rank, (hit, score) in enumerate(zip(hits, scores))),
+            key=lambda hit: hit["rerank_score"], reverse=True
+        )
+        return ranked[:top_k] if top_k else ranked
+
+    def _cached(self, keys) -> List[float]:
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                scores.append(score)
+            return scores
+
+    def _store(self, entries):
+        with self._lock:
+            for key, score in entries:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "model": self.model.name,
+            "cache_size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "pairs_scored": self.pairs_scored
+        }
+
+reranker = service_registry.register("reranker", Reranker)
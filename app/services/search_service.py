@@ -1,74 +1,430 @@
-from opensearchpy import OpenSearch
-from neo4j import GraphDatabase
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import asyncio
+import functools
 import os
+import time
+from typing import Any, Dict, List
 from dotenv import load_dotenv
+from ..core.providers import service_registry
+from .embedding_service import SEARCH_QUERY, embedding_service
+from .fusion import DEFAULT_WEIGHTS, fuse
+from .graph_retrieval import GraphRetriever
+from .reranker import RERANK_STAGE, RERANK_STAGES, reranker
+from .vector_store import VectorStore, vector_store_from_env
+from ..utils.metrics import SEARCH_ERRORS, SEARCH_STAGE_SECONDS
 
 load_dotenv()
 
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "docs")
+# Only these fields come back from OpenSearch; never the embedding vector
+SOURCE_FIELDS = [field.strip() for field in os.getenv("SEARCH_SOURCE_FIELDS", "text,metadata").split(",") if field.strip()]
+BACKENDS = ("bm25", "vector", "graph")
+BACKEND_TIMEOUTS = {
+    backend: float(os.getenv(f"SEARCH_TIMEOUT_{backend.upper()}", "2.0")) for backend in BACKENDS
+}
+DEFAULT_FUSION = os.getenv("SEARCH_FUSION", "rrf")
+# separate: one search per list; msearch: every BM25/kNN query in one _msearch;
+# hybrid: one OpenSearch hybrid query per search text, normalised by SEARCH_PIPELINE
+SEARCH_MODES = ("separate", "msearch", "hybrid")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "msearch")
+SEARCH_PIPELINE = os.getenv("SEARCH_PIPELINE", "")
+# Candidates fetched from fusion for the reranker to reorder before the final top_k cut
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+# Embed queries that arrive without a vector so the kNN leg always runs
+EMBED_QUERIES = os.getenv("SEARCH_EMBED_QUERIES", "true").lower() == "true"
+
+def search_options(agent_config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Fusion and reranking settings for an agent, read from `config["search"]`, e.g.
+    {"fusion": "weighted", "weights": {"bm25": 0.5, "vector": 1.0, "graph": 0.0}, "rerank": "off"}.
+    """
+    options = (agent_config or {}).get("search") or {}
+    return {
+        "fusion": options.get("fusion", DEFAULT_FUSION),
+        "weights": {**DEFAULT_WEIGHTS, **options.get("weights", {})},
+        "rerank": options.get("rerank", RERANK_STAGE)
+    }
+
 class SearchService:
-    def __init__(self):
-        # OpenSearch Setup
-        self.os_client = OpenSearch(
-            hosts=[os.getenv("OPENSEARCH_URL", "https://localhost:9200")],
-            http_auth=(os.getenv("OPENSEARCH_USER", "admin"), os.getenv("OPENSEARCH_PASSWORD", "admin")),
-            use_ssl=True,
-            verify_certs=False,
-            ssl_show_warn=False
-        )
-        
-        # Neo4j Setup
-        self.neo4j_driver = GraphDatabase.driver(
-            os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-            auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "password"))
+    def __init__(self, os_client=None, neo4j_driver=None, embedder=None, vector_store: VectorStore = None):
+        max_workers = int(os.getenv("SEARCH_MAX_WORKERS", "16"))
+        if os_client is None:
+            from opensearchpy import OpenSearch
+            # OpenSearch Setup. urllib3 keeps connections alive; the pool has to be
+            # at least as big as the worker pool or sockets get discarded under load.
+            os_client = OpenSearch(
+                hosts=[os.getenv("OPENSEARCH_URL", "https://localhost:9200")],
+                http_auth=(os.getenv("OPENSEARCH_USER", "admin"), os.getenv("OPENSEARCH_PASSWORD", "admin")),
+                use_ssl=True,
+                verify_certs=False,
+                ssl_show_warn=False,
+                pool_maxsize=int(os.getenv("OPENSEARCH_POOL_MAXSIZE", str(max_workers))),
+                timeout=float(os.getenv("OPENSEARCH_TIMEOUT", "10"))
+            )
+        self.os_client = os_client
+
+        if neo4j_driver is None:
+            from neo4j import GraphDatabase
+            # Neo4j Setup
+            neo4j_driver = GraphDatabase.driver(
+                os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "password"))
+            )
+        self.neo4j_driver = neo4j_driver
+        self.graph = GraphRetriever(neo4j_driver)
+
+        # Both SDKs are blocking; backend queries and async callers go through
+        # this bounded pool so backend concurrency stays capped.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self.timeouts = dict(BACKEND_TIMEOUTS)
+        if SEARCH_MODE not in SEARCH_MODES:
+            raise ValueError(f"Unknown SEARCH_MODE: {SEARCH_MODE}")
+        self.mode = SEARCH_MODE
+        self.embedder = embedder if embedder is not None else (embedding_service if EMBED_QUERIES else None)
+        # None keeps the kNN leg in the OpenSearch index (and in its _msearch)
+        self.vector_store = vector_store if vector_store is not None else vector_store_from_env()
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def hybrid_search(self, query: str, vector: list = None, top_k: int = 5,
+                      weights: Dict[str, float] = None, fusion: str = None, filters: Dict[str, Any] = None,
+                      rerank: str = None):
+        """
+        Query BM25, kNN and the graph concurrently and fuse them into one
+        deduplicated top_k list. A backend that fails or exceeds its timeout is
+        left out and reported under "errors" instead of failing the search.
+        `filters` ({metadata field: value or [values]}) restricts the document
+        lists; graph hits are not filtered.
+        """
+        return self.multi_search([query], [vector], top_k=top_k, weights=weights, fusion=fusion, filters=filters, rerank=rerank)
+
+    async def ahybrid_search(self, query: str, vector: list = None, top_k: int = 5,
+                             weights: Dict[str, float] = None, fusion: str = None, filters: Dict[str, Any] = None,
+                             rerank: str = None):
+        """Async `hybrid_search`: backends run on the pool, the event loop only awaits them."""
+        return await self.amulti_search([query], [vector], top_k=top_k, weights=weights, fusion=fusion, filters=filters, rerank=rerank)
+
+    def multi_search(self, queries: List[str], vectors: List[list] = None, top_k: int = 5,
+                     weights: Dict[str, float] = None, fusion: str = None, filters: Dict[str, Any] = None,
+                     rerank: str = None):
+        """
+        `hybrid_search` over several phrasings of one question (e.g. the
+        RetrievalAgent's expansions). In msearch/hybrid mode all OpenSearch
+        lists travel in a single round trip; every list is fused together.
+        """
+        start = time.perf_counter()
+        vectors, missing = self._vector_slots(queries, vectors, weights)
+        outcomes = {}
+        if missing:
+            try:
+                for i, vector in zip(missing, self.embedder.embed_many([queries[i] for i in missing], input_type=SEARCH_QUERY)):
+                    vectors[i] = vector
+                outcomes["embed"] = (None, None, (time.perf_counter() - start) * 1000)
+            except Exception as e:
+                outcomes["embed"] = (None, f"embedding failed: {e}", (time.perf_counter() - start) * 1000)
+
+        tasks = self._tasks(queries, vectors, top_k, weights, filters)
+        fan_out = time.perf_counter()
+        futures = {name: self._executor.submit(self._timed, func) for name, (func, _, _) in tasks.items()}
+
+        # Each task gets its own deadline measured from the shared fan-out
+        for name in sorted(futures, key=lambda name: tasks[name][1]):
+            future, (_, timeout, keys) = futures[name], tasks[name]
+            try:
+                outcomes.update(self._split(future.result(timeout=max(timeout - (time.perf_counter() - fan_out), 0))))
+            except FutureTimeoutError:
+                future.cancel()
+                outcomes.update({key: (None, f"timed out after {timeout}s", timeout * 1000) for key in keys})
+            except Exception as e:
+                outcomes.update({key: (None, str(e) or type(e).__name__, None) for key in keys})
+        return self._fuse(outcomes, top_k, weights, fusion, start, queries, rerank)
+
+    async def amulti_search(self, queries: List[str], vectors: List[list] = None, top_k: int = 5,
+                            weights: Dict[str, float] = None, fusion: str = None, filters: Dict[str, Any] = None,
+                            rerank: str = None):
+        start = time.perf_counter()
+        vectors, missing = self._vector_slots(queries, vectors, weights)
+        outcomes = {}
+        if missing:
+            # Concurrent searches share the embedding service's micro-batches
+            try:
+                embedded = await self.embedder.aembed_many([queries[i] for i in missing], input_type=SEARCH_QUERY)
+                for i, vector in zip(missing, embedded):
+                    vectors[i] = vector
+                outcomes["embed"] = (None, None, (time.perf_counter() - start) * 1000)
+            except Exception as e:
+                outcomes["embed"] = (None, f"embedding failed: {e}", (time.perf_counter() - start) * 1000)
+
+        tasks = self._tasks(queries, vectors, top_k, weights, filters)
+        pending = {
+            name: asyncio.ensure_future(asyncio.wait_for(self._run_blocking(self._timed, func), timeout))
+            for name, (func, timeout, _) in tasks.items()
+        }
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+
+        for name, task in pending.items():
+            _, timeout, keys = tasks[name]
+            error = task.exception()
+            if isinstance(error, asyncio.TimeoutError):
+                outcomes.update({key: (None, f"timed out after {timeout}s", timeout * 1000) for key in keys})
+            elif error is not None:
+                outcomes.update({key: (None, str(error) or type(error).__name__, None) for key in keys})
+            else:
+                outcomes.update(self._split(task.result()))
+        if (rerank or RERANK_STAGE) == "off":
+            return self._fuse(outcomes, top_k, weights, fusion, start, queries, rerank)
+        # Reranking is CPU work (a cross-encoder with RERANK_MODEL), so it runs in the pool like the searches
+        return await self._run_blocking(self._fuse, outcomes, top_k, weights, fusion, start, queries, rerank)
+
+    async def aget_graph_context(self, query: str, limit: int = 5):
+        return await self._run_blocking(self.get_graph_context, query, limit)
+
+    def _vector_slots(self, queries: List[str], vectors: List[list], weights: Dict[str, float] = None):
+        """Pad `vectors` to one per query; return it with the indices that still need embedding."""
+        vectors = list(vectors or [])
+        vectors += [None] * (len(queries) - len(vectors))
+        if self.embedder is None or (weights or DEFAULT_WEIGHTS).get("vector", 1.0) <= 0:
+            return vectors, []
+        return vectors, [i for i, vector in enumerate(vectors) if not vector]
+
+    def _tasks(self, queries: List[str], vectors: List[list], top_k: int, weights: Dict[str, float] = None,
+               filters: Dict[str, Any] = None):
+        """
+        Plan the blocking calls for a search as name -> (func, timeout, list keys).
+        Each func returns {list key: hits or Exception}. List keys are the
+        backend name, suffixed with the query index when there are several.
+        A local vector store always runs as its own task, outside OpenSearch.
+        """
+        weights = weights or DEFAULT_WEIGHTS
+
+        def key(source, i):
+            return source if len(queries) == 1 else f"{source}:{i}"
+
+        def enabled(source):
+            return weights.get(source, 1.0) > 0
+
+        tasks = {}
+        searches = []
+        for i, (query, vector) in enumerate(zip(queries, vectors)):
+            if self.mode == "hybrid" and self.vector_store is None and vector and (enabled("bm25") or enabled("vector")):
+                searches.append((key("hybrid", i), self._hybrid_body(query, vector, top_k, filters)))
+            else:
+                if enabled("bm25"):
+                    searches.append((key("bm25", i), self._bm25_body(query, top_k, filters)))
+                if vector and enabled("vector") and self.vector_store is not None:
+                    tasks[key("vector", i)] = (
+                        functools.partial(self._keyed, key("vector", i), self.vector_store.search, vector, top_k, filters),
+                        self.timeouts["vector"], [key("vector", i)]
+                    )
+                elif vector and enabled("vector"):
+                    searches.append((key("vector", i), self._knn_body(vector, top_k, filters)))
+            if enabled("graph"):
+                tasks[key("graph", i)] = (
+                    functools.partial(self._keyed, key("graph", i), self._graph_search, query, top_k),
+                    self.timeouts["graph"], [key("graph", i)]
+                )
+
+        if self.mode == "separate":
+            for list_key, body in searches:
+                tasks[list_key] = (
+                    functools.partial(self._keyed, list_key, self._search, body),
+                    self.timeouts[list_key.split(":")[0]], [list_key]
+                )
+        elif searches:
+            tasks["opensearch"] = (
+                functools.partial(self._msearch, searches),
+                max(self.timeouts["bm25"], self.timeouts["vector"]), [list_key for list_key, _ in searches]
+            )
+        return tasks
+
+    @staticmethod
+    def _keyed(key: str, func, *args):
+        return {key: func(*args)}
+
+    @staticmethod
+    def _timed(func):
+        start = time.perf_counter()
+        result = func()
+        return result, (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _split(timed_result):
+        lists, elapsed_ms = timed_result
+        return {
+            key: (None, str(hits) or type(hits).__name__, elapsed_ms) if isinstance(hits, Exception) else (hits, None, elapsed_ms)
+            for key, hits in lists.items()
+        }
+
+    def _fuse(self, outcomes, top_k, weights, fusion, start, queries, rerank=None):
+        weights = weights or DEFAULT_WEIGHTS
+        stage = rerank or RERANK_STAGE
+        if stage not in RERANK_STAGES:
+            raise ValueError(f"Unknown rerank stage: {stage}")
+        ranked = {key: hits for key, (hits, _, _) in outcomes.items() if hits is not None}
+        errors = {key: error for key, (_, error, _) in outcomes.items() if error}
+        timings = {key: round(ms, 2) for key, (_, _, ms) in outcomes.items() if ms is not None}
+
+        if stage == "lists":
+            # Each list is reordered against the phrasing that produced it; fusion sees the new scores
+            rerank_start = time.perf_counter()
+            ranked = {
+                key: [{**hit, "score": hit["rerank_score"]} for hit in reranker.rerank(queries[int(key.split(":")[1]) if ":" in key else 0], hits)]
+                for key, hits in ranked.items()
+            }
+            timings["rerank"] = round((time.perf_counter() - rerank_start) * 1000, 3)
+
+        fuse_start = time.perf_counter()
+        results = fuse(
+            ranked,
+            weights={key: weights.get(key.split(":")[0], 1.0) for key in ranked},
+            top_k=max(top_k, RERANK_CANDIDATES) if stage == "fused" else top_k,
+            method=fusion or DEFAULT_FUSION
         )
+        timings["fusion"] = round((time.perf_counter() - fuse_start) * 1000, 3)
+        if stage == "fused":
+            rerank_start = time.perf_counter()
+            results = reranker.rerank(queries[0], results, top_k=top_k)
+            timings["rerank"] = round((time.perf_counter() - rerank_start) * 1000, 3)
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        # Per-list stages are labelled by backend ("bm25:2" -> "bm25")
+        for key, ms in timings.items():
+            SEARCH_STAGE_SECONDS.labels(key.split(":")[0]).observe(ms / 1000)
+        for key in errors:
+            SEARCH_ERRORS.labels(key.split(":")[0]).inc()
+        return {
+            "results": results,
+            "sources": {key: len(hits) for key, hits in ranked.items()},
+            "errors": errors,
+            "partial": bool(errors),
+            "timings_ms": timings
+        }
+
+    def _search(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        params = {"search_pipeline": SEARCH_PIPELINE} if "hybrid" in body["query"] and SEARCH_PIPELINE else None
+        return self._hits(self.os_client.search(index=SEARCH_INDEX, body=body, params=params))
+
+    def _msearch(self, searches):
+        """Run (key, body) searches as one _msearch request; a failed sub-search only fails its own list."""
+        payload = []
+        for _, body in searches:
+            payload.extend([{"index": SEARCH_INDEX}, body])
+        params = {"search_pipeline": SEARCH_PIPELINE} if self.mode == "hybrid" and SEARCH_PIPELINE else None
+        responses = self.os_client.msearch(body=payload, params=params)["responses"]
+        lists = {}
+        for (key, _), response in zip(searches, responses):
+            if "error" in response:
+                error = response["error"]
+                lists[key] = RuntimeError(error.get("reason", str(error)) if isinstance(error, dict) else str(error))
+            else:
+                lists[key] = self._hits(response)
+        return lists
 
-    def hybrid_search(self, query: str, vector: list = None, top_k: int = 5):
-        # 1. OpenSearch Keyword Search (BM25)
-        bm25_query = {
+    def _bm25_search(self, query: str, top_k: int, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return self._search(self._bm25_body(query, top_k, filters))
+
+    def _knn_search(self, vector: list, top_k: int, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        if self.vector_store is not None:
+            return self.vector_store.search(vector, top_k, filters)
+        return self._search(self._knn_body(vector, top_k, filters))
+
+    @staticmethod
+    def _filter_clauses(filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        # Metadata strings are mapped as keywords (see IngestionPipeline.ensure_index)
+        return [
+            {"terms": {f"metadata.{field}": list(value) if isinstance(value, (list, tuple, set)) else [value]}}
+            for field, value in (filters or {}).items()
+        ]
+
+    @staticmethod
+    def _match(query: str, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        match = {"match": {"text": query}}
+        if filters:
+            return {"bool": {"must": [match], "filter": SearchService._filter_clauses(filters)}}
+        return match
+
+    @staticmethod
+    def _knn(vector: list, top_k: int, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        knn = {"vector": vector, "k": top_k}
+        if filters:
+            # Efficient k-NN filtering: the engine filters during the ANN search
+            knn["filter"] = {"bool": {"filter": SearchService._filter_clauses(filters)}}
+        return {"knn": {"embedding": knn}}
+
+    @staticmethod
+    def _bm25_body(query: str, top_k: int, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        # OpenSearch Keyword Search (BM25)
+        return {
             "size": top_k,
+            "_source": SOURCE_FIELDS,
+            "query": SearchService._match(query, filters)
+        }
+
+    @staticmethod
+    def _knn_body(vector: list, top_k: int, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        # OpenSearch Vector Search (Semantic)
+        return {
+            "size": top_k,
+            "_source": SOURCE_FIELDS,
+            "query": SearchService._knn(vector, top_k, filters)
+        }
+
+    @staticmethod
+    def _hybrid_body(query: str, vector: list, top_k: int, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        # BM25 and kNN scored together server-side; needs a normalization search pipeline
+        return {
+            "size": top_k,
+            "_source": SOURCE_FIELDS,
             "query": {
-                "match": {
-                    "text": query
+                "hybrid": {
+                    "queries": [
+                        SearchService._match(query, filters),
+                        SearchService._knn(vector, top_k, filters)
+                    ]
                 }
             }
         }
-        bm25_results = self.os_client.search(index="docs", body=bm25_query)
-
-        # 2. OpenSearch Vector Search (Semantic)
-        vector_results = []
-        if vector:
-            knn_query = {
-                "size": top_k,
-                "query": {
-                    "knn": {
-                        "embedding": {
-                            "vector": vector,
-                            "k": top_k
-                        }
-                    }
-                }
+
+    def _graph_search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        # Neo4j Graph Search (Relationships around the entities the query names)
+        return [
+            {
+                "id": f"graph:{fact['subject']}|{fact['relation']}|{fact['object']}",
+                "text": f"{fact['subject']} {fact['relation']} {fact['object']}",
+                "score": fact["score"],
+                "metadata": {key: fact[key] for key in ("subject", "relation", "object", "hops")}
             }
-            vector_results = self.os_client.search(index="docs", body=knn_query)
+            for fact in self.get_graph_context(query, limit=top_k)
+        ]
 
-        # 3. Neo4j Graph Search (Relationships)
-        graph_results = self.get_graph_context(query)
+    @staticmethod
+    def _hits(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        hits = []
+        for hit in response.get("hits", {}).get("hits", []):
+            fields = hit.get("_source") or {}
+            hits.append({
+                "id": hit["_id"],
+                "text": fields.get("text", ""),
+                "score": hit.get("_score") or 0.0,
+                "metadata": fields.get("metadata") or {}
+            })
+        return hits
 
-        return {
-            "bm25": bm25_results,
-            "vector": vector_results,
-            "graph": graph_results
-        }
-
-    def get_graph_context(self, query: str):
-        with self.neo4j_driver.session() as session:
-            # Simple example: find nodes related to the query terms
-            result = session.run(
-                "MATCH (n)-[r]->(m) WHERE n.name CONTAINS $query OR m.name CONTAINS $query RETURN n, r, m LIMIT 5",
-                query=query
-            )
-            return [record.data() for record in result]
+    def get_graph_context(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Facts {"subject", "relation", "object", "score", "hops"} about the entities named in `query`."""
+        return self.graph.retrieve(query, limit=limit)
 
     def close(self):
+        self._executor.shutdown(wait=False)
+        self.graph.close()
         self.neo4j_driver.close()
+        if self.vector_store is not None:
+            self.vector_store.close()
+
+def _probe_search(service: SearchService):
+    if not service.os_client.ping():
+        raise ConnectionError("OpenSearch ping failed")
+    service.neo4j_driver.verify_connectivity()
 
-search_service = SearchService()
+search_service = service_registry.register("search", SearchService, probe=_probe_search)
@@ -0,0 +1,369 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+import ast
+import asyncio
+import functools
+import hashlib
+import inspect
+import marshal
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+import time
+import msgpack
+from dotenv import load_dotenv
+from ..core.providers import service_registry
+
+load_dotenv()
+
+# Messages of this size or more go through the worker's shared-memory arena instead of the pipe
+SHM_THRESHOLD = int(os.getenv("MCP_SANDBOX_SHM_BYTES", str(64 * 1024)))
+ARENA_BYTES = int(os.getenv("MCP_SANDBOX_ARENA_MB", "64")) * 1024 * 1024
+_INLINE, _SHARED = b"M", b"S"
+
+class ToolError(Exception):
+    """A sandboxed tool raised, or was stopped by a resource limit."""
+
+class ToolTimeout(ToolError, asyncio.TimeoutError):
+    """A sandboxed tool ran past its wall-clock timeout; its worker was killed."""
+
+class _CPUTimeExceeded(Exception):
+    pass
+
+def _pack(obj: Any) -> bytes:
+    # Anything msgpack can't encode goes back as its str(), which is what the agent shows the model anyway
+    return msgpack.packb(obj, default=str, use_bin_type=True)
+
+class _Channel:
+    """
+    msgpack messages over a pipe. Large ones are copied into a shared-memory
+    arena that lives as long as the worker, and only their size crosses the
+    pipe. Calls strictly alternate request and reply, so one arena serves
+    both directions.
+    """
+    def __init__(self, conn, arena: Optional[shared_memory.SharedMemory]):
+        self.conn = conn
+        self.arena = arena
+
+    def send(self, obj: Any):
+        data = _pack(obj)
+        if self.arena is not None and SHM_THRESHOLD <= len(data) <= self.arena.size:
+            self.arena.buf[:len(data)] = data
+            self.conn.send_bytes(_SHARED + len(data).to_bytes(8, "little"))
+        else:
+            self.conn.send_bytes(_INLINE + data)
+
+    def recv(self) -> Any:
+        data = self.conn.recv_bytes()
+        if data[:1] == _INLINE:
+            return msgpack.unpackb(data[1:], raw=False)
+        with self.arena.buf[:int.from_bytes(data[1:], "little")] as view:
+            return msgpack.unpackb(view, raw=False)
+
+def _on_cpu_limit(signum, frame):
+    raise _CPUTimeExceeded()
+
+def _set_soft_limit(kind: int, soft: int):
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY and (soft == resource.RLIM_INFINITY or soft > hard):
+        soft = hard
+    resource.setrlimit(kind, (soft, hard))
+
+def _worker_main(conn, arena_name: Optional[str], memory_mb: int, code_cache_size: int):
+    """
+    Tool worker loop. Receives [key, bytecode or None, name, kwargs, cpu_seconds,
+    memory_mb] and replies [ok, value or error, kind]. Functions are kept per
+    (tool, code hash), so a tool's code is exec'd once per worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    channel = _Channel(conn, shared_memory.SharedMemory(name=arena_name) if arena_name else None)
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    functions: "OrderedDict[str, Any]" = OrderedDict()
+
+    while True:
+        try:
+            message = channel.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        key, bytecode, name, kwargs, cpu_seconds, call_memory_mb = message
+        try:
+            func = functions.get(key)
+            if func is None:
+                if bytecode is None:
+                    # Evicted from this worker's cache: ask the pool to resend the code
+                    channel.send([False, key, "missing"])
+                    continue
+                namespace = {"__name__": f"tool_{name}"}
+                exec(marshal.loads(bytecode), namespace)
+                func = functions[key] = namespace[name]
+                if len(functions) > code_cache_size:
+                    functions.popitem(last=False)
+            else:
+                functions.move_to_end(key)
+
+            if cpu_seconds:
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                _set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1)
+            if call_memory_mb:
+                _set_soft_limit(resource.RLIMIT_AS, call_memory_mb * 1024 * 1024)
+            result = asyncio.run(func(**kwargs)) if inspect.iscoroutinefunction(func) else func(**kwargs)
+            reply = [True, result, None]
+        except _CPUTimeExceeded:
+            reply = [False, f"exceeded its CPU limit of {cpu_seconds}s", "cpu"]
+        except MemoryError:
+            reply = [False, "exceeded its memory limit", "memory"]
+        except BaseException as e:
+            reply = [False, f"{type(e).__name__}: {e}", "error"]
+        finally:
+            if cpu_seconds:
+                _set_soft_limit(resource.RLIMIT_CPU, resource.RLIM_INFINITY)
+            if call_memory_mb:
+                _set_soft_limit(resource.RLIMIT_AS, resource.RLIM_INFINITY)
+        try:
+            channel.send(reply)
+        except (TypeError, ValueError) as e:
+            channel.send([False, f"result could not be serialised: {e}", "error"])
+
+class CompiledTool:
+    """Tool code compiled once in the API process; workers receive the marshalled bytecode."""
+    __slots__ = ("key", "name", "bytecode")
+
+    def __init__(self, key: str, name: str, bytecode: bytes):
+        self.key = key
+        self.name = name
+        self.bytecode = bytecode
+
+class BytecodeCache:
+    """
+    LRU of compiled tools by (tool id, code hash). Agents loading the same
+    tool share one compilation, and an edited tool gets a new key.
+    """
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or int(os.getenv("MCP_BYTECODE_CACHE_SIZE", "512"))
+        self._entries: "OrderedDict[str, CompiledTool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tool_id: Any, name: str, code: str) -> CompiledTool:
+        key = f"{tool_id}:{hashlib.sha256(code.encode()).hexdigest()}"
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        tree = ast.parse(code, filename=f"<tool {name}>")
+        if not any(isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name for node in tree.body):
+            raise ValueError(f"Tool code does not define a function named {name}")
+        compiled = CompiledTool(key, name, marshal.dumps(compile(tree, f"<tool {name}>", "exec")))
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+class _Worker:
+    __slots__ = ("process", "channel", "calls", "loaded")
+
+    def __init__(self, process, channel: _Channel):
+        self.process = process
+        self.channel = channel
+        self.calls = 0
+        self.loaded = set()
+
+class ToolWorkerPool:
+    """
+    Pre-forked processes that run tool code outside the API process.
+
+    Each call takes an idle worker, sends the arguments (and the bytecode,
+    the first time that worker sees the tool) over its pipe, and waits at
+    most `timeout` seconds. A worker that overruns is killed and replaced;
+    CPU and memory are capped per call with rlimits. Workers are recycled
+    after `max_calls` calls so leaks in tool code don't accumulate.
+    """
+    def __init__(self, workers: int = None, max_calls: int = None, memory_mb: int = None,
+                 cpu_seconds: float = None, code_cache_size: int = None, start_method: str = None):
+        self.size = workers or int(os.getenv("MCP_SANDBOX_WORKERS", str(max(os.cpu_count() or 1, 2))))
+        self.max_calls = max_calls or int(os.getenv("MCP_SANDBOX_MAX_CALLS", "1000"))
+        self.memory_mb = int(os.getenv("MCP_SANDBOX_MEMORY_MB", "1024")) if memory_mb is None else memory_mb
+        self.cpu_seconds = float(os.getenv("MCP_SANDBOX_CPU_SECONDS", "10")) if cpu_seconds is None else cpu_seconds
+        self.code_cache_size = code_cache_size or int(os.getenv("MCP_SANDBOX_CODE_CACHE", "256"))
+        # forkserver: workers fork from a clean single-threaded process, not the threaded API process
+        self._context = multiprocessing.get_context(start_method or os.getenv("MCP_SANDBOX_START_METHOD", "forkserver"))
+        # Import this module once in the fork server, so new and recycled workers start in milliseconds
+        self._context.set_forkserver_preload([__name__])
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="mcp-sandbox")
+        self._lock = threading.Lock()
+        self._closed = False
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.limit_kills = 0
+        self.crashes = 0
+        self.recycled = 0
+        self.spawned = 0
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe(duplex=True)
+        # Pages are only allocated when a large message first touches them
+        arena = shared_memory.SharedMemory(create=True, size=ARENA_BYTES) if ARENA_BYTES else None
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, arena.name if arena else None, self.memory_mb, self.code_cache_size),
+            name="mcp-tool-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            self.spawned += 1
+        return _Worker(process, _Channel(parent_conn, arena))
+
+    def _stop(self, worker: _Worker, kill: bool = False):
+        try:
+            if kill:
+                worker.process.kill()
+            else:
+                worker.channel.send(None)
+        except OSError:
+            pass
+        worker.process.join(timeout=1.0)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.channel.conn.close()
+        if worker.channel.arena is not None:
+            worker.channel.arena.close()
+            worker.channel.arena.unlink()
+
+    def _replace(self, worker: _Worker, kill: bool):
+        # Off the caller's path: the reply is returned while the new worker starts
+        def run():
+            self._stop(worker, kill=kill)
+            if not self._closed:
+                self._idle.put(self._spawn())
+        threading.Thread(target=run, name="mcp-sandbox-respawn", daemon=True).start()
+
+    def call(self, compiled: CompiledTool, kwargs: Dict[str, Any], timeout: float = 30.0,
+             cpu_seconds: float = None, memory_mb: int = None, deadline: float = None) -> Any:
+        """Run a compiled tool in a worker and return its result; raises ToolError or ToolTimeout."""
+        if self._closed:
+            raise RuntimeError("Tool worker pool is closed")
+        deadline = deadline or time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise ToolTimeout(f"no tool worker free within {timeout}s")
+
+        cpu_seconds = self.cpu_seconds if cpu_seconds is None else cpu_seconds
+        healthy = True
+        try:
+            message = [compiled.key, None, compiled.name, kwargs, cpu_seconds, memory_mb]
+            if compiled.key not in worker.loaded:
+                message[1] = compiled.bytecode
+            worker.channel.send(message)
+            ok, value, kind = self._reply(worker, deadline, timeout)
+            if kind == "missing":
+                message[1] = compiled.bytecode
+                worker.channel.send(message)
+                ok, value, kind = self._reply(worker, deadline, timeout)
+            worker.loaded.add(compiled.key)
+        except ToolTimeout:
+            healthy = False
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except (EOFError, OSError) as e:
+            # Hard rlimit (SIGKILL), segfault or os._exit in the tool
+            healthy = False
+            with self._lock:
+                self.crashes += 1
+            raise ToolError(f"tool worker died: {type(e).__name__}") from None
+        finally:
+            worker.calls += 1
+            with self._lock:
+                self.calls += 1
+            if not healthy:
+                self._replace(worker, kill=True)
+            elif self._closed:
+                self._replace(worker, kill=False)
+            elif worker.calls >= self.max_calls:
+                with self._lock:
+                    self.recycled += 1
+                self._replace(worker, kill=False)
+            else:
+                self._idle.put(worker)
+
+        if not ok:
+            with self._lock:
+                self.errors += 1
+                if kind in ("cpu", "memory"):
+                    self.limit_kills += 1
+            raise ToolError(value)
+        return value
+
+    def _reply(self, worker: _Worker, deadline: float, timeout: float) -> List[Any]:
+        if not worker.channel.conn.poll(max(deadline - time.monotonic(), 0)):
+            raise ToolTimeout(f"tool ran longer than {timeout}s")
+        return worker.channel.recv()
+
+    async def acall(self, compiled: CompiledTool, kwargs: Dict[str, Any], timeout: float = 30.0,
+                    cpu_seconds: float = None, memory_mb: int = None) -> Any:
+        """`call` from the event loop; the deadline starts now, not when a thread picks it up."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(
+            self.call, compiled, kwargs, timeout, cpu_seconds, memory_mb, time.monotonic() + timeout
+        ))
+
+    def close(self):
+        """Stop idle workers; calls in flight finish and their workers are stopped on release."""
+        self._closed = True
+        while True:
+            try:
+                self._stop(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.size,
+            "idle": self._idle.qsize(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "limit_kills": self.limit_kills,
+            "crashes": self.crashes,
+            "recycled": self.recycled,
+            "spawned": self.spawned,
+            "bytecode": bytecode_cache.stats()
+        }
+
+bytecode_cache = BytecodeCache()
+tool_workers = service_registry.register("tool_workers", ToolWorkerPool)
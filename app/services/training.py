@@ -1,32 +1,20 @@
 import boto3
 import os
 from sqlalchemy.orm import Session
-from ..models.models import Memory, MemoryTier
-import json
+from .training_export import TrainingExporter
 
 class TrainingService:
     def __init__(self, db: Session):
         self.db = db
         self.bedrock = boto3.client("bedrock", region_name=os.getenv("AWS_REGION", "us-east-1"))
 
-    def prepare_fine_tuning_data(self):
-        # Fetch long-term memories for fine-tuning
-        memories = self.db.query(Memory).filter(Memory.tier == MemoryTier.LONG_TERM).all()
-        
-        formatted_data = []
-        for mem in memories:
-            content = mem.content
-            formatted_data.append({
-                "prompt": content.get("query"),
-                "completion": content.get("response")
-            })
-            
-        # Write to S3 or local file for training
-        with open("fine_tuning_data.jsonl", "w") as f:
-            for item in formatted_data:
-                f.write(json.dumps(item) + "\n")
-        
-        return "fine_tuning_data.jsonl"
+    def prepare_fine_tuning_data(self, output_dir: str = None, full: bool = False, **options):
+        """
+        Export LONG_TERM memories added since the last run as deduplicated,
+        compressed JSONL shards. Returns the export summary, with the shard
+        paths under "shards".
+        """
+        return TrainingExporter(self.db, output_dir=output_dir, **options).run(full=full)
 
     def start_fine_tuning(self, job_name: str, base_model_id: str):
         # This is a simplified call to Bedrock fine-tuning API
@@ -0,0 +1,287 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..models.models import Memory, MemoryTier
+
+try:
+    import zstandard
+except ImportError:  # zstd output is optional; gzip always works
+    zstandard = None
+
+load_dotenv()
+
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+STATE_FILE = "_export_state.json"
+BLOOM_FILE = "_prompts.bloom.npy"
+_SPACE_RE = re.compile(r"\s+")
+
+def _format_records(rows: List[Tuple[int, Any]]) -> List[Tuple[bytes, bytes]]:
+    """
+    Process-pool worker: (prompt hash, JSONL line) per usable memory.
+    The hash is over the normalised prompt (case and whitespace folded).
+    """
+    records = []
+    for _, content in rows:
+        if not isinstance(content, dict):
+            continue
+        prompt, completion = content.get("query"), content.get("response")
+        if not prompt or not completion:
+            continue
+        normalised = _SPACE_RE.sub(" ", str(prompt)).strip().lower()
+        digest = hashlib.blake2b(normalised.encode(), digest_size=16).digest()
+        line = json.dumps({"prompt": prompt, "completion": completion}, ensure_ascii=False) + "\n"
+        records.append((digest, line.encode()))
+    return records
+
+class BloomFilter:
+    """
+    Fixed-size set of 16-byte digests: memory is set by capacity and error
+    rate, not by how many prompts have been exported. False positives
+    (about `error_rate` once full) drop a unique prompt; there are no false
+    negatives.
+    """
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001, bits: np.ndarray = None, hashes: int = None):
+        n_bits = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.bits = bits if bits is not None else np.zeros((n_bits + 7) // 8, dtype=np.uint8)
+        self.size = self.bits.size * 8
+        self.hashes = hashes or max(int(round(self.size / capacity * math.log(2))), 1)
+
+    def _positions(self, digests: List[bytes]) -> np.ndarray:
+        # Double hashing: position i is h1 + i * h2 (mod size), from the digest's two halves
+        halves = np.frombuffer(b"".join(digests), dtype=np.uint64).reshape(-1, 2)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (halves[:, :1] + steps * (halves[:, 1:] | np.uint64(1))) % np.uint64(self.size)
+
+    def add_new(self, digests: List[bytes]) -> List[bool]:
+        """Add the digests in order; True for each one that was not seen before."""
+        if not digests:
+            return []
+        positions = self._positions(digests)
+        present = ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+        fresh, seen = [], set()
+        for digest, hit in zip(digests, present):
+            new = not hit and digest not in seen
+            seen.add(digest)
+            fresh.append(new)
+        added = positions[np.array(fresh)].ravel()
+        np.bitwise_or.at(self.bits, added >> np.uint64(3), (np.uint8(1) << (added & np.uint64(7)).astype(np.uint8)))
+        return fresh
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp.npy"
+        np.save(tmp, np.concatenate([np.array([self.hashes], dtype=np.uint64).view(np.uint8), self.bits]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        data = np.load(path)
+        return cls(bits=data[8:].copy(), hashes=int(data[:8].view(np.uint64)[0]))
+
+class ShardWriter:
+    """
+    JSONL shards of at most about `max_bytes` compressed bytes each. A shard
+    is written as `.part` and renamed when complete, so readers never see
+    a half-written file.
+    """
+    def __init__(self, directory: str, prefix: str, max_bytes: int, compression: str = "gzip"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd output needs the zstandard package")
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.shards: List[str] = []
+        self.bytes_written = 0
+        self.bytes_uncompressed = 0
+        self._raw = None
+        self._stream = None
+        self._path = None
+
+    def write(self, line: bytes):
+        if self._raw is None:
+            self._open()
+        elif self._raw.tell() >= self.max_bytes:
+            self._finish()
+            self._open()
+        self._stream.write(line)
+        self.bytes_uncompressed += len(line)
+
+    def _open(self):
+        name = f"{self.prefix}-{len(self.shards):05d}.jsonl{COMPRESSIONS[self.compression]}"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(f"{self._path}.part", "wb")
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=3).stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def _finish(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self.bytes_written += self._raw.tell()
+        self._raw.close()
+        os.replace(f"{self._path}.part", self._path)
+        self.shards.append(self._path)
+        self._raw = self._stream = None
+
+    def close(self) -> List[str]:
+        if self._raw is not None:
+            self._finish()
+        return self.shards
+
+    def abort(self):
+        """Delete everything this writer produced (a failed run is exported again from the old watermark)."""
+        if self._raw is not None:
+            self._raw.close()
+            os.remove(f"{self._path}.part")
+            self._raw = self._stream = None
+        for path in self.shards:
+            os.remove(path)
+        self.shards = []
+
+class TrainingExporter:
+    """
+    Streams LONG_TERM memories into fine-tuning shards:
+    server-side cursor (`yield_per`) -> format (process pool) -> dedup by
+    normalised prompt (Bloom filter) -> size-capped compressed shards.
+    Runs are incremental: only rows after the last export's id watermark
+    are read, and the watermark and dedup filter are saved only once every
+    shard of the run is complete, so a failed run is simply repeated.
+    Memory stays flat: at most `max_pending` batches are in flight.
+
+    Ids are drawn when a row is inserted, but the memory writers of every
+    worker and promotion commit out of id order. A run therefore stops
+    before the first row created less than `lag` seconds ago: a row with a
+    lower id that is still uncommitted then lands after the watermark. The
+    lag must exceed the longest time from a row's `created_at` to its commit.
+    """
+    def __init__(self, db: Session, output_dir: str = None, shard_bytes: int = None, compression: str = None,
+                 workers: int = None, batch_rows: int = None, dedup_capacity: int = None, state_dir: str = None,
+                 lag: float = None):
+        self.db = db
+        self.output_dir = output_dir or os.getenv("TRAINING_EXPORT_DIR", "training_data")
+        self.shard_bytes = shard_bytes or int(os.getenv("TRAINING_EXPORT_SHARD_MB", "256")) * 1024 * 1024
+        self.compression = compression or os.getenv("TRAINING_EXPORT_COMPRESSION", "gzip")
+        # One core is left for the cursor and the compressor; 0 formats inline
+        self.workers = max((os.cpu_count() or 1) - 1, 0) if workers is None else workers
+        self.max_pending = max(self.workers, 1) * 2
+        self.batch_rows = batch_rows or int(os.getenv("TRAINING_EXPORT_BATCH_ROWS", "5000"))
+        self.dedup_capacity = dedup_capacity or int(os.getenv("TRAINING_DEDUP_CAPACITY", "10000000"))
+        self.state_dir = state_dir or self.output_dir
+        self.lag = float(os.getenv("TRAINING_EXPORT_LAG", "300")) if lag is None else lag
+
+    def load_state(self) -> Tuple[Dict[str, Any], BloomFilter]:
+        state_path = os.path.join(self.state_dir, STATE_FILE)
+        bloom_path = os.path.join(self.state_dir, BLOOM_FILE)
+        state = {"last_id": 0, "rows": 0}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        bloom = BloomFilter.load(bloom_path) if os.path.exists(bloom_path) else BloomFilter(self.dedup_capacity)
+        return state, bloom
+
+    def save_state(self, state: Dict[str, Any], bloom: BloomFilter):
+        bloom.save(os.path.join(self.state_dir, BLOOM_FILE))
+        path = os.path.join(self.state_dir, STATE_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """Export new rows (every row when `full`); returns counts, shard paths and throughput."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.state_dir, exist_ok=True)
+        start = time.perf_counter()
+        state, bloom = self.load_state()
+        if full:
+            state, bloom = {"last_id": 0, "rows": 0}, BloomFilter(self.dedup_capacity)
+
+        writer = ShardWriter(self.output_dir, f"fine_tuning-{time.strftime('%Y%m%dT%H%M%S')}", self.shard_bytes, self.compression)
+        read = written = duplicates = 0
+        last_id = state["last_id"]
+        before_id = self._first_recent_id(last_id)
+        try:
+            for batch_last_id, count, records in self._formatted(last_id, before_id):
+                read += count
+                last_id = batch_last_id
+                fresh = bloom.add_new([digest for digest, _ in records])
+                for (_, line), new in zip(records, fresh):
+                    if new:
+                        writer.write(line)
+                        written += 1
+                    else:
+                        duplicates += 1
+            shards = writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        self.save_state({"last_id": last_id, "rows": state["rows"] + written, "exported_at": time.time()}, bloom)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "rows_read": read,
+            "rows_written": written,
+            "duplicates": duplicates,
+            "skipped": read - written - duplicates,
+            "shards": shards,
+            "bytes_written": writer.bytes_written,
+            "bytes_uncompressed": writer.bytes_uncompressed,
+            "watermark": last_id,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_sec": round(read / elapsed, 1) if elapsed > 0 else None
+        }
+
+    def _first_recent_id(self, after_id: int) -> Optional[int]:
+        """Lowest id after the watermark created within the lag; the run exports only ids below it."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lag)
+        return self.db.execute(
+            select(func.min(Memory.id))
+            .where(Memory.tier == MemoryTier.LONG_TERM, Memory.id > after_id, Memory.created_at >= cutoff)
+        ).scalar()
+
+    def _batches(self, after_id: int, before_id: Optional[int]) -> Iterator[List[Tuple[int, Any]]]:
+        bounds = [Memory.id > after_id] + ([Memory.id < before_id] if before_id is not None else [])
+        statement = (
+            select(Memory.id, Memory.content)
+            .where(Memory.tier == MemoryTier.LONG_TERM, *bounds)
+            .order_by(Memory.id)
+            # Server-side cursor: rows arrive batch_rows at a time, never the whole table
+            .execution_options(yield_per=self.batch_rows)
+        )
+        for partition in self.db.execute(statement).partitions():
+            yield [tuple(row) for row in partition]
+
+    def _formatted(self, after_id: int, before_id: Optional[int]) -> Iterator[Tuple[int, int, List[Tuple[bytes, bytes]]]]:
+        """(last id, rows read, records) per batch, in id order."""
+        if not self.workers:
+            for rows in self._batches(after_id, before_id):
+                yield rows[-1][0], len(rows), _format_records(rows)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            inflight: deque = deque()
+            for rows in self._batches(after_id, before_id):
+                inflight.append((rows[-1][0], len(rows), pool.submit(_format_records, rows)))
+                if len(inflight) >= self.max_pending:
+                    last_id, count, future = inflight.popleft()
+                    yield last_id, count, future.result()
+            while inflight:
+                last_id, count, future = inflight.popleft()
+                yield last_id, count, future.result()
@@ -0,0 +1,396 @@
+from abc import ABC, abstractmethod
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+Filters = Dict[str, Any]
+
+class VectorStore(ABC):
+    """
+    Backend for the kNN leg of hybrid search. `SearchService.vector_store`
+    is None for the OpenSearch index (queried inside its _msearch); anything
+    implementing this interface replaces it.
+    """
+    @abstractmethod
+    def add(self, ids: List[str], vectors, texts: List[str] = None, metadatas: List[Dict[str, Any]] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def search(self, vector, top_k: int = 5, filters: Filters = None) -> List[Dict[str, Any]]:
+        """Hits shaped like every other search leg: {"id", "text", "score", "metadata"}."""
+
+    def save(self):
+        pass
+
+    def close(self):
+        pass
+
+class _GrowableArray:
+    """Append-only NumPy array with amortised O(1) appends."""
+    def __init__(self, dtype=np.int64, capacity: int = 16):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded IVF-flat index over a NumPy (optionally memory-mapped) matrix of
+    normalised float32 vectors, scored by inner product (cosine).
+
+    - Below `train_threshold` live vectors it searches exhaustively; past it,
+      spherical k-means builds `nlist` centroids and queries scan only the
+      `nprobe` closest inverted lists.
+    - Deletes and overwrites are tombstones; `compact()` reclaims them.
+    - Scalar metadata values get posting lists, so filters are applied as a
+      pre-pass: small filtered sets are scored exactly, large ones mask the
+      IVF candidates.
+    - With `path`, vectors live in a memmap and rows/tombstones in
+      append-only files; `save()` also persists the trained centroids.
+    """
+    EXACT_FILTER_LIMIT = 50_000
+
+    def __init__(self, path: str = None, dim: int = None, nlist: int = None, nprobe: int = None,
+                 train_threshold: int = None):
+        self.path = path
+        self.dim = dim
+        self.configured_nlist = nlist
+        self.nprobe = nprobe or int(os.getenv("VECTOR_NPROBE", "8"))
+        self.train_threshold = train_threshold or int(os.getenv("VECTOR_TRAIN_THRESHOLD", "20000"))
+        self._lock = threading.RLock()
+        self._load()
+
+    # -- persistence ------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        self.count = 0
+        self.capacity = 0
+        self.vectors = None
+        self.ids: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self.texts: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.deleted = np.zeros(0, dtype=bool)
+        self.postings: Dict[tuple, _GrowableArray] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self.nlist = 0
+        self.assign = np.zeros(0, dtype=np.int32)
+        self.lists: List[_GrowableArray] = []
+        self._rows_file = None
+        self._tombstones_file = None
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            if os.path.exists(self._file("meta.json")):
+                with open(self._file("meta.json")) as f:
+                    meta = json.load(f)
+                self.dim = self.dim or meta["dim"]
+        if self.dim:
+            self._reserve(1024)
+
+        if self.path and os.path.exists(self._file("rows.jsonl")):
+            with open(self._file("rows.jsonl")) as f:
+                for line in f:
+                    record = json.loads(line)
+                    row = len(self.ids)
+                    if row >= self.capacity:
+                        break  # vectors past the end of the file never made it to disk
+                    self.ids.append(record["id"])
+                    self.texts.append(record.get("text", ""))
+                    self.metadata.append(record.get("metadata") or {})
+                    self.row_of[record["id"]] = row
+                    self._index_metadata(row, self.metadata[-1])
+            self.count = len(self.ids)
+            if os.path.exists(self._file("tombstones.i64")):
+                for row in np.fromfile(self._file("tombstones.i64"), dtype=np.int64):
+                    if row < self.count:
+                        self.deleted[row] = True
+                        if self.row_of.get(self.ids[row]) == row:
+                            del self.row_of[self.ids[row]]
+            if os.path.exists(self._file("ivf.npz")):
+                saved = np.load(self._file("ivf.npz"))
+                self._set_centroids(saved["centroids"], saved["assign"])
+
+        if self.path:
+            self._rows_file = open(self._file("rows.jsonl"), "a")
+            self._tombstones_file = open(self._file("tombstones.i64"), "ab")
+
+    def _write_meta(self):
+        with open(self._file("meta.json"), "w") as f:
+            json.dump({"dim": self.dim}, f)
+
+    def _reserve(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if self.path:
+            if self.vectors is not None:
+                self.vectors.flush()
+            vectors_path = self._file("vectors.f32")
+            with open(vectors_path, "ab") as f:
+                f.truncate(max(os.path.getsize(vectors_path), capacity * 4 * self.dim))
+            capacity = os.path.getsize(vectors_path) // (4 * self.dim)
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            self._write_meta()
+        else:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.vectors is not None:
+                vectors[:self.count] = self.vectors[:self.count]
+            self.vectors = vectors
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:len(self.deleted)] = self.deleted
+        self.deleted = deleted
+        self.capacity = capacity
+
+    def save(self):
+        """Flush vectors and persist the trained index so reopening skips k-means."""
+        with self._lock:
+            if not self.path or self.vectors is None:
+                return
+            self.vectors.flush()
+            self._write_meta()
+            if self.centroids is not None:
+                np.savez(self._file("ivf.npz"), centroids=self.centroids, assign=self.assign[:self.count])
+
+    def close(self):
+        self.save()
+        for handle in (self._rows_file, self._tombstones_file):
+            if handle is not None:
+                handle.close()
+
+    # -- writes -----------------------------------------------------------
+
+    def add(self, ids: List[str], vectors, texts: List[str] = None, metadatas: List[Dict[str, Any]] = None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if not len(ids):
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        texts = texts or [""] * len(ids)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            self.delete([doc_id for doc_id in ids if doc_id in self.row_of])
+            first = self.count
+            self._reserve(first + len(ids))
+            rows = np.arange(first, first + len(ids))
+            # Vectors before the row journal: a row is only visible once both exist
+            self.vectors[first:first + len(ids)] = vectors
+            if self._rows_file is not None:
+                self._rows_file.write("".join(
+                    json.dumps({"id": doc_id, "text": text, "metadata": meta}) + "\n"
+                    for doc_id, text, meta in zip(ids, texts, metadatas)
+                ))
+                self._rows_file.flush()
+            for row, doc_id, text, meta in zip(rows, ids, texts, metadatas):
+                self.ids.append(doc_id)
+                self.texts.append(text)
+                self.metadata.append(meta)
+                self.row_of[doc_id] = int(row)
+                self._index_metadata(int(row), meta)
+            self.count += len(ids)
+
+            if self.centroids is not None:
+                self._assign_rows(rows)
+            elif self.live_count() >= self.train_threshold:
+                self.train()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            rows = [self.row_of.pop(doc_id) for doc_id in ids if doc_id in self.row_of]
+            if not rows:
+                return
+            self.deleted[rows] = True
+            if self._tombstones_file is not None:
+                self._tombstones_file.write(np.asarray(rows, dtype=np.int64).tobytes())
+                self._tombstones_file.flush()
+
+    def _index_metadata(self, row: int, metadata: Dict[str, Any]):
+        for field, value in metadata.items():
+            if isinstance(value, (str, int, float, bool)):
+                self.postings.setdefault((field, value), _GrowableArray()).extend([row])
+
+    # -- IVF --------------------------------------------------------------
+
+    def live_count(self) -> int:
+        return self.count - int(self.deleted[:self.count].sum())
+
+    def train(self, iterations: int = 8, seed: int = 0):
+        """Spherical k-means over a sample of live vectors, then (re)assign every row."""
+        with self._lock:
+            live = np.flatnonzero(~self.deleted[:self.count])
+            if not len(live):
+                return
+            nlist = self.configured_nlist or int(min(4096, max(16, math.sqrt(len(live)))))
+            nlist = min(nlist, len(live))
+            rng = np.random.default_rng(seed)
+            sample = self.vectors[np.sort(rng.choice(live, size=min(len(live), nlist * 32), replace=False))]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._nearest(sample, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+                empty = counts == 0
+                # Re-seed empty lists from random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                centroids = sums / np.where(norms == 0, 1.0, norms)
+            assign = np.concatenate([
+                self._nearest(self.vectors[start:min(start + 65536, self.count)], centroids)
+                for start in range(0, self.count, 65536)
+            ]).astype(np.int32)
+            self._set_centroids(centroids, assign)
+
+    def _set_centroids(self, centroids: np.ndarray, assign: np.ndarray):
+        self.centroids = centroids.astype(np.float32)
+        self.nlist = len(centroids)
+        self.assign = np.zeros(self.capacity, dtype=np.int32)
+        self.lists = [_GrowableArray() for _ in range(self.nlist)]
+        known = min(len(assign), self.count)
+        self.assign[:known] = assign[:known]
+        order = np.argsort(self.assign[:known], kind="stable")
+        bounds = np.searchsorted(self.assign[:known][order], np.arange(self.nlist + 1))
+        for i in range(self.nlist):
+            self.lists[i].extend(order[bounds[i]:bounds[i + 1]])
+        if known < self.count:
+            self._assign_rows(np.arange(known, self.count))
+
+    def _assign_rows(self, rows: np.ndarray):
+        if len(self.assign) < self.capacity:
+            assign = np.zeros(self.capacity, dtype=np.int32)
+            assign[:len(self.assign)] = self.assign
+            self.assign = assign
+        labels = self._nearest(self.vectors[rows], self.centroids)
+        self.assign[rows] = labels
+        for label in np.unique(labels):
+            self.lists[label].extend(rows[labels == label])
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ centroids.T, axis=1)
+
+    # -- search -----------------------------------------------------------
+
+    def _filter_rows(self, filters: Filters) -> Optional[np.ndarray]:
+        """Sorted rows matching every field (a list value matches any of its items)."""
+        allowed = None
+        for field, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            postings = [self.postings[(field, v)].view() for v in values if (field, v) in self.postings]
+            rows = np.unique(np.concatenate(postings)) if len(postings) > 1 else (postings[0] if postings else np.zeros(0, dtype=np.int64))
+            allowed = rows if allowed is None else np.intersect1d(allowed, rows, assume_unique=True)
+            if not len(allowed):
+                break
+        return allowed
+
+    def search(self, vector, top_k: int = 5, filters: Filters = None, nprobe: int = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if not self.count:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+
+            candidates = None
+            allowed = self._filter_rows(filters) if filters else None
+            if allowed is not None and (len(allowed) <= self.EXACT_FILTER_LIMIT or self.centroids is None):
+                candidates = allowed
+            elif self.centroids is not None:
+                nprobe = min(nprobe or self.nprobe, self.nlist)
+                probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                candidates = np.concatenate([self.lists[i].view() for i in probe])
+                if allowed is not None:
+                    candidates = candidates[np.isin(candidates, allowed, assume_unique=True)]
+
+            if candidates is None:
+                scores = self.vectors[:self.count] @ query
+                scores[self.deleted[:self.count]] = -np.inf
+                rows = np.arange(self.count)
+            else:
+                candidates = candidates[~self.deleted[candidates]]
+                scores = self.vectors[candidates] @ query if len(candidates) else np.zeros(0, dtype=np.float32)
+                rows = candidates
+
+            k = min(top_k, len(scores))
+            if not k:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self.ids[rows[i]], "text": self.texts[rows[i]], "score": float(scores[i]), "metadata": self.metadata[rows[i]]}
+                for i in top if np.isfinite(scores[i])
+            ]
+
+    # -- maintenance ------------------------------------------------------
+
+    def compact(self):
+        """Rewrite the store without tombstoned rows (and retrain if it was trained)."""
+        with self._lock:
+            live = np.flatnonzero(~self.deleted[:self.count])
+            trained = self.centroids is not None
+            ids = [self.ids[row] for row in live]
+            texts = [self.texts[row] for row in live]
+            metadatas = [self.metadata[row] for row in live]
+            vectors = np.array(self.vectors[live]) if len(live) else np.zeros((0, self.dim), dtype=np.float32)
+            if self.path:
+                self.close()
+                shutil.rmtree(self.path)
+            self._load()
+            threshold, self.train_threshold = self.train_threshold, float("inf")
+            for start in range(0, len(ids), 65536):
+                end = start + 65536
+                self.add(ids[start:end], vectors[start:end], texts[start:end], metadatas[start:end])
+            self.train_threshold = threshold
+            if trained or self.live_count() >= self.train_threshold:
+                self.train()
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.count,
+            "live": self.live_count(),
+            "tombstones": self.count - self.live_count(),
+            "trained": self.centroids is not None,
+            "nlist": self.nlist if self.centroids is not None else None,
+            "nprobe": self.nprobe
+        }
+
+def vector_store_from_env() -> Optional[VectorStore]:
+    """VECTOR_STORE=opensearch (default: the kNN leg stays in OpenSearch) | local."""
+    kind = os.getenv("VECTOR_STORE", "opensearch")
+    if kind == "opensearch":
+        return None
+    if kind == "local":
+        return LocalVectorStore(os.getenv("VECTOR_STORE_PATH", ".cache/vectors"))
+    raise ValueError(f"Unknown VECTOR_STORE: {kind}")
@@ -0,0 +1,119 @@
+from collections import deque
+from typing import Any, Dict, List
+import atexit
+import logging
+import os
+import threading
+import time
+
+class BatchWriter:
+    """
+    Write-behind buffer for one insert statement. `add` appends a row to a
+    deque; a daemon thread runs the statement as one executemany per
+    `batch_size` rows, when a batch fills up or every `flush_interval`
+    seconds. A full buffer is flushed by the caller instead of dropping rows.
+    Failed batches are retried with exponential backoff, then dropped and
+    counted. Settings come from <env_prefix>_BATCH_SIZE, _FLUSH_INTERVAL,
+    _BUFFER_MAX, _MAX_RETRIES and _RETRY_BACKOFF.
+    """
+    env_prefix = "BATCH_WRITER"
+    default_flush_interval = 1.0
+    thread_name = "batch-writer"
+    # What a row is, for log messages
+    noun = "rows"
+
+    def __init__(self, statement, bind=None, batch_size: int = None, flush_interval: float = None, max_buffer: int = None):
+        if bind is None:
+            from ..db.session import engine
+            bind = engine
+        self.bind = bind
+        self.statement = statement
+        prefix = self.env_prefix
+        self.batch_size = batch_size or int(os.getenv(f"{prefix}_BATCH_SIZE", "500"))
+        self.flush_interval = flush_interval or float(os.getenv(f"{prefix}_FLUSH_INTERVAL", str(self.default_flush_interval)))
+        self.max_buffer = max_buffer or int(os.getenv(f"{prefix}_BUFFER_MAX", "50000"))
+        self.max_retries = int(os.getenv(f"{prefix}_MAX_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv(f"{prefix}_RETRY_BACKOFF", "0.2"))
+
+        self._queue = deque()
+        self._inflight: List[Dict[str, Any]] = []
+        # Guards the queue and the hand-off to `_inflight`, so `queued` sees every row exactly once
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        # Held while a batch commits; readers hold it while they query and
+        # collect queued rows, so a row is never seen both ways or neither
+        self.commit_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def add(self, row: Dict[str, Any]):
+        if len(self._queue) >= self.max_buffer:
+            # Backpressure: the caller pays for a flush rather than losing data
+            self.flush()
+        with self._lock:
+            self._queue.append(row)
+        if self._thread is None:
+            self._start()
+        elif len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def queued(self) -> List[Dict[str, Any]]:
+        """Rows not committed yet: the batch being inserted, then the queue."""
+        with self._lock:
+            return self._inflight + list(self._queue)
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert everything queued (blocking)."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        return
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                    self._inflight = batch
+                self._insert_with_retry(batch)
+
+    def _insert_with_retry(self, rows: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.commit_lock:
+                    with self.bind.begin() as conn:
+                        # A list of parameter sets runs as one executemany (multi-row VALUES where supported)
+                        conn.execute(self.statement, rows)
+                    self._inflight = []
+                self.written += len(rows)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._inflight = []
+                    self.failed += len(rows)
+                    logging.getLogger(__name__).warning(f"Dropping {len(rows)} {self.noun} after {attempt + 1} attempts: {e}")
+                    return
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches
+        }
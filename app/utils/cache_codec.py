@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson is in requirements.txt; fall back to the stdlib
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+# Bump when the payload layout changes; older entries then read as misses.
+CACHE_PAYLOAD_VERSION = 1
+
+# First byte of every stored value says how the rest is encoded
+_RAW = b"\x01"
+_ZSTD = b"\x02"
+
+COMPRESSION_THRESHOLD = int(os.getenv("CACHE_COMPRESSION_THRESHOLD", "2048"))
+
+_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+def build_cache_payload(answer: str, context: Dict[str, Any] = None, usage: Dict[str, Any] = None) -> Dict[str, Any]:
+    """The only shape we cache for an agent run: never the raw LangGraph state."""
+    return {
+        "v": CACHE_PAYLOAD_VERSION,
+        "answer": answer,
+        "context": context or {},
+        "usage": usage or {}
+    }
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str).encode()
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def encode_payload(value: Any) -> bytes:
+    """Serialize a cache value, zstd-compressing it above the size threshold."""
+    data = _dumps(value)
+    if _compressor is not None and len(data) > COMPRESSION_THRESHOLD:
+        return _ZSTD + _compressor.compress(data)
+    return _RAW + data
+
+def decode_payload(raw: Optional[bytes]) -> Optional[Any]:
+    """Inverse of `encode_payload`; unreadable or outdated entries decode to None."""
+    if not raw:
+        return None
+    header, body = raw[:1], raw[1:]
+    try:
+        if header == _ZSTD:
+            if _decompressor is None:
+                return None
+            body = _decompressor.decompress(body)
+        elif header != _RAW:
+            return None
+        value = _loads(body)
+    except Exception:
+        return None
+    if isinstance(value, dict) and value.get("v", CACHE_PAYLOAD_VERSION) != CACHE_PAYLOAD_VERSION:
+        return None
+    return value
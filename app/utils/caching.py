@@ -1,28 +1,89 @@
-import redis
-import json
+import redis.asyncio as redis
+import asyncio
 import os
-from typing import Optional, Any
+from typing import Optional, Any, Awaitable, Callable, Dict
 from dotenv import load_dotenv
+from .cache_codec import encode_payload, decode_payload
+from .metrics import CACHE_OP_SECONDS, CACHE_REQUESTS, timed
+from .semantic_cache import SemanticCache
+from ..core.providers import service_registry
 
 load_dotenv()
 
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: the first caller starts the
+    coroutine as a task and everyone, that caller included, awaits it through
+    a shield. A cancelled caller (client gone, timeout) only stops waiting;
+    the shared call runs on for the others. Scope is one process.
+    """
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so an exception every caller stopped waiting for isn't logged
+        if not task.cancelled():
+            task.exception()
+
 class CacheService:
     def __init__(self):
-        self.redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        # redis.asyncio keeps a connection pool and only connects on first use
+        self.redis_client = redis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+        )
+        # Second tier: paraphrased queries matched by embedding similarity
+        self.semantic_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.semantic = SemanticCache(
+            self.redis_client,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+            expire=int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        )
+        self.single_flight = SingleFlight()
 
-    def get(self, key: str) -> Optional[Any]:
+    @timed(CACHE_OP_SECONDS, "redis", "get")
+    async def get(self, key: str) -> Optional[Any]:
         """Retrieve data from cache."""
-        data = self.redis_client.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        value = decode_payload(await self.redis_client.get(key))
+        CACHE_REQUESTS.labels("redis", "miss" if value is None else "hit").inc()
+        return value
 
-    def set(self, key: str, value: Any, expire: int = 3600):
+    @timed(CACHE_OP_SECONDS, "redis", "set")
+    async def set(self, key: str, value: Any, expire: int = 3600):
         """Store data in cache with an expiration time in seconds."""
-        self.redis_client.set(key, json.dumps(value), ex=expire)
+        await self.redis_client.set(key, encode_payload(value), ex=expire)
+
+    @timed(CACHE_OP_SECONDS, "semantic", "get")
+    async def get_semantic(self, agent_id: str, embedding: list) -> Optional[Any]:
+        """Retrieve the answer cached for the most similar previous query."""
+        value = await self.semantic.get(agent_id, embedding)
+        CACHE_REQUESTS.labels("semantic", "miss" if value is None else "hit").inc()
+        return value
+
+    @timed(CACHE_OP_SECONDS, "semantic", "set")
+    async def set_semantic(self, agent_id: str, embedding: list, value: Any):
+        """Store an answer under its query embedding."""
+        await self.semantic.set(agent_id, embedding, value)
 
     def generate_cache_key(self, query: str, agent_id: str) -> str:
         """Generate a unique cache key for a query and agent."""
         return f"cache:{agent_id}:{query.strip().lower()}"
 
-cache_service = CacheService()
+async def _probe_cache(service: CacheService):
+    await service.redis_client.ping()
+
+cache_service = service_registry.register("cache", CacheService, probe=_probe_cache)
@@ -1,34 +1,137 @@
-from typing import List
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 import re
 
+Text = Union[str, bytes]
+Span = Tuple[int, int]
+# count_tokens(text, start, end) -> number of model tokens in text[start:end]
+TokenCounter = Callable[[Text, int, int], int]
+
+# Approximates subword (BPE) tokens without a tokenizer: words are split every
+# 6 characters and each punctuation mark counts on its own. Close to Claude/Titan
+# counts for English prose, and it runs in C over a window without copying.
+_TOKEN_RE = re.compile(r"\w{1,6}|[^\w\s]")
+_TOKEN_RE_BYTES = re.compile(rb"\w{1,6}|[^\w\s]")
+_NON_SPACE_RE = re.compile(r"\S")
+_NON_SPACE_RE_BYTES = re.compile(rb"\S")
+
+# Preferred places to end a chunk, best first: paragraph, sentence, line, word.
+_BOUNDARIES = ("\n\n", (". ", "! ", "? ", ".\n", "!\n", "?\n"), "\n", " ")
+
+def regex_token_count(text: Text, start: int, end: int) -> int:
+    pattern = _TOKEN_RE_BYTES if isinstance(text, (bytes, bytearray)) else _TOKEN_RE
+    return len(pattern.findall(text, start, end))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` up to the end of its `max_tokens`-th token (same approximation as regex_token_count)."""
+    if max_tokens <= 0:
+        return ""
+    last = None
+    for last in islice(_TOKEN_RE.finditer(text), max_tokens - 1, max_tokens):
+        pass
+    return text[:last.end()] if last is not None else text
+
 class ChunkingUtility:
+    @staticmethod
+    def iter_spans(text: Text, max_tokens: int = 256, overlap_tokens: int = 32,
+                   count_tokens: Optional[TokenCounter] = None, min_fill: float = 0.5) -> Iterator[Span]:
+        """
+        Yield (start, end) offsets of chunks of at most `max_tokens` tokens.
+        Chunks end at the best boundary (paragraph > sentence > line > word)
+        in the last `1 - min_fill` of the window, and consecutive chunks share
+        about `overlap_tokens` tokens. Works on str or bytes; nothing is
+        copied, so bytes callers can slice a memoryview with the offsets.
+        """
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be in [0, max_tokens)")
+        count = count_tokens or regex_token_count
+        is_bytes = isinstance(text, (bytes, bytearray))
+        non_space = _NON_SPACE_RE_BYTES if is_bytes else _NON_SPACE_RE
+        boundaries = [
+            tuple(b.encode() for b in boundary) if isinstance(boundary, tuple) else boundary.encode()
+            for boundary in _BOUNDARIES
+        ] if is_bytes else _BOUNDARIES
+        # Trailing whitespace never starts a chunk, so stop at the last non-space
+        length = ChunkingUtility._rstrip(text, 0, len(text), is_bytes)
+        chars_per_token = 4.0
+
+        match = non_space.search(text, 0, length)
+        while match:
+            start = match.start()
+
+            # Grow the window in conservatively sized steps, counting only the
+            # newly added text, so each character is tokenized about once.
+            # Counts of adjacent pieces never undercount the whole.
+            end, tokens, fill = start, 0, 0.9
+            while end < length:
+                left = max_tokens - tokens
+                if left < max(1, max_tokens // 20):
+                    break
+                step = max(1, int(left * chars_per_token * fill))
+                added = count(text, end, min(length, end + step))
+                if tokens + added <= max_tokens:
+                    end, tokens = min(length, end + step), tokens + added
+                elif step == 1:
+                    break
+                fill /= 2
+            if end == start:
+                end = start + 1  # a single oversized token still makes progress
+            if tokens:
+                chars_per_token = (end - start) / tokens
+
+            if end < length:
+                end = ChunkingUtility._best_cut(text, start, end, boundaries, min_fill)
+            end = ChunkingUtility._rstrip(text, start, end, is_bytes)
+            yield start, end
+
+            if end >= length:
+                break
+            # Step back ~overlap_tokens from the end, to the start of a word,
+            # but always strictly past this chunk's start so we make progress
+            next_start = end
+            if overlap_tokens:
+                back = max(start + 1, end - int(overlap_tokens * chars_per_token))
+                space = text.find(b" " if is_bytes else " ", back, end)
+                next_start = space + 1 if space != -1 else end
+            match = non_space.search(text, max(next_start, start + 1), length)
+
+    @staticmethod
+    def split_spans(text: Text, max_tokens: int = 256, overlap_tokens: int = 32,
+                    count_tokens: Optional[TokenCounter] = None) -> List[Span]:
+        return list(ChunkingUtility.iter_spans(text, max_tokens, overlap_tokens, count_tokens))
+
+    @staticmethod
+    def _best_cut(text: Text, start: int, end: int, boundaries, min_fill: float) -> int:
+        """End offset of the best boundary in text[floor:end], or `end` if none."""
+        floor = start + int((end - start) * min_fill)
+        for boundary in boundaries:
+            candidates = boundary if isinstance(boundary, tuple) else (boundary,)
+            best = max(text.rfind(candidate, floor, end) for candidate in candidates)
+            if best > start:
+                # Keep sentence punctuation in the chunk, drop the whitespace
+                return best + len(candidates[0]) - 1 if isinstance(boundary, tuple) else best
+        return end
+
+    @staticmethod
+    def _rstrip(text: Text, start: int, end: int, is_bytes: bool) -> int:
+        while end > start + 1 and (chr(text[end - 1]) if is_bytes else text[end - 1]).isspace():
+            end -= 1
+        return end
+
     @staticmethod
     def split_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into chunks with specified size and overlap."""
+        """Split text into chunks of at most `chunk_size` characters with `overlap`."""
         if not text:
             return []
-            
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at a newline or period if possible to maintain semantic integrity
-            if end < len(text):
-                last_space = chunk.rfind(' ')
-                if last_space != -1:
-                    chunk = chunk[:last_space]
-                    end = start + last_space
-            
-            chunks.append(chunk.strip())
-            start = end - overlap
-            
-            if start < 0: # Safety break
-                start = end
-                
-        return chunks
+        return [
+            text[start:end]
+            for start, end in ChunkingUtility.iter_spans(
+                text, max_tokens=chunk_size, overlap_tokens=min(overlap, chunk_size - 1),
+                count_tokens=lambda _, s, e: e - s
+            )
+        ]
 
     @staticmethod
     def clean_text(text: str) -> str:
@@ -1,7 +1,13 @@
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
-from ..models.models import Agent, AgentType
-from datetime import datetime
+from ..models.models import Agent, AgentType, ExecutionLog
+from datetime import datetime, timedelta
+import os
 from .logging import cloudwatch_logger
+from ..services.agent_repository import agent_repository
+
+# Window get_usage_metrics covers when no start is given
+USAGE_WINDOW_DAYS = int(os.getenv("USAGE_WINDOW_DAYS", "30"))
 
 class CostManager:
     def __init__(self, db: Session):
@@ -15,19 +21,54 @@ class CostManager:
         ).all()
         
         count = len(expired_agents)
+        expired_ids = [agent.id for agent in expired_agents]
         for agent in expired_agents:
             self.db.delete(agent)
             cloudwatch_logger.log(f"Deleted expired temporary agent: {agent.id}", level="INFO")
             
         self.db.commit()
+        # After the commit, so a concurrent read can't cache a row that is about to go
+        for agent_id in expired_ids:
+            agent_repository.invalidate(agent_id)
         return count
 
-    def get_usage_metrics(self, agent_id: str):
-        # In a real app, this would query Bedrock/CloudWatch for token usage
+    def get_usage_metrics(self, agent_id: str, start: datetime = None, end: datetime = None):
+        """
+        Totals over an agent's runs in [start, end), by default the last
+        USAGE_WINDOW_DAYS days: one aggregate over the (agent_id, created_at)
+        index. Runs still buffered in the execution log writer aren't counted yet.
+        """
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=USAGE_WINDOW_DAYS)
+        row = self.db.execute(
+            select(
+                func.count(),
+                func.sum(case((ExecutionLog.status == "error", 1), else_=0)),
+                func.sum(ExecutionLog.input_tokens),
+                func.sum(ExecutionLog.output_tokens),
+                func.sum(ExecutionLog.cost_usd),
+                func.avg(ExecutionLog.latency_ms),
+                func.max(ExecutionLog.latency_ms)
+            ).where(
+                ExecutionLog.agent_id == agent_id,
+                ExecutionLog.created_at >= start,
+                ExecutionLog.created_at < end
+            )
+        ).one()
+        requests, errors, input_tokens, output_tokens, cost, avg_latency, max_latency = row
+        input_tokens, output_tokens = int(input_tokens or 0), int(output_tokens or 0)
         return {
             "agent_id": agent_id,
-            "estimated_cost": 0.05, # Mock value
-            "tokens_used": 1500
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "requests": requests,
+            "errors": int(errors or 0),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_used": input_tokens + output_tokens,
+            "estimated_cost": round(float(cost or 0.0), 6),
+            "avg_latency_ms": round(float(avg_latency), 2) if avg_latency is not None else None,
+            "max_latency_ms": round(float(max_latency), 2) if max_latency is not None else None
         }
 
 def get_cost_manager(db: Session):
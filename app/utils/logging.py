@@ -1,39 +1,195 @@
-import boto3
+import atexit
+import collections
 import logging
+import sys
+import threading
 import time
 import os
+from typing import List, Tuple
 from dotenv import load_dotenv
+from ..core.providers import service_registry
 
 load_dotenv()
 
-class CloudWatchLogger:
-    def __init__(self, log_group="LLMOpsLogs", log_stream="RAGApp"):
+# put_log_events limits: 10,000 events and 1,048,576 bytes per batch, where each
+# event counts as its UTF-8 message size plus 26 bytes. One event is at most 256 KB.
+MAX_BATCH_EVENTS = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD_BYTES = 26
+MAX_EVENT_BYTES = 262144 - EVENT_OVERHEAD_BYTES
+
+LogEvent = Tuple[int, str]
+
+class CloudWatchSink:
+    """Ships batches with put_log_events, creating the group/stream on first use."""
+    def __init__(self, log_group: str, log_stream: str):
+        import boto3
         self.client = boto3.client("logs", region_name=os.getenv("AWS_REGION", "us-east-1"))
         self.log_group = log_group
         self.log_stream = log_stream
-        self._ensure_log_group_and_stream()
+        self._ready = False
 
     def _ensure_log_group_and_stream(self):
         try:
             self.client.create_log_group(logGroupName=self.log_group)
         except self.client.exceptions.ResourceAlreadyExistsException:
             pass
-        
+
         try:
             self.client.create_log_stream(logGroupName=self.log_group, logStreamName=self.log_stream)
         except self.client.exceptions.ResourceAlreadyExistsException:
             pass
+        self._ready = True
 
-    def log(self, message: str, level: str = "INFO"):
+    def send(self, events: List[LogEvent]):
+        if not self._ready:
+            self._ensure_log_group_and_stream()
         self.client.put_log_events(
             logGroupName=self.log_group,
             logStreamName=self.log_stream,
-            logEvents=[
-                {
-                    'timestamp': int(round(time.time() * 1000)),
-                    'message': f"[{level}] {message}"
-                },
-            ]
+            logEvents=[{'timestamp': timestamp, 'message': message} for timestamp, message in events]
         )
 
-cloudwatch_logger = CloudWatchLogger()
+class StreamSink:
+    """Writes events as lines to a stream (stdout by default) for local/offline use."""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, events: List[LogEvent]):
+        self.stream.write("".join(f"{timestamp} {message}\n" for timestamp, message in events))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+class FileSink(StreamSink):
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", buffering=1024 * 1024, encoding="utf-8"))
+
+    def close(self):
+        self.stream.close()
+
+def sink_from_env(log_group: str, log_stream: str):
+    """LOG_SINK=cloudwatch (default) | stdout | file:/path/to/app.log"""
+    target = os.getenv("LOG_SINK", "cloudwatch")
+    if target == "stdout":
+        return StreamSink()
+    if target.startswith("file:"):
+        return FileSink(target[len("file:"):])
+    return CloudWatchSink(log_group, log_stream)
+
+def iter_batches(events: List[LogEvent]):
+    """Split timestamp-sorted events into batches within the put_log_events limits."""
+    batch, batch_bytes = [], 0
+    for event in events:
+        size = len(event[1].encode("utf-8")) + EVENT_OVERHEAD_BYTES
+        if batch and (len(batch) >= MAX_BATCH_EVENTS or batch_bytes + size > MAX_BATCH_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(event)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+class CloudWatchLogger:
+    """
+    Non-blocking logger. `log` only appends to an in-process deque (atomic in
+    CPython, no lock); a daemon thread drains it and ships timestamp-sorted
+    batches when the buffer fills a batch (by event count or bytes) or every
+    `flush_interval` seconds. When the buffer is full new events are dropped
+    and counted.
+    """
+    def __init__(self, log_group="LLMOpsLogs", log_stream="RAGApp", sink=None):
+        self.log_group = log_group
+        self.log_stream = log_stream
+        self.sink = sink or sink_from_env(log_group, log_stream)
+        self.max_buffer = int(os.getenv("LOG_BUFFER_MAX_EVENTS", "100000"))
+        self.flush_interval = float(os.getenv("LOG_FLUSH_INTERVAL", "2.0"))
+        self.max_retries = int(os.getenv("LOG_MAX_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv("LOG_RETRY_BACKOFF", "0.2"))
+
+        self._queue = collections.deque()
+        # Approximate size of the queued batch: only used to wake the shipper early
+        self._queued_bytes = 0
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def log(self, message: str, level: str = "INFO"):
+        """Queue a log event; shipping happens on the background thread."""
+        if len(self._queue) >= self.max_buffer:
+            self.dropped += 1
+            return
+        message = f"[{level}] {message}"
+        # A character is at most 4 UTF-8 bytes: only encode when it could be over the limit
+        if len(message) > MAX_EVENT_BYTES // 4:
+            message = message.encode("utf-8")[:MAX_EVENT_BYTES].decode("utf-8", "ignore")
+        self._queue.append((int(time.time() * 1000), message))
+        # Characters undercount bytes (and keep encoding off this path): at the limit a full batch is queued
+        self._queued_bytes += len(message) + EVENT_OVERHEAD_BYTES
+        if self._thread is None:
+            self._start()
+        elif len(self._queue) >= MAX_BATCH_EVENTS or self._queued_bytes >= MAX_BATCH_BYTES:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Drain the buffer and ship everything in it (blocking)."""
+        with self._flush_lock:
+            events = []
+            self._queued_bytes = 0
+            while self._queue:
+                events.append(self._queue.popleft())
+            events.sort(key=lambda event: event[0])
+            for batch in iter_batches(events):
+                self._send_with_retry(batch)
+
+    def close(self):
+        """Ship what is queued and release the sink (e.g. flush and close the log file)."""
+        self.flush()
+        close = getattr(self.sink, "close", None)
+        if close is not None:
+            close()
+
+    def _send_with_retry(self, batch: List[LogEvent]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.send(batch)
+                self.sent += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    logging.getLogger(__name__).warning(f"Dropping {len(batch)} log events after {attempt + 1} attempts: {e}")
+                    return
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches
+        }
+
+cloudwatch_logger = service_registry.register("cloudwatch_logger", CloudWatchLogger)
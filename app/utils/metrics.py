@@ -0,0 +1,134 @@
+from typing import Tuple
+import functools
+import inspect
+import os
+import time
+from dotenv import load_dotenv
+
+# prometheus_client reads PROMETHEUS_MULTIPROC_DIR when it is imported
+load_dotenv()
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+# Request, node, tool and search latencies; DB statements and cache ops use the finer set
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "llmops_http_request_seconds", "HTTP requests by route template, including streamed bodies",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+GRAPH_NODE_SECONDS = Histogram(
+    "llmops_graph_node_seconds", "SuperAgent graph node runs", ["node"], buckets=LATENCY_BUCKETS
+)
+TOOL_CALL_SECONDS = Histogram(
+    "llmops_tool_call_seconds", "MCP tool calls by result-cache outcome (hit, miss, coalesced, skipped) or failure",
+    ["tool", "outcome"], buckets=LATENCY_BUCKETS
+)
+SEARCH_STAGE_SECONDS = Histogram(
+    "llmops_search_stage_seconds", "Hybrid search stages: one per backend list, embed, rerank, fusion and total",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+SEARCH_ERRORS = Counter("llmops_search_errors", "Failed or timed-out search backend lists", ["backend"])
+CACHE_OP_SECONDS = Histogram("llmops_cache_op_seconds", "Cache operations", ["cache", "op"], buckets=FAST_BUCKETS)
+CACHE_REQUESTS = Counter("llmops_cache_requests", "Cache lookups by result", ["cache", "result"])
+DB_QUERY_SECONDS = Histogram("llmops_db_query_seconds", "SQL statements by verb", ["operation"], buckets=FAST_BUCKETS)
+
+DB_OPERATIONS = ("select", "insert", "update", "delete")
+_db_children = {operation: DB_QUERY_SECONDS.labels(operation) for operation in DB_OPERATIONS + ("other",)}
+
+class timed:
+    """
+    Observe elapsed seconds on `histogram.labels(*labels)`, as a context
+    manager (a new instance per block) or as a decorator of sync or async
+    functions. The labelled child is resolved once, up front.
+    """
+    def __init__(self, histogram: Histogram, *labels: str):
+        self.child = histogram.labels(*labels)
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+    def __call__(self, func):
+        child = self.child
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+
+def _operation(statement: str) -> str:
+    words = statement[:32].split(None, 1)
+    verb = words[0].lower() if words else ""
+    return verb if verb in DB_OPERATIONS else "other"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is not None:
+        _db_children[_operation(statement)].observe(time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Time every statement run on a (sync) Engine; for an AsyncEngine pass its `sync_engine`."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    The exposition for /metrics. With PROMETHEUS_MULTIPROC_DIR set (several
+    uvicorn workers) every worker writes its samples to files there, and
+    whichever worker serves the scrape merges them.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by method, route template and status."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status[0])).observe(time.perf_counter() - start)
@@ -0,0 +1,75 @@
+import logging
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_FORMATS = {
+    "html": "text/html; charset=utf-8",
+    "text": "text/plain; charset=utf-8",
+    "speedscope": "application/json",
+}
+
+class ProfilerMiddleware:
+    """
+    Opt-in sampling profiler for single requests. With PROFILING_ENABLED=true,
+    a request sent with `X-Profile: html|text|speedscope` runs under
+    pyinstrument and gets the report back instead of its normal response
+    (whose status is in `X-Profiled-Status`). Streamed bodies are consumed
+    under the profiler too. Other requests pass straight through.
+    """
+    def __init__(self, app, enabled: bool = None, interval: float = None):
+        self.app = app
+        self.enabled = os.getenv("PROFILING_ENABLED", "false").lower() == "true" if enabled is None else enabled
+        self.interval = interval or float(os.getenv("PROFILING_INTERVAL", "0.001"))
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        fmt = dict(scope["headers"]).get(PROFILE_HEADER, b"").decode().strip().lower()
+        if not fmt:
+            return await self.app(scope, receive, send)
+        if fmt not in PROFILE_FORMATS:
+            fmt = "html"
+        try:
+            from pyinstrument import Profiler
+        except ImportError:  # profiling is optional
+            logging.getLogger(__name__).warning("X-Profile ignored: pyinstrument is not installed")
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def discard(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        except Exception:
+            # A failing request is still worth its profile
+            logging.getLogger(__name__).exception("Profiled request failed")
+            status[0] = 500
+        finally:
+            profiler.stop()
+
+        if fmt == "html":
+            body = profiler.output_html()
+        elif fmt == "speedscope":
+            from pyinstrument.renderers import SpeedscopeRenderer
+            body = profiler.output(renderer=SpeedscopeRenderer())
+        else:
+            body = profiler.output_text(unicode=True, color=False)
+        body = body.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", PROFILE_FORMATS[fmt].encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status[0]).encode()),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
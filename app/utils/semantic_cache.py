@@ -0,0 +1,243 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import time
+import uuid
+import numpy as np
+from .cache_codec import encode_payload, decode_payload
+
+class SemanticNamespace:
+    """
+    In-memory embedding matrix for one agent. Rows are L2-normalised so a
+    single matrix-vector product gives cosine similarity for every entry.
+    Each row keeps its creation time so entries expire on their own.
+    """
+    def __init__(self, dim: int, max_entries: int, initial_capacity: int = 1024):
+        self.dim = dim
+        self.max_entries = max_entries
+        capacity = min(initial_capacity, max_entries)
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.created_at = np.zeros(capacity, dtype=np.float64)
+        self.entry_ids: List[str] = []
+        self._clock = 0
+
+    def __len__(self):
+        return len(self.entry_ids)
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def _grow(self):
+        capacity = min(self.max_entries, max(1, len(self.vectors)) * 2)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self)] = self.vectors[:len(self)]
+        last_used = np.zeros(capacity, dtype=np.int64)
+        last_used[:len(self)] = self.last_used[:len(self)]
+        created_at = np.zeros(capacity, dtype=np.float64)
+        created_at[:len(self)] = self.created_at[:len(self)]
+        self.vectors, self.last_used, self.created_at = vectors, last_used, created_at
+
+    def search(self, query: np.ndarray) -> Tuple[int, float]:
+        """Return the (row, similarity) of the closest entry, or (-1, 0.0) when empty."""
+        size = len(self)
+        if size == 0:
+            return -1, 0.0
+        scores = self.vectors[:size] @ query
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def touch(self, row: int):
+        self.last_used[row] = self._tick()
+
+    def add(self, entry_id: str, vector: np.ndarray, created_at: float = None) -> Optional[str]:
+        """Insert a normalised vector; returns the evicted entry_id, if any."""
+        evicted = None
+        if len(self) >= self.max_entries:
+            evicted = self.remove_row(int(np.argmin(self.last_used[:len(self)])))
+        if len(self) >= len(self.vectors):
+            self._grow()
+        row = len(self)
+        self.vectors[row] = vector
+        self.last_used[row] = self._tick()
+        self.created_at[row] = time.time() if created_at is None else created_at
+        self.entry_ids.append(entry_id)
+        return evicted
+
+    def remove_older_than(self, cutoff: float) -> List[str]:
+        """Drop entries created before `cutoff`; returns their ids."""
+        stale = np.nonzero(self.created_at[:len(self)] < cutoff)[0]
+        # Highest rows first, so swapping in the last row never moves a row still to be removed
+        return [self.remove_row(int(row)) for row in stale[::-1]]
+
+    def remove(self, entry_id: str):
+        if entry_id in self.entry_ids:
+            self.remove_row(self.entry_ids.index(entry_id))
+
+    def remove_row(self, row: int) -> str:
+        # Swap with the last row so the live rows stay contiguous
+        last = len(self) - 1
+        entry_id = self.entry_ids[row]
+        self.vectors[row] = self.vectors[last]
+        self.last_used[row] = self.last_used[last]
+        self.created_at[row] = self.created_at[last]
+        self.entry_ids[row] = self.entry_ids[last]
+        self.entry_ids.pop()
+        return entry_id
+
+class SemanticCache:
+    """
+    Second cache tier that matches paraphrased queries by embedding similarity.
+
+    Each agent_id gets its own namespace. Vectors live in an in-memory NumPy
+    matrix for top-1 lookup; Redis holds the vectors and answers so a restarted
+    worker can rebuild the matrix, plus a sorted set of creation times so it
+    reloads only the newest unexpired `max_entries`. Entries expire `expire`
+    seconds after they were stored. Pass `redis_client=None` for memory only.
+    """
+    def __init__(self, redis_client=None, threshold: float = 0.95, max_entries: int = 10000, expire: int = 3600):
+        self.redis_client = redis_client
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.expire = expire
+        self._namespaces: Dict[str, SemanticNamespace] = {}
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+
+    def _keys(self, agent_id: str) -> Tuple[str, str, str]:
+        return f"semcache:{agent_id}:vec", f"semcache:{agent_id}:data", f"semcache:{agent_id}:created"
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def _namespace(self, agent_id: str, dim: int) -> SemanticNamespace:
+        namespace = self._namespaces.get(agent_id)
+        if namespace is not None:
+            return namespace
+        lock = self._load_locks.setdefault(agent_id, asyncio.Lock())
+        async with lock:
+            if agent_id not in self._namespaces:
+                namespace = SemanticNamespace(dim, self.max_entries)
+                if self.redis_client is not None:
+                    await self._reload(agent_id, namespace)
+                self._namespaces[agent_id] = namespace
+        return self._namespaces[agent_id]
+
+    async def _reload(self, agent_id: str, namespace: SemanticNamespace):
+        """Rebuild the matrix from Redis, oldest first, and delete what expired or no longer fits."""
+        vec_key, _, created_key = self._keys(agent_id)
+        created = await self.redis_client.zrange(created_key, 0, -1, withscores=True)
+        cutoff = time.time() - self.expire
+        # zrange is ordered by creation time, so the newest entries are at the end
+        expired = [entry_id for entry_id, created_at in created if created_at < cutoff]
+        live = created[len(expired):]
+        keep = live[-self.max_entries:]
+        dropped = expired + [entry_id for entry_id, _ in live[:len(live) - len(keep)]]
+        if keep:
+            vectors = await self.redis_client.hmget(vec_key, [entry_id for entry_id, _ in keep])
+            for (entry_id, created_at), raw in zip(keep, vectors):
+                vector = np.frombuffer(raw, dtype=np.float32) if raw is not None else None
+                if vector is not None and vector.shape[0] == namespace.dim:
+                    namespace.add(entry_id.decode() if isinstance(entry_id, bytes) else entry_id, vector, created_at)
+        if dropped:
+            await self._delete(agent_id, dropped)
+
+    async def _delete(self, agent_id: str, entry_ids: List[str]):
+        if self.redis_client is None:
+            values = self._values.get(agent_id, {})
+            for entry_id in entry_ids:
+                values.pop(entry_id, None)
+            return
+        vec_key, data_key, created_key = self._keys(agent_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hdel(vec_key, *entry_ids)
+        pipe.hdel(data_key, *entry_ids)
+        pipe.zrem(created_key, *entry_ids)
+        await pipe.execute()
+
+    async def get(self, agent_id: str, embedding) -> Optional[Dict[str, Any]]:
+        """Return the cached value of the most similar unexpired query above the threshold."""
+        query = self._normalize(embedding)
+        namespace = await self._namespace(agent_id, query.shape[0])
+        expired = namespace.remove_older_than(time.time() - self.expire)
+        if expired:
+            await self._delete(agent_id, expired)
+
+        start = time.perf_counter()
+        row, score = namespace.search(query)
+        self.lookup_time += time.perf_counter() - start
+
+        value = None
+        if row >= 0 and score >= self.threshold:
+            entry_id = namespace.entry_ids[row]
+            namespace.touch(row)
+            value = await self._load_value(agent_id, entry_id)
+            if value is None:
+                # Backing store expired underneath us
+                namespace.remove(entry_id)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    async def _load_value(self, agent_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis_client is None:
+            return self._values.get(agent_id, {}).get(entry_id)
+        _, data_key, _ = self._keys(agent_id)
+        raw = await self.redis_client.hget(data_key, entry_id)
+        return decode_payload(raw)
+
+    async def set(self, agent_id: str, embedding, value: Dict[str, Any]):
+        """Store `value` under the query embedding, evicting the LRU entry when full of live ones."""
+        vector = self._normalize(embedding)
+        namespace = await self._namespace(agent_id, vector.shape[0])
+        created_at = time.time()
+        # Expired entries make room before a live one is evicted
+        expired = namespace.remove_older_than(created_at - self.expire)
+        if expired:
+            await self._delete(agent_id, expired)
+        entry_id = uuid.uuid4().hex
+        evicted = namespace.add(entry_id, vector, created_at)
+
+        if self.redis_client is None:
+            values = self._values.setdefault(agent_id, {})
+            values[entry_id] = value
+            values.pop(evicted, None)
+            return
+
+        vec_key, data_key, created_key = self._keys(agent_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hset(vec_key, entry_id, vector.tobytes())
+        pipe.hset(data_key, entry_id, encode_payload(value))
+        pipe.zadd(created_key, {entry_id: created_at})
+        if evicted:
+            pipe.hdel(vec_key, evicted)
+            pipe.hdel(data_key, evicted)
+            pipe.zrem(created_key, evicted)
+        # Entries expire on their own; the key TTL only removes a namespace nobody writes to any more
+        for key in (vec_key, data_key, created_key):
+            pipe.expire(key, self.expire)
+        await pipe.execute()
+
+    async def clear(self, agent_id: str):
+        self._namespaces.pop(agent_id, None)
+        self._values.pop(agent_id, None)
+        if self.redis_client is not None:
+            await self.redis_client.delete(*self._keys(agent_id))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": (self.lookup_time / lookups) * 1000 if lookups else 0.0,
+            "entries": {agent_id: len(ns) for agent_id, ns in self._namespaces.items()}
+        }
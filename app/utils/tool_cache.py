@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+from .cache_codec import encode_payload, decode_payload
+from .caching import SingleFlight, cache_service
+from ..core.providers import service_registry
+
+load_dotenv()
+
+# Lookup outcomes reported per call
+HIT, MISS, COALESCED, SKIPPED = "hit", "miss", "coalesced", "skipped"
+
+def canonical_args(args: Dict[str, Any]) -> str:
+    """Key-order independent JSON of a tool's arguments."""
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+class ToolResultCache:
+    """
+    Memoized results of deterministic tools, keyed by a hash of (tool name,
+    code version, canonical arguments). An in-process LRU sits in front of
+    Redis; concurrent identical calls share one execution; results larger
+    than `max_bytes` once encoded, or that can't be encoded, are returned but
+    not stored. Misses return the same JSON shape hits do. Pass
+    `redis_client=None` for memory only.
+    """
+    def __init__(self, redis_client=None, max_entries: int = None, max_bytes: int = None):
+        self.redis_client = redis_client
+        self.max_entries = max_entries or int(os.getenv("TOOL_CACHE_LOCAL_SIZE", "2048"))
+        self.max_bytes = max_bytes or int(os.getenv("TOOL_CACHE_MAX_BYTES", str(64 * 1024)))
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.too_large = 0
+        self.unencodable = 0
+        self.redis_errors = 0
+        self.per_tool: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def key(tool_name: str, version: str, args: Dict[str, Any]) -> str:
+        digest = hashlib.sha256(f"{tool_name}\x00{version}\x00{canonical_args(args)}".encode()).hexdigest()
+        return f"toolcache:{tool_name}:{digest}"
+
+    def _count(self, tool_name: str, outcome: str):
+        counts = self.per_tool.setdefault(tool_name, {"hits": 0, "misses": 0})
+        counts["misses" if outcome == MISS else "hits"] += 1
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return entry[1]
+            del self._local[key]
+        if self.redis_client is None:
+            return None
+        try:
+            payload = decode_payload(await self.redis_client.get(key))
+        except Exception:
+            # Redis only saves work; a failed lookup runs the tool
+            self.redis_errors += 1
+            return None
+        if payload is None:
+            return None
+        self.redis_hits += 1
+        self._remember(key, payload["expires_at"], payload)
+        return payload
+
+    def _remember(self, key: str, expires_at: float, payload: Dict[str, Any]):
+        self._local[key] = (expires_at, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def _store(self, key: str, result: Any, ttl: int) -> Any:
+        """Cache `result` and return it as hits will see it: JSON round-tripped, as-is if it can't be encoded."""
+        payload = {"result": result, "expires_at": time.time() + ttl}
+        try:
+            raw = encode_payload(payload)
+        except (TypeError, ValueError):
+            # e.g. non-string dict keys: the call still succeeds, it just isn't cached
+            self.unencodable += 1
+            return result
+        payload = decode_payload(raw)
+        if len(raw) > self.max_bytes:
+            self.too_large += 1
+            return payload["result"]
+        # Local copies expire with the Redis entry, so workers never serve an outdated result for longer
+        self._remember(key, payload["expires_at"], payload)
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(key, raw, ex=ttl)
+            except Exception:
+                self.redis_errors += 1
+        return payload["result"]
+
+    async def get_or_call(self, tool_name: str, version: str, args: Dict[str, Any], ttl: int,
+                          call: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Return (result, outcome): a cached result, or `call()`'s result after storing it."""
+        key = self.key(tool_name, version, args)
+        payload = await self._lookup(key)
+        if payload is not None:
+            self._count(tool_name, HIT)
+            return payload["result"], HIT
+
+        ran = False
+
+        async def run():
+            nonlocal ran
+            ran = True
+            self.misses += 1
+            return await self._store(key, await call(), ttl)
+
+        result = await self._flight.do(key, run)
+        outcome = MISS if ran else COALESCED
+        self._count(tool_name, outcome)
+        return result, outcome
+
+    def clear(self):
+        self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits + self._flight.coalesced
+        lookups = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "coalesced": self._flight.coalesced,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "too_large": self.too_large,
+            "unencodable": self.unencodable,
+            "redis_errors": self.redis_errors,
+            "local_entries": len(self._local),
+            "tools": self.per_tool
+        }
+
+tool_result_cache = service_registry.register("tool_cache", lambda: ToolResultCache(cache_service.redis_client))
@@ -0,0 +1,213 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import insert
+from ..core.providers import service_registry
+from ..models.models import ExecutionLog
+from .batch_writer import BatchWriter
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+EXECUTION_LOG_ENABLED = os.getenv("EXECUTION_LOG_ENABLED", "true").lower() == "true"
+
+# On-demand Bedrock prices in USD per 1K tokens. MODEL_PRICES (JSON, same shape) adds or overrides models.
+DEFAULT_MODEL_PRICES = {
+    "anthropic.claude-3-sonnet-20240229-v1:0": {"input": 0.003, "output": 0.015},
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": {"input": 0.003, "output": 0.015},
+    "anthropic.claude-3-5-sonnet-20241022-v2:0": {"input": 0.003, "output": 0.015},
+    "anthropic.claude-3-haiku-20240307-v1:0": {"input": 0.00025, "output": 0.00125},
+    "anthropic.claude-3-5-haiku-20241022-v1:0": {"input": 0.0008, "output": 0.004},
+    "anthropic.claude-3-opus-20240229-v1:0": {"input": 0.015, "output": 0.075},
+    "amazon.titan-text-express-v1": {"input": 0.0002, "output": 0.0006},
+    "meta.llama3-70b-instruct-v1:0": {"input": 0.00265, "output": 0.0035},
+}
+# Cross-region inference profiles ("us.anthropic...") are billed as the underlying model
+_REGION_PREFIX = re.compile(r"^(us|eu|apac|us-gov|global)\.")
+
+class PriceTable:
+    """Prices calls by model id; models missing from the table cost None, and runs list them as unpriced."""
+    def __init__(self, prices: Dict[str, Dict[str, float]] = None):
+        self.prices = dict(DEFAULT_MODEL_PRICES)
+        self.prices.update(json.loads(os.getenv("MODEL_PRICES") or "{}") if prices is None else prices)
+
+    def lookup(self, model_id: Optional[str]) -> Optional[Dict[str, float]]:
+        if not model_id:
+            return None
+        return self.prices.get(model_id) or self.prices.get(_REGION_PREFIX.sub("", model_id))
+
+    def cost(self, model_id: Optional[str], input_tokens: int, output_tokens: int) -> Optional[float]:
+        """USD for one call, or None when the model has no price."""
+        price = self.lookup(model_id)
+        if price is None:
+            return None
+        return (input_tokens * price.get("input", 0.0) + output_tokens * price.get("output", 0.0)) / 1000
+
+price_table = PriceTable()
+
+def _tokens(response) -> Dict[str, int]:
+    """Input/output tokens of an LLMResult: message usage_metadata, else the provider's llm_output usage."""
+    input_tokens = output_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                found = True
+                input_tokens += metadata.get("input_tokens", 0) or 0
+                output_tokens += metadata.get("output_tokens", 0) or 0
+    if not found:
+        usage = (response.llm_output or {}).get("usage") or {}
+        input_tokens = usage.get("input_tokens", usage.get("prompt_tokens", 0)) or 0
+        output_tokens = usage.get("output_tokens", usage.get("completion_tokens", 0)) or 0
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+class UsageCallback(BaseCallbackHandler):
+    """
+    Tokens, latency and cost of one run, per LLM call and per LangGraph
+    node. Create one per run and pass it in the run config's `callbacks`.
+    LLM calls are attributed to the node in their `langgraph_node` metadata.
+    """
+    # Bookkeeping only: run on the event loop instead of hopping to an executor per event
+    run_inline = True
+
+    def __init__(self, default_model: str = None, prices: PriceTable = None):
+        self.default_model = default_model
+        self.prices = prices or price_table
+        self.start = time.perf_counter()
+        self.calls: List[Dict[str, Any]] = []
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._llm_runs: Dict[Any, tuple] = {}
+        self._node_runs: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _node(self, name: str) -> Dict[str, Any]:
+        return self.nodes.setdefault(name, {
+            "runs": 0, "latency_ms": 0.0, "llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0
+        })
+
+    def _llm_start(self, run_id, metadata: Optional[Dict[str, Any]], kwargs: Dict[str, Any]):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or params.get("model_id") or params.get("model") or self.default_model
+        with self._lock:
+            self._llm_runs[run_id] = (time.perf_counter(), metadata.get("langgraph_node"), model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        self._llm_start(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        self._llm_start(run_id, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            started, node, model = self._llm_runs.pop(run_id, (None, None, self.default_model))
+        model = (response.llm_output or {}).get("model_id") or model
+        tokens = _tokens(response)
+        cost = self.prices.cost(model, tokens["input_tokens"], tokens["output_tokens"])
+        call = {
+            "node": node,
+            "model": model,
+            **tokens,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2) if started else None,
+            "cost_usd": cost,
+            "tool_calls": [
+                tool_call["name"] for generations in response.generations for generation in generations
+                for tool_call in getattr(getattr(generation, "message", None), "tool_calls", None) or []
+            ]
+        }
+        with self._lock:
+            self.calls.append(call)
+            if node:
+                totals = self._node(node)
+                totals["llm_calls"] += 1
+                totals["input_tokens"] += tokens["input_tokens"]
+                totals["output_tokens"] += tokens["output_tokens"]
+                totals["cost_usd"] += cost or 0.0
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self._llm_runs.pop(run_id, None)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        # A node's own run is the chain named after the node; its inner chains carry the same metadata
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            with self._lock:
+                self._node_runs[run_id] = (time.perf_counter(), node)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            run = self._node_runs.pop(run_id, None)
+            if run is not None:
+                totals = self._node(run[1])
+                totals["runs"] += 1
+                totals["latency_ms"] += (time.perf_counter() - run[0]) * 1000
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self.calls)
+            nodes = {name: dict(totals, latency_ms=round(totals["latency_ms"], 2), cost_usd=round(totals["cost_usd"], 6))
+                     for name, totals in self.nodes.items()}
+        input_tokens = sum(call["input_tokens"] for call in calls)
+        output_tokens = sum(call["output_tokens"] for call in calls)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost_usd": round(sum(call["cost_usd"] or 0.0 for call in calls), 6),
+            "latency_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "llm_calls": len(calls),
+            "unpriced_models": sorted({str(call["model"]) for call in calls if call["cost_usd"] is None}),
+            # The run's plan: the tools the model called, one list of names per planning round
+            "plan": [call["tool_calls"] for call in calls if call["tool_calls"]],
+            "nodes": nodes,
+            "calls": calls
+        }
+
+def execution_row(agent_id: str, session_id: str, query: str, response: Optional[str], usage: Dict[str, Any],
+                  trace_id: str = None, error: str = None) -> Dict[str, Any]:
+    """An execution_logs row from a UsageCallback summary; the per-node and per-call breakdown goes in `metrics`."""
+    metrics = {key: usage.get(key) for key in ("llm_calls", "unpriced_models", "nodes", "calls")}
+    if error:
+        metrics["error"] = error
+    return {
+        "id": str(uuid.uuid4()),
+        "agent_id": agent_id,
+        "session_id": session_id,
+        "query": query,
+        "response": response,
+        "plan": usage.get("plan"),
+        "metrics": metrics,
+        "trace_id": trace_id,
+        "status": "error" if error else "ok",
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cost_usd": usage.get("cost_usd", 0.0),
+        "latency_ms": usage.get("latency_ms"),
+        "created_at": datetime.utcnow()
+    }
+
+class ExecutionLogWriter(BatchWriter):
+    """
+    Write-behind buffer for execution_logs (see BatchWriter). Rows are what
+    usage is billed from, so a full buffer is flushed rather than dropped.
+    """
+    env_prefix = "EXECUTION_LOG"
+    default_flush_interval = 2.0
+    thread_name = "execution-log-writer"
+    noun = "execution logs"
+
+    def __init__(self, bind=None, batch_size: int = None, flush_interval: float = None, max_buffer: int = None):
+        super().__init__(insert(ExecutionLog), bind, batch_size, flush_interval, max_buffer)
+
+execution_log_writer = service_registry.register("execution_log_writer", ExecutionLogWriter)
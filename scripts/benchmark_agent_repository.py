@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.models import Agent, AgentType, Tool, agent_tools
+from app.services.agent_repository import AgentRepository, SQLAgentStore
+
+def percentiles(timings):
+    timings = np.array(timings) * 1e6
+    return f"p50 {np.percentile(timings, 50):9.1f}us  p99 {np.percentile(timings, 99):9.1f}us"
+
+def seed(session_factory, agents, tools_per_agent):
+    with session_factory() as db:
+        tools = [Tool(id=f"t{i}", name=f"tool{i}", description="", schema={"type": "object", "properties": {}},
+                      code=f"def tool{i}():\n    return {i}") for i in range(tools_per_agent * 4)]
+        db.add_all(tools)
+        for i in range(agents):
+            agent = Agent(id=f"a{i}", name=f"agent{i}", type=AgentType.SUB, system_prompt="You are a helpful agent.",
+                          config={"search": {"weights": {"graph": 0.5}}})
+            agent.tools = tools[i % 4 * tools_per_agent:(i % 4 + 1) * tools_per_agent]
+            db.add(agent)
+        db.commit()
+
+def legacy_load(session_factory, agent_id):
+    # What each request did before: a session, the agent row, then its tools
+    with session_factory() as db:
+        agent = db.query(Agent).filter(Agent.id == agent_id).first()
+        return agent.system_prompt, agent.config, [tool.id for tool in agent.tools]
+
+def bench(label, calls, load):
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        load(i)
+        timings.append(time.perf_counter() - start)
+    print(f"  {label:<40}{percentiles(timings)}")
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        # A SQLite file stands in for PostgreSQL/DynamoDB offline; real stores add a network round trip per read
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'agents.db')}")
+        for table in (Agent.__table__, Tool.__table__, agent_tools):
+            table.create(engine)
+        session_factory = sessionmaker(bind=engine)
+        seed(session_factory, args.agents, args.tools)
+        ids = [f"a{i}" for i in range(args.agents)]
+
+        print(f"{args.calls} single-agent loads over {args.agents} agents with {args.tools} tools each")
+        bench("legacy query per request", args.calls, lambda i: legacy_load(session_factory, ids[i % len(ids)]))
+        repository = AgentRepository(SQLAgentStore(session_factory), ttl=args.ttl)
+        bench("repository (cold, then cached)", args.calls, lambda i: repository.get(ids[i % len(ids)]))
+        print(f"  {repository.stats()}")
+
+        batch = ids[:args.batch]
+        print(f"Loading {len(batch)} agents at once")
+        start = time.perf_counter()
+        for agent_id in batch:
+            legacy_load(session_factory, agent_id)
+        print(f"  {'legacy, one query per agent':<40}{(time.perf_counter() - start) * 1e3:9.1f}ms")
+        repository.clear()
+        start = time.perf_counter()
+        repository.get_many(batch)
+        print(f"  {'repository.get_many (cold, batched)':<40}{(time.perf_counter() - start) * 1e3:9.1f}ms")
+        start = time.perf_counter()
+        repository.get_many(batch)
+        print(f"  {'repository.get_many (cached)':<40}{(time.perf_counter() - start) * 1e3:9.1f}ms")
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent metadata loads: per-request queries against the cached repository.")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--tools", type=int, default=5, help="Tools assigned to each agent")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--ttl", type=float, default=60)
+    main(parser.parse_args())
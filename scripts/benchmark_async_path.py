@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest import mock
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+# Stub the AWS backends so the service singletons can be built offline
+with mock.patch("boto3.client"), mock.patch("boto3.resource"):
+    from app.services.agents import super_agent as super_agent_module
+    from app.services.agents.super_agent import SuperAgent
+    from app.services.mcp_server import MCPServer
+    from app.services.memory_service import MemoryService
+    from app.utils.caching import SingleFlight
+
+from langchain_core.messages import AIMessage
+
+class StubLLM:
+    """Bedrock stand-in with a fixed latency; `blocking` mimics a sync SDK call on the loop."""
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    def invoke(self, messages, **kwargs):
+        time.sleep(self.latency)
+        return AIMessage(content="stub answer")
+
+    async def ainvoke(self, messages, **kwargs):
+        if self.blocking:
+            return self.invoke(messages)
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="stub answer")
+
+class StubCache:
+    semantic_enabled = False
+
+    def __init__(self):
+        self.single_flight = SingleFlight()
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, expire=3600):
+        pass
+
+    def generate_cache_key(self, query, agent_id):
+        return f"cache:{agent_id}:{query}"
+
+async def run_load(agent: SuperAgent, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await agent.execute(session_id=f"bench-{i}", agent_id="bench", query=f"question {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "elapsed_s": elapsed,
+        "rps": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000
+    }
+
+def build_agent(latency: float, blocking: bool) -> SuperAgent:
+    agent = SuperAgent(None, "bench", tools_metadata=[], mcp=MCPServer(None))
+    agent.llm = agent.llm_with_tools = StubLLM(latency, blocking)
+    return agent
+
+async def stub_add_memory(self, session_id, tier, content):
+    await asyncio.sleep(0.002)
+
+async def main(args):
+    super_agent_module.cache_service = StubCache()
+    super_agent_module.cloudwatch_logger = mock.Mock()
+    MemoryService.aadd_memory = stub_add_memory
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub LLM latency {args.latency * 1000:.0f}ms x2 calls")
+    for label, blocking in (("blocking (sync invoke)", True), ("async (ainvoke)", False)):
+        stats = await run_load(build_agent(args.latency, blocking), args.requests, args.concurrency)
+        print(f"{label:<24} {stats['elapsed_s']:.2f}s  {stats['rps']:.1f} req/s  "
+              f"p50 {stats['p50_ms']:.0f}ms  p99 {stats['p99_ms']:.0f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark of the /rag/query path against stubbed backends.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub LLM latency per call in seconds")
+    asyncio.run(main(parser.parse_args()))
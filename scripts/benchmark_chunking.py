@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.chunking import chunking_utility
+
+def legacy_split_text(text: str, chunk_size: int = 1000, overlap: int = 200):
+    """The character-window splitter that ChunkingUtility.split_text used to be."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        if end < len(text):
+            last_space = chunk.rfind(' ')
+            if last_space != -1:
+                chunk = chunk[:last_space]
+                end = start + last_space
+        chunks.append(chunk.strip())
+        start = end - overlap
+        if start < 0:
+            start = end
+    return chunks
+
+def build_corpus(megabytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 12)))
+        for _ in range(5000)
+    ]
+    paragraph = []
+    for _ in range(2000):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+        paragraph.append(sentence.capitalize() + rng.choice([". ", ". ", "? ", ".\n\n"]))
+    block = "".join(paragraph)
+    return (block * (megabytes * 2**20 // len(block) + 1))[:megabytes * 2**20]
+
+def report(name: str, elapsed: float, size: int, chunks: int, output_bytes: int):
+    print(f"{name:<28} {elapsed:7.2f}s  {size / 2**20 / elapsed:7.1f} MB/s  "
+          f"{chunks:>9,} chunks  output {output_bytes / 2**20:8.1f} MiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunker throughput: legacy character splitter vs token spans.")
+    parser.add_argument("--mb", type=int, default=100, help="Corpus size in MiB")
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    text = build_corpus(args.mb)
+    print(f"corpus {len(text) / 2**20:.0f} MiB")
+
+    start = time.perf_counter()
+    chunks = legacy_split_text(text, chunk_size=args.chunk_tokens * 4, overlap=args.overlap_tokens * 4)
+    report("legacy split_text (chars)", time.perf_counter() - start, len(text), len(chunks),
+           sum(sys.getsizeof(chunk) for chunk in chunks))
+    del chunks
+
+    start = time.perf_counter()
+    count = 0
+    for _ in chunking_utility.iter_spans(text, args.chunk_tokens, args.overlap_tokens):
+        count += 1
+    report("iter_spans (tokens, stream)", time.perf_counter() - start, len(text), count, 0)
+
+    start = time.perf_counter()
+    spans = chunking_utility.split_spans(text, args.chunk_tokens, args.overlap_tokens)
+    report("split_spans (tokens, list)", time.perf_counter() - start, len(text), len(spans),
+           sys.getsizeof(spans) + sum(sys.getsizeof(span) + 2 * 28 for span in spans))
+
+    data = text.encode()
+    start = time.perf_counter()
+    count = sum(1 for _ in chunking_utility.iter_spans(data, args.chunk_tokens, args.overlap_tokens))
+    report("iter_spans (bytes)", time.perf_counter() - start, len(data), count, 0)
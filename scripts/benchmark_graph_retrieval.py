@@ -0,0 +1,174 @@
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.graph_retrieval import GraphRetriever
+
+LEGACY_QUERY = "MATCH (n)-[r]->(m) WHERE n.name CONTAINS $query OR m.name CONTAINS $query RETURN n, r, m LIMIT $limit"
+RELATIONS = [f"REL_{i}" for i in range(20)]
+
+class Record:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return self._data
+
+class EmbeddedGraph:
+    """
+    In-process stand-in for neo4j that answers the statements the search
+    service sends: a full-text index (token -> node postings), adjacency in
+    CSR arrays for the bounded expansion, and the legacy CONTAINS query as
+    the full relationship scan it is without an index.
+    """
+    def __init__(self, nodes: int, edges: int, vocab: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+        words = [syllables[i % 70] + syllables[i // 70 % 70] + syllables[i // 4900 % 70] for i in range(vocab)]
+        pairs = rng.choice(vocab * vocab, size=nodes, replace=False)
+        self.names = [f"{words[p // vocab].capitalize()} {words[p % vocab].capitalize()}" for p in pairs]
+        self.postings = {}
+        for node, name in enumerate(self.names):
+            for token in name.lower().split():
+                self.postings.setdefault(token, []).append(node)
+
+        # Skewed degrees: a few hubs with thousands of relationships, like real entity graphs
+        self.src = rng.integers(nodes, size=edges)
+        self.dst = (nodes * rng.random(edges) ** 3).astype(np.int64)
+        self.rel = rng.integers(len(RELATIONS), size=edges)
+        ends = np.concatenate([self.src, self.dst])
+        self.order = np.argsort(ends, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(ends, minlength=nodes))])
+        self.edges = edges
+        self.rows_returned = 0
+
+    def degree(self, node: int) -> int:
+        return int(self.offsets[node + 1] - self.offsets[node])
+
+    def session(self, **kwargs):
+        return self
+
+    def execute_read(self, work, *args):
+        return work(self, *args)
+
+    def close(self):
+        pass
+
+    def run(self, cypher, **params):
+        if cypher.startswith("CREATE"):
+            return Result([])
+        if cypher == LEGACY_QUERY:
+            return Result(self._legacy(params["query"], params["limit"]))
+        if "queryNodes" in cypher:
+            return Result(self._seeds(params["search"], params["limit"]))
+        return Result(self._expand(params["frontier"], params["fanout"], params["limit"]))
+
+    def _legacy(self, query, limit):
+        rows = []
+        for i in range(self.edges):
+            if query in self.names[self.src[i]] or query in self.names[self.dst[i]]:
+                rows.append(Record({"n": {"name": self.names[self.src[i]]}, "r": ({}, RELATIONS[self.rel[i]], {}), "m": {"name": self.names[self.dst[i]]}}))
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def _seeds(self, search, limit):
+        scores = {}
+        for term in search.split(" OR "):
+            tokens = re.sub(r'\\(.)', r"\1", term.strip('"')).lower().split()
+            matches = set(self.postings.get(tokens[0], []))
+            for token in tokens[1:]:
+                matches &= set(self.postings.get(token, []))
+            for node in matches:
+                scores[node] = scores.get(node, 0.0) + len(tokens)
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [Record({"id": str(node), "name": self.names[node], "score": scores[node]}) for node in best]
+
+    def _expand(self, frontier, fanout, limit):
+        rows = []
+        for node_id in frontier:
+            node = int(node_id)
+            start = self.offsets[node]
+            for slot in self.order[start:min(start + fanout, self.offsets[node + 1])]:
+                edge = slot % self.edges
+                outgoing = slot < self.edges
+                other = int(self.dst[edge] if outgoing else self.src[edge])
+                rows.append(Record({
+                    "from_id": node_id, "to_id": str(other), "name": self.names[node],
+                    "relation": RELATIONS[self.rel[edge]], "neighbour": self.names[other], "outgoing": outgoing
+                }))
+                if len(rows) >= limit:
+                    self.rows_returned += len(rows)
+                    return rows
+        self.rows_returned += len(rows)
+        return rows
+
+class Result(list):
+    def consume(self):
+        pass
+
+def percentiles(timings):
+    timings = np.array(timings)
+    return f"p50 {np.percentile(timings, 50):9.2f}ms  p99 {np.percentile(timings, 99):9.2f}ms"
+
+def bench(label, graph, search, questions):
+    graph.rows_returned = 0
+    timings, facts = [], 0
+    for question in questions:
+        start = time.perf_counter()
+        facts += len(search(question))
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<34}{percentiles(timings)}  {facts / len(questions):6.1f} facts  "
+          f"{graph.rows_returned / len(questions):10,.0f} rows read/query")
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph retrieval latency on a synthetic 1M-relationship graph.")
+    parser.add_argument("--nodes", type=int, default=200_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--vocab", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-queries", type=int, default=10, help="The full scan is slow; fewer runs")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = EmbeddedGraph(args.nodes, args.edges, args.vocab)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(args.nodes, size=(args.queries, 2))
+    questions = [f"How is {graph.names[a]} related to {graph.names[b]}?" for a, b in picks]
+    hubs = np.argsort(-np.diff(graph.offsets))[:args.queries]
+    hub_questions = [f"What do we know about {graph.names[node]}?" for node in hubs]
+    print(f"{args.nodes:,} nodes, {args.edges:,} relationships, built in {time.perf_counter() - start:.1f}s; "
+          f"max degree {graph.degree(int(hubs[0])):,}")
+
+    graph.rows_returned = 0
+    legacy_timings = []
+    for question in questions[:args.legacy_queries]:
+        start = time.perf_counter()
+        graph.run(LEGACY_QUERY, query=question, limit=args.top_k)
+        legacy_timings.append((time.perf_counter() - start) * 1000)
+    print(f"{'legacy CONTAINS scan':<34}{percentiles(legacy_timings)}  {0:6.1f} facts  {args.edges:10,} rows read/query")
+
+    bounded = GraphRetriever(graph, max_depth=2, max_fanout=25, cache_size=0)
+    unbounded = GraphRetriever(graph, max_depth=2, max_fanout=10**9, seed_limit=10, max_results=10**9, cache_size=0)
+    cached = GraphRetriever(graph, max_depth=2, max_fanout=25)
+    for label, retriever, batch in (
+        ("index + 2 hops, fan-out 25", bounded, questions),
+        ("index + 2 hops, no fan-out cap", unbounded, questions),
+        ("index + 2 hops, fan-out 25 (hubs)", bounded, hub_questions),
+        ("index + 2 hops, no cap (hubs)", unbounded, hub_questions),
+    ):
+        bench(label, graph, lambda q: retriever.retrieve(q, limit=args.top_k), batch)
+
+    for question in questions:
+        cached.retrieve(question, limit=args.top_k)
+    bench("entity-set cache hit", graph, lambda q: cached.retrieve(q.replace("How is", "Explain how"), limit=args.top_k), questions)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.fusion import fuse
+from app.services.search_service import SearchService
+
+class StubOpenSearch:
+    """Answers after a fixed latency per round trip with random ids from a shared corpus."""
+    def __init__(self, latency: float, corpus: int):
+        self.latency = latency
+        self.corpus = corpus
+        self.round_trips = 0
+
+    def search(self, index, body, params=None):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        return self._response(body)
+
+    def msearch(self, body, params=None):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        return {"responses": [self._response(item) for item in body[1::2]]}
+
+    def _response(self, body):
+        ids = random.sample(range(self.corpus), body["size"])
+        return {"hits": {"hits": [
+            {"_id": str(doc_id), "_score": float(body["size"] - i), "_source": {"text": f"doc {doc_id}"}}
+            for i, doc_id in enumerate(ids)
+        ]}}
+
+class StubRecord:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return self._data
+
+class StubResult(list):
+    def consume(self):
+        pass
+
+class StubNeo4j:
+    """One read transaction per lookup, after a fixed latency: one seed, then a chain of entities."""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def session(self, **kwargs):
+        return self
+
+    def execute_read(self, work, *args):
+        time.sleep(self.latency)
+        return work(self, *args)
+
+    def run(self, cypher, **params):
+        if cypher.startswith("CREATE"):
+            return StubResult()
+        if "queryNodes" in cypher:
+            return [StubRecord({"id": "0", "name": "entity0", "score": 1.0})]
+        return [
+            StubRecord({"from_id": node, "to_id": str(int(node) + 1 + i), "name": f"entity{node}",
+                        "relation": "RELATED_TO", "neighbour": f"entity{int(node) + 1 + i}", "outgoing": True})
+            for node in params["frontier"] for i in range(min(params["fanout"], 5))
+        ][:params["limit"]]
+
+    def close(self):
+        pass
+
+def percentiles(timings):
+    timings = np.array(timings)
+    return f"p50 {np.percentile(timings, 50):8.3f}ms  p99 {np.percentile(timings, 99):8.3f}ms"
+
+def bench_fusion(top_k: int, depth: int, corpus: int, runs: int, method: str):
+    timings = []
+    for _ in range(runs):
+        ranked = {
+            source: [{"id": str(doc_id), "score": float(depth - i)} for i, doc_id in enumerate(random.sample(range(corpus), depth))]
+            for source in ("bm25", "vector", "graph")
+        }
+        start = time.perf_counter()
+        fuse(ranked, top_k=top_k, method=method)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"fusion {method:<8} 3 x {depth:>4} hits      {percentiles(timings)}")
+
+def bench_search(args):
+    os_client = StubOpenSearch(args.latency, args.corpus)
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j(args.latency))
+    # Every run repeats the same question; measure lookups, not the entity-set cache
+    service.graph.cache_size = 0
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        service._bm25_search("query", args.top_k)
+        service._knn_search([0.1], args.top_k)
+        service._graph_search("query", args.top_k)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"backends sequential (no fusion)          {percentiles(timings)}")
+
+    queries = ["query"] + [f"expansion {i}" for i in range(args.expansions)]
+    for mode in ("separate", "msearch"):
+        service.mode = mode
+        for batch in ([queries[0]], queries):
+            os_client.round_trips = 0
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                service.multi_search(batch, [[0.1]], top_k=args.top_k)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{mode:<8} {len(batch)} {'query' if len(batch) == 1 else 'queries':<7}  "
+                  f"{os_client.round_trips / args.runs:4.1f} OpenSearch round trips  {percentiles(timings)}")
+    service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hybrid search fan-out and rank fusion latency against stub backends.")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--corpus", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated per-round-trip latency in seconds")
+    parser.add_argument("--expansions", type=int, default=3, help="Extra query rewrites searched alongside the original")
+    args = parser.parse_args()
+
+    for depth in (args.top_k, 100, 1000):
+        for method in ("rrf", "weighted"):
+            bench_fusion(args.top_k, depth, args.corpus, args.runs, method)
+    bench_search(args)
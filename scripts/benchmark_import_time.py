@@ -0,0 +1,42 @@
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def measure(module: str):
+    """Run `python -X importtime -c "import <module>"` and parse its report (microseconds)."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, cwd=ROOT
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    total = next(cumulative for cumulative, _, name in rows if name == module)
+    return total, rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time regression guard (python -X importtime).")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3, help="Best of N runs, to smooth out disk cache noise")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="Exit non-zero if the import takes longer")
+    args = parser.parse_args()
+
+    best_total, best_rows = min((measure(args.module) for _ in range(args.runs)), key=lambda r: r[0])
+    print(f"import {args.module}: {best_total / 1000:.0f}ms (best of {args.runs})")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, self_us, name in sorted(best_rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+
+    if args.max_ms is not None and best_total / 1000 > args.max_ms:
+        sys.exit(f"import {args.module} took {best_total / 1000:.0f}ms, over the {args.max_ms:.0f}ms budget")
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.logging import CloudWatchLogger
+
+class StubCloudWatchSink:
+    """put_log_events stand-in with a fixed network round trip."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def send(self, events):
+        self.calls += 1
+        time.sleep(self.latency)
+
+def main(args):
+    # Old behaviour: one synchronous put_log_events per log call
+    sink = StubCloudWatchSink(args.latency)
+    start = time.perf_counter()
+    for i in range(args.sync_calls):
+        sink.send([(int(time.time() * 1000), f"[INFO] message {i}")])
+    sync_us = (time.perf_counter() - start) / args.sync_calls * 1e6
+    print(f"sync put per call      {sync_us:10.2f} us/call  ({args.sync_calls} calls)")
+
+    sink = StubCloudWatchSink(args.latency)
+    logger = CloudWatchLogger(sink=sink)
+    start = time.perf_counter()
+    for i in range(args.calls):
+        logger.log(f"message {i}")
+    queued_us = (time.perf_counter() - start) / args.calls * 1e6
+    logger.flush()
+    stats = logger.stats()
+    print(f"queued log()           {queued_us:10.2f} us/call  ({args.calls} calls, "
+          f"{sink.calls} put calls, {stats['sent']} sent, {stats['dropped']} dropped)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of CloudWatchLogger.log on the caller's thread.")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--sync-calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub put_log_events round trip in seconds")
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.models import Memory, MemoryTier
+from app.services.memory_service import HotMemoryCache, MemoryService, MemoryWriter
+
+TIERS = [MemoryTier.TEMP, MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM]
+
+def percentiles(timings):
+    timings = np.array(timings)
+    return f"p50 {np.percentile(timings, 50):8.3f}ms  p99 {np.percentile(timings, 99):8.3f}ms"
+
+def content(i):
+    return {"query": f"question {i}", "response": "answer " * 20, "agent_id": "agent-default"}
+
+def bench_lookups(label, service, sessions, runs, tier=MemoryTier.TEMP):
+    timings, found = [], 0
+    for session_id in sessions[:runs]:
+        start = time.perf_counter()
+        found += len(service.get_memories(session_id, tier))
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<44}{percentiles(timings)}  {found / runs:5.1f} rows")
+
+def orm_promote(db, session_ids, source_tier, target_tier):
+    """The previous promote_memory: load each session's rows and add ORM copies."""
+    copied = 0
+    for session_id in session_ids:
+        memories = db.query(Memory).filter(
+            Memory.session_id == session_id, Memory.tier == source_tier,
+            (Memory.expires_at == None) | (Memory.expires_at > datetime.utcnow())
+        ).all()
+        for memory in memories:
+            db.add(Memory(session_id=session_id, tier=target_tier, content=memory.content, expires_at=None))
+        db.commit()
+        copied += len(memories)
+    return copied
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory insert throughput, lookup latency and purge on a large table.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Table size (use 10000000 for the 10M run)")
+    parser.add_argument("--rows-per-session", type=int, default=10)
+    parser.add_argument("--per-row-inserts", type=int, default=2000, help="Rows for the one-commit-per-row baseline")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--promote-sessions", type=int, default=5000, help="Sessions promoted SHORT_TERM -> LONG_TERM per method")
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{os.path.join(tmp.name, 'memories.db')}"
+    engine = create_engine(url)
+    Memory.__table__.drop(engine, checkfirst=True)
+    Memory.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    n_sessions = max(args.rows // args.rows_per_session, 1)
+    rng = random.Random(0)
+
+    # Baseline: the old add_memory, one transaction per row
+    db = Session()
+    direct = MemoryService(db, writer=MemoryWriter(bind=engine), hot=HotMemoryCache(max_sessions=0), write_behind=False)
+    start = time.perf_counter()
+    for i in range(args.per_row_inserts):
+        direct.add_memory(f"s{rng.randrange(n_sessions)}", rng.choice(TIERS), content(i))
+    elapsed = time.perf_counter() - start
+    print(f"{'one commit per row':<44}{args.per_row_inserts / elapsed:12,.0f} rows/s")
+    db.close()
+
+    # Write-behind: the same calls, inserted in batches by the writer
+    writer = MemoryWriter(bind=engine, batch_size=args.batch_size, flush_interval=3600, max_buffer=args.batch_size * 20)
+    db = Session()
+    service = MemoryService(db, writer=writer, hot=HotMemoryCache(max_sessions=0), write_behind=True)
+    remaining = args.rows - args.per_row_inserts
+    start = time.perf_counter()
+    for i in range(remaining):
+        service.add_memory(f"s{rng.randrange(n_sessions)}", TIERS[i % 3], content(i))
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{'write-behind, batch ' + str(args.batch_size):<44}{remaining / elapsed:12,.0f} rows/s  "
+          f"({writer.stats()['batches']:,} batches)")
+    # Expire a quarter of the TEMP/SHORT_TERM rows so lookups and the purge have something to skip
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE memories SET expires_at = :past WHERE id % 4 = 0 AND expires_at IS NOT NULL"),
+                     {"past": datetime.utcnow() - timedelta(hours=1)})
+        conn.execute(text("ANALYZE") if engine.dialect.name == "sqlite" else text("ANALYZE memories"))
+    print(f"table: {args.rows:,} rows, {n_sessions:,} sessions")
+
+    sessions = [f"s{rng.randrange(n_sessions)}" for _ in range(args.lookups)]
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_memories_session_tier_expires"))
+        conn.execute(text("CREATE INDEX ix_memories_session_id ON memories (session_id)"))
+    cold = MemoryService(db, writer=writer, hot=HotMemoryCache(max_sessions=0), write_behind=True)
+    bench_lookups("TEMP lookup, session_id index only", cold, sessions, args.lookups)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_memories_session_id"))
+        conn.execute(text("CREATE INDEX ix_memories_session_tier_expires ON memories (session_id, tier, expires_at)"))
+    bench_lookups("TEMP lookup, (session, tier, expiry) index", cold, sessions, args.lookups)
+
+    hot = MemoryService(db, writer=writer, hot=HotMemoryCache(max_sessions=args.lookups), write_behind=True)
+    for session_id in sessions:
+        hot.get_memories(session_id, MemoryTier.TEMP)
+    bench_lookups("TEMP lookup, hot cache", hot, sessions, args.lookups)
+
+    picked = rng.sample(range(n_sessions), min(2 * args.promote_sessions, n_sessions))
+    legacy_sessions = [f"s{i}" for i in picked[:len(picked) // 2]]
+    bulk_sessions = [f"s{i}" for i in picked[len(picked) // 2:]]
+    start = time.perf_counter()
+    copied = orm_promote(db, legacy_sessions, MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM)
+    elapsed = time.perf_counter() - start
+    print(f"{'promotion, ORM copies per session':<44}{copied / elapsed:12,.0f} rows/s  ({copied:,} rows, {elapsed:.2f}s)")
+    start = time.perf_counter()
+    copied = service.promote_sessions(bulk_sessions, MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM)
+    elapsed = time.perf_counter() - start
+    print(f"{'promotion, INSERT ... SELECT bulk':<44}{copied / elapsed:12,.0f} rows/s  ({copied:,} rows, {elapsed:.2f}s)")
+    start = time.perf_counter()
+    again = service.promote_sessions(bulk_sessions, MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM)
+    print(f"{'promotion, repeated (idempotent)':<44}{(time.perf_counter() - start) * 1000:9.1f} ms    ({again} rows)")
+
+    start = time.perf_counter()
+    deleted = service.purge_expired(batch_size=5000)
+    elapsed = time.perf_counter() - start
+    print(f"{'chunked purge, 5000 rows/transaction':<44}{deleted / elapsed:12,.0f} rows/s  ({deleted:,} rows deleted)")
+    db.close()
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from sqlalchemy import create_engine, text
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.metrics import GRAPH_NODE_SECONDS, MetricsMiddleware, instrument_engine, timed
+
+def per_call(label, calls, func):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    elapsed = (time.perf_counter() - start) / calls * 1e6
+    print(f"  {label:<40}{elapsed:8.2f}us")
+    return elapsed
+
+async def bench_async(calls):
+    async def node(state):
+        return state
+
+    timed_node = timed(GRAPH_NODE_SECONDS, "benchmark")(node)
+    for label, func in (("async node", node), ("async node, timed", timed_node)):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await func(None)
+        print(f"  {label:<40}{(time.perf_counter() - start) / calls * 1e6:8.2f}us")
+
+async def bench_middleware(calls):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+    for label, asgi in (("ASGI app", app), ("ASGI app + MetricsMiddleware", MetricsMiddleware(app))):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await asgi(dict(scope), receive, send)
+        print(f"  {label:<40}{(time.perf_counter() - start) / calls * 1e6:8.2f}us")
+
+def main(args):
+    print(f"Per-call cost over {args.calls:,} calls")
+    asyncio.run(bench_async(args.calls))
+    asyncio.run(bench_middleware(args.calls))
+    for label, engine in (("SQLite SELECT 1", create_engine("sqlite://")),
+                          ("SQLite SELECT 1, instrumented", instrument_engine(create_engine("sqlite://")))):
+        with engine.connect() as conn:
+            statement = text("SELECT 1")
+            per_call(label, args.calls // 10, lambda: conn.execute(statement).scalar())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overhead of the Prometheus instrumentation.")
+    parser.add_argument("--calls", type=int, default=200_000)
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.reranker import CrossEncoderReranker, LexicalReranker, Reranker
+from app.utils.chunking import regex_token_count
+
+EVAL_SET = os.path.join(os.path.dirname(__file__), "data", "rerank_eval.jsonl")
+
+def ndcg(relevances, k):
+    def dcg(values):
+        return sum((2 ** rel - 1) / math.log2(i + 2) for i, rel in enumerate(values[:k]))
+    ideal = dcg(sorted(relevances, reverse=True))
+    return dcg(relevances) / ideal if ideal else 0.0
+
+def percentiles(timings):
+    timings = np.array(timings)
+    return f"p50 {np.percentile(timings, 50):8.3f}ms  p99 {np.percentile(timings, 99):8.3f}ms"
+
+def evaluate(label, order, examples, k_values):
+    scores = {k: [] for k in k_values}
+    for example in examples:
+        relevance = {c["id"]: c["relevance"] for c in example["candidates"]}
+        ranked = [relevance[hit["id"]] for hit in order(example)]
+        for k in k_values:
+            scores[k].append(ndcg(ranked, k))
+    print(f"{label:<28}" + "".join(f"  NDCG@{k} {np.mean(scores[k]):.3f}" for k in k_values))
+
+def main():
+    parser = argparse.ArgumentParser(description="NDCG and latency of the reranking stage on the bundled eval set.")
+    parser.add_argument("--eval-set", default=EVAL_SET)
+    parser.add_argument("--candidates", type=int, default=30, help="Passages per query in the latency test")
+    parser.add_argument("--passage-tokens", type=int, default=400, help="Approximate passage length in the latency test")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--cross-encoder", default=None, help="sentence-transformers model to compare (optional)")
+    args = parser.parse_args()
+
+    with open(args.eval_set) as f:
+        examples = [json.loads(line) for line in f]
+    print(f"{len(examples)} queries, {sum(len(e['candidates']) for e in examples)} judged passages")
+
+    models = {"lexical": Reranker(LexicalReranker(), cache_size=0)}
+    if args.cross_encoder:
+        try:
+            models["cross-encoder"] = Reranker(CrossEncoderReranker(args.cross_encoder), cache_size=0)
+        except ImportError:
+            print("sentence-transformers is not installed; skipping the cross-encoder")
+
+    k_values = (3, 5)
+    evaluate("first-stage order", lambda e: e["candidates"], examples, k_values)
+    shuffled = random.Random(0)
+    evaluate("random order", lambda e: shuffled.sample(e["candidates"], len(e["candidates"])), examples, k_values)
+    no_prior = Reranker(LexicalReranker(), cache_size=0, prior_weight=0.0)
+    evaluate("lexical, features only", lambda e: no_prior.rerank(e["query"], e["candidates"]), examples, k_values)
+    for name, reranker in models.items():
+        evaluate(f"{name} rerank", lambda e: reranker.rerank(e["query"], e["candidates"]), examples, k_values)
+
+    # Latency on realistic candidate sets: long passages built from the eval texts
+    rng = random.Random(1)
+    texts = [c["text"] for e in examples for c in e["candidates"]]
+    def passage():
+        words = []
+        while len(words) < args.passage_tokens * 0.75:
+            words.extend(rng.choice(texts).split())
+        return " ".join(words)
+    batches = [
+        (e["query"], [{"id": f"{i}-{j}", "text": passage()} for j in range(args.candidates)])
+        for i, e in enumerate(examples * (args.runs // len(examples) + 1))
+    ][:args.runs]
+    print(f"\nlatency: {args.candidates} candidates x ~{args.passage_tokens} tokens per query")
+    for name, reranker in models.items():
+        for max_tokens in (64, 256, 1024):
+            reranker.max_tokens = max_tokens
+            timings = []
+            for query, hits in batches:
+                start = time.perf_counter()
+                reranker.rerank(query, hits)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{name:<14} budget {max_tokens:>4} tokens   {percentiles(timings)}")
+
+    # Only pairwise scores are cached; lexical ones depend on the candidate set
+    if "cross-encoder" in models:
+        cached = Reranker(models["cross-encoder"].model, max_tokens=256)
+        for query, hits in batches:
+            cached.rerank(query, hits)
+        timings = []
+        for query, hits in batches:
+            start = time.perf_counter()
+            cached.rerank(query, hits)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{'cross cached':<14} (query, doc id) hits   {percentiles(timings)}")
+
+    # What the replaced LLM prompt cost before it even reached the model
+    query, hits = batches[0]
+    prompt = f"Rerank these documents based on relevance to '{query}':\n{json.dumps(hits)}"
+    print(f"\nprevious LLM-prompt reranker: ~{regex_token_count(prompt, 0, len(prompt)):,} input tokens per query "
+          f"(one Bedrock call, free-text output, no scores)")
+
+if __name__ == "__main__":
+    main()
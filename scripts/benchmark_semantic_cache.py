@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.semantic_cache import SemanticNamespace
+
+def build_namespace(size: int, dim: int, rng: np.random.Generator) -> SemanticNamespace:
+    namespace = SemanticNamespace(dim, max_entries=size, initial_capacity=size)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i, vector in enumerate(vectors):
+        namespace.add(str(i), vector)
+    return namespace
+
+def bench(size: int, dim: int, queries: int, rng: np.random.Generator):
+    namespace = build_namespace(size, dim, rng)
+    probes = rng.standard_normal((queries, dim), dtype=np.float32)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+
+    timings = []
+    for probe in probes:
+        start = time.perf_counter()
+        namespace.search(probe)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    print(f"{size:>9,} entries  dim {dim}  p50 {np.percentile(timings, 50):8.3f}ms  "
+          f"p99 {np.percentile(timings, 99):8.3f}ms  matrix {namespace.vectors.nbytes / 2**20:8.1f}MiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic cache top-1 lookup latency.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256, help="Embedding size (Titan v2 is 1024)")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    for size in args.sizes:
+        bench(size, args.dim, args.queries, rng)
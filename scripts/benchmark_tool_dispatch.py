@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.mcp_server import MCPServer
+
+SLEEP_TOOL = SimpleNamespace(
+    name="wait_io",
+    description="Simulated network-bound tool",
+    schema={"type": "object", "properties": {"seconds": {"type": "number"}}},
+    code="def wait_io(seconds):\n    import time\n    time.sleep(seconds)\n    return seconds"
+)
+
+CPU_TOOL = SimpleNamespace(
+    name="burn_cpu",
+    description="Simulated CPU-bound tool",
+    schema={"type": "object", "properties": {"n": {"type": "integer"}}, "x-mcp": {"cpu_bound": True, "timeout": 120}},
+    code="def burn_cpu(n):\n    total = 0\n    for i in range(n):\n        total += i * i\n    return total"
+)
+
+async def sequential(mcp: MCPServer, calls):
+    # Baseline: the old loop, one call at a time with sync tools run inline
+    outputs = []
+    for call in calls:
+        outputs.append(mcp.active_tools[call["name"]](**call["args"]))
+    return outputs
+
+async def timed(label: str, coro):
+    start = time.perf_counter()
+    await coro
+    print(f"  {label:<12} {time.perf_counter() - start:.3f}s")
+
+async def main(args):
+    mcp = MCPServer(None)
+    mcp._register_tools([SLEEP_TOOL, CPU_TOOL])
+    mcp.max_concurrency = args.calls
+
+    sleep_calls = [{"name": "wait_io", "args": {"seconds": args.sleep}, "id": str(i)} for i in range(args.calls)]
+    cpu_calls = [{"name": "burn_cpu", "args": {"n": args.cpu_n}, "id": str(i)} for i in range(args.calls)]
+
+    # Warm the process pool so its start-up cost isn't counted
+    await mcp.call_tools(cpu_calls[:1])
+
+    print(f"{args.calls} sleep-bound calls ({args.sleep * 1000:.0f}ms each)")
+    await timed("sequential", sequential(mcp, sleep_calls))
+    await timed("concurrent", mcp.call_tools(sleep_calls))
+
+    print(f"{args.calls} CPU-bound calls (n={args.cpu_n})")
+    await timed("sequential", sequential(mcp, cpu_calls))
+    await timed("concurrent", mcp.call_tools(cpu_calls))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent MCP tool dispatch.")
+    parser.add_argument("--calls", type=int, default=8)
+    parser.add_argument("--sleep", type=float, default=0.2)
+    parser.add_argument("--cpu-n", type=int, default=3_000_000)
+    asyncio.run(main(parser.parse_args()))
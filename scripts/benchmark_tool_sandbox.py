@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.mcp_server import MCPServer
+from app.services.tool_sandbox import ToolWorkerPool, bytecode_cache
+
+ECHO_TOOL = SimpleNamespace(
+    id="bench-echo",
+    name="echo",
+    description="Returns its argument",
+    schema={"type": "object", "properties": {"value": {"type": "string"}}},
+    code="def echo(value):\n    return value"
+)
+
+def percentiles(timings):
+    timings = np.array(timings) * 1e6
+    return f"p50 {np.percentile(timings, 50):9.1f}us  p99 {np.percentile(timings, 99):9.1f}us"
+
+async def bench_call_tool(label, mcp, calls, value):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await mcp.call_tool("echo", value=value)
+        timings.append(time.perf_counter() - start)
+    print(f"  {label:<34}{percentiles(timings)}")
+
+async def main(args):
+    in_process = MCPServer(None, sandbox=False)
+    in_process._register_tools([ECHO_TOOL])
+    sandboxed = MCPServer(None, sandbox=True)
+    start = time.perf_counter()
+    sandboxed._register_tools([ECHO_TOOL])
+    print(f"compile + register: {(time.perf_counter() - start) * 1e6:.0f}us; "
+          f"again (bytecode cache): ", end="")
+    start = time.perf_counter()
+    MCPServer(None, sandbox=True)._register_tools([ECHO_TOOL])
+    print(f"{(time.perf_counter() - start) * 1e6:.0f}us")
+
+    pool = ToolWorkerPool(workers=args.workers, max_calls=args.max_calls)
+    import app.services.mcp_server as mcp_server
+    mcp_server.tool_workers = pool
+    start = time.perf_counter()
+    pool.call(bytecode_cache.get(ECHO_TOOL.id, ECHO_TOOL.name, ECHO_TOOL.code), {"value": ""})
+    print(f"pool of {args.workers}: ready after {time.perf_counter() - start:.3f}s")
+
+    for size in args.sizes:
+        value = "x" * size
+        print(f"{args.calls} sequential call_tool calls, {size:,}-byte argument and result")
+        await bench_call_tool("in-process (thread pool)", in_process, args.calls, value)
+        await bench_call_tool("sandboxed worker", sandboxed, args.calls, value)
+
+    compiled = bytecode_cache.get(ECHO_TOOL.id, ECHO_TOOL.name, ECHO_TOOL.code)
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        pool.call(compiled, {"value": "x"})
+        timings.append(time.perf_counter() - start)
+    print(f"  {'sandboxed, sync pool.call':<34}{percentiles(timings)}")
+    stats = pool.stats()
+    print(f"recycled {stats['recycled']} workers (every {args.max_calls} calls), spawned {stats['spawned']}")
+    pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tool call overhead: in-process call_tool against the sandboxed worker pool.")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-calls", type=int, default=1000, help="Recycle a worker after this many calls")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 100_000, 4_000_000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.models import Memory, MemoryTier
+from app.services.training_export import TrainingExporter
+
+def legacy_export(db, output_dir):
+    """The previous prepare_fine_tuning_data: .all() into memory, one uncompressed file, no dedup."""
+    memories = db.query(Memory).filter(Memory.tier == MemoryTier.LONG_TERM).all()
+    path = os.path.join(output_dir, "fine_tuning_data.jsonl")
+    written = 0
+    with open(path, "w") as f:
+        for memory in memories:
+            prompt, completion = memory.content.get("query"), memory.content.get("response")
+            if prompt and completion:
+                f.write(json.dumps({"prompt": prompt, "completion": completion}) + "\n")
+                written += 1
+    return {"rows_read": len(memories), "rows_written": written, "bytes_written": os.path.getsize(path)}
+
+def run_mode(mode, url, output_dir, workers, batch_rows):
+    """Child process: run one exporter so peak RSS belongs to that mode alone."""
+    db = sessionmaker(bind=create_engine(url))()
+    start = time.perf_counter()
+    if mode == "legacy":
+        summary = legacy_export(db, output_dir)
+    else:
+        summary = TrainingExporter(db, output_dir=output_dir, workers=workers, batch_rows=batch_rows,
+                                   compression=mode, lag=0).run(full=True)
+        summary.pop("shards")
+    summary["elapsed_s"] = time.perf_counter() - start
+    # Exporter plus its largest formatting worker (ru_maxrss is in KB on Linux)
+    summary["peak_rss_mb"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                              + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(json.dumps(summary))
+
+def prompt(i):
+    return f"question {i} about the deployment of service {i % 997}"
+
+def populate(url, rows, duplicate_every):
+    engine = create_engine(url)
+    Memory.__table__.create(engine)
+    with engine.begin() as conn:
+        for start in range(0, rows, 10000):
+            conn.execute(insert(Memory), [{
+                "session_id": f"s{i // 10}",
+                "tier": MemoryTier.LONG_TERM,
+                "content": {
+                    # Every `duplicate_every`th prompt repeats an earlier one with different casing
+                    "query": prompt(i - 1).upper() if duplicate_every and i % duplicate_every == 0 else prompt(i),
+                    "response": "A detailed answer. " * 15,
+                    "agent_id": "agent-default"
+                }
+            } for i in range(start, min(start + 10000, rows))])
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy .all() export against the streaming, sharded exporter.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--duplicate-every", type=int, default=10, help="Make every Nth prompt a near-duplicate (0 = none)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-rows", type=int, default=5000)
+    parser.add_argument("--modes", default="legacy,gzip,zstd")
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL of a populated memories table (default: a temporary SQLite file)")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.child, args.url, args.output_dir, args.workers, args.batch_rows)
+        return
+
+    tmp = tempfile.TemporaryDirectory()
+    url = args.url
+    if url is None:
+        url = f"sqlite:///{os.path.join(tmp.name, 'memories.db')}"
+        start = time.perf_counter()
+        populate(url, args.rows, args.duplicate_every)
+        print(f"populated {args.rows:,} LONG_TERM rows in {time.perf_counter() - start:.1f}s")
+
+    for mode in args.modes.split(","):
+        output_dir = os.path.join(tmp.name, mode)
+        command = [sys.executable, __file__, "--child", mode, "--url", url, "--output-dir", output_dir,
+                   "--batch-rows", str(args.batch_rows)]
+        if args.workers is not None:
+            command += ["--workers", str(args.workers)]
+        os.makedirs(output_dir, exist_ok=True)
+        result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+        print(f"{mode:<8}{result['rows_read'] / result['elapsed_s']:12,.0f} rows/s  "
+              f"{result['rows_written']:>10,} written  {result['bytes_written'] / 1e6:9.1f} MB  "
+              f"peak RSS {result['peak_rss_mb']:8.1f} MB")
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
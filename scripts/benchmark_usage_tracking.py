@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.models import ExecutionLog
+from app.utils.cost_management import CostManager
+from app.utils.usage import ExecutionLogWriter, execution_row
+
+USAGE = {"input_tokens": 1200, "output_tokens": 300, "cost_usd": 0.0081, "latency_ms": 850.0, "llm_calls": 3,
+         "nodes": {"plan_and_tool": {"runs": 2}, "synthesize": {"runs": 1}}, "calls": [], "plan": [["lookup"]]}
+
+def row(agent_id, created_at=None):
+    record = execution_row(agent_id, "session", "what is the refund policy?", "Refunds take 5 days.", USAGE, "trace")
+    if created_at is not None:
+        record["created_at"] = created_at
+    return record
+
+def bench_writes(engine, runs):
+    print(f"Logging {runs:,} runs")
+    session_factory = sessionmaker(bind=engine)
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        with session_factory() as db:
+            db.add(ExecutionLog(**row(f"a{i % 100}")))
+            db.commit()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    print(f"  {'commit per run':<32}request p50 {np.percentile(timings, 50):8.1f}us  total {timings.sum() / 1e6:6.2f}s")
+
+    writer = ExecutionLogWriter(bind=engine, batch_size=500)
+    timings = []
+    started = time.perf_counter()
+    for i in range(runs):
+        start = time.perf_counter()
+        writer.add(row(f"a{i % 100}"))
+        timings.append(time.perf_counter() - start)
+    # Inserts run on the writer's thread meanwhile; the total includes draining what is left
+    writer.flush()
+    total = time.perf_counter() - started
+    timings = np.array(timings) * 1e6
+    print(f"  {'ExecutionLogWriter':<32}request p50 {np.percentile(timings, 50):8.1f}us  "
+          f"total {total:6.2f}s ({writer.stats()['batches']} batches)")
+
+def bench_aggregate(engine, rows, agents, queries):
+    print(f"get_usage_metrics over {rows:,} rows, {agents} agents, 90 days")
+    now = datetime.utcnow()
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        for start in range(0, rows, 10000):
+            conn.execute(insert(ExecutionLog), [
+                row(f"agent{rng.randrange(agents)}", now - timedelta(seconds=rng.randrange(90 * 86400)))
+                for _ in range(min(10000, rows - start))
+            ])
+        conn.execute(text("ANALYZE"))
+
+    def timed(label):
+        timings = []
+        with sessionmaker(bind=engine)() as db:
+            manager = CostManager(db)
+            for i in range(queries):
+                start = time.perf_counter()
+                manager.get_usage_metrics(f"agent{i % agents}", end=now)
+                timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1e3
+        print(f"  {label:<32}p50 {np.percentile(timings, 50):8.2f}ms  p99 {np.percentile(timings, 99):8.2f}ms")
+
+    timed("(agent_id, created_at) index")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_execution_logs_agent_created"))
+    timed("no index (full scan)")
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        # SQLite file; PostgreSQL adds a network round trip per commit, which batching saves too
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'logs.db')}")
+        ExecutionLog.__table__.create(engine)
+        bench_writes(engine, args.runs)
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM execution_logs"))
+        bench_aggregate(engine, args.rows, args.agents, args.queries)
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execution log writes (commit per run against batched) and usage aggregates.")
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    main(parser.parse_args())
@@ -1,3 +1,4 @@
+import argparse
 import json
 import os
 import sys
@@ -6,38 +7,40 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.db.session import SessionLocal
-from app.models.models import Memory, MemoryTier
+from app.services.training_export import COMPRESSIONS, TrainingExporter
 
-def generate_fine_tuning_jsonl(output_path: str = "fine_tuning_data.jsonl"):
+def generate_fine_tuning_jsonl(output_dir: str = None, full: bool = False, **options):
     """
-    Simulate data accumulation by fetching long-term memories 
-    and formatting them for AWS Bedrock fine-tuning.
+    Export long-term memories added since the last run as deduplicated,
+    size-capped, compressed JSONL shards for AWS Bedrock fine-tuning.
     """
     db = SessionLocal()
     try:
-        # Fetch long-term memories
-        memories = db.query(Memory).filter(Memory.tier == MemoryTier.LONG_TERM).all()
-        
-        if not memories:
-            print("No long-term memories found. Generating dummy data for demonstration.")
-            # Dummy data for demonstration
-            memories = [
-                type('obj', (object,), {"content": {"query": "How do I setup ECS?", "response": "Use AWS CodePipeline for automated deployment to ECS clusters."}})(),
-                type('obj', (object,), {"content": {"query": "What is the benefit of hybrid search?", "response": "Hybrid search combines BM25 keyword matching with vector embeddings for better recall."}})()
-            ]
-
-        with open(output_path, "w") as f:
-            for mem in memories:
-                data = {
-                    "prompt": mem.content.get("query"),
-                    "completion": mem.content.get("response")
-                }
-                f.write(json.dumps(data) + "\n")
-        
-        print(f"Successfully generated fine-tuning data at: {output_path}")
-        return output_path
+        summary = TrainingExporter(db, output_dir=output_dir, **options).run(full=full)
+        if not summary["rows_read"]:
+            print("No new long-term memories since the last export.", file=sys.stderr)
+        return summary
     finally:
         db.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Stream long-term memories into fine-tuning JSONL shards.")
+    parser.add_argument("--output-dir", default=None, help="Shard directory (default TRAINING_EXPORT_DIR)")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and dedup state; export everything")
+    parser.add_argument("--compression", choices=sorted(COMPRESSIONS), default=None)
+    parser.add_argument("--shard-mb", type=int, default=None, help="Approximate compressed size cap per shard")
+    parser.add_argument("--workers", type=int, default=None, help="Formatting processes (0 = inline)")
+    parser.add_argument("--batch-rows", type=int, default=None, help="Rows per cursor batch")
+    args = parser.parse_args()
+
+    summary = generate_fine_tuning_jsonl(
+        args.output_dir, args.full,
+        compression=args.compression,
+        shard_bytes=args.shard_mb * 1024 * 1024 if args.shard_mb else None,
+        workers=args.workers,
+        batch_rows=args.batch_rows
+    )
+    print(json.dumps(summary, indent=2))
+
 if __name__ == "__main__":
-    generate_fine_tuning_jsonl()
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import sys
+
+# Add app directory to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.ingestion import IngestionPipeline
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk, embed and bulk-index documents into the search index.")
+    parser.add_argument("paths", nargs="+", help="Files or directories (.jsonl/.ndjson records or .txt/.md/.rst text)")
+    parser.add_argument("--index", default=None, help="Target index (default SEARCH_INDEX)")
+    parser.add_argument("--checkpoint", default="ingest.checkpoint.json", help="Resume file; delete it to start over")
+    parser.add_argument("--text-field", default="text", help="JSONL field holding the document text")
+    parser.add_argument("--chunk-tokens", type=int, default=256, help="Maximum tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=32, help="Tokens shared by consecutive chunks")
+    parser.add_argument("--batch-docs", type=int, default=256, help="Documents per chunking/embedding batch")
+    parser.add_argument("--workers", type=int, default=None, help="Chunking processes (0 = inline)")
+    parser.add_argument("--bulk-threads", type=int, default=4)
+    parser.add_argument("--bulk-chunk-size", type=int, default=500, help="Actions per _bulk request")
+    parser.add_argument("--bulk-retries", type=int, default=3, help="Resends of chunks the cluster rejects with 429")
+    parser.add_argument("--max-failures", type=int, default=1000, help="Stop once this many chunks failed to index")
+    parser.add_argument("--no-embed", action="store_true", help="Index text only (BM25), skip embeddings")
+    args = parser.parse_args()
+
+    from app.services.search_service import search_service
+    embed = None
+    if not args.no_embed:
+        from app.services.embedding_service import embedding_service
+        # Cached by content hash, so re-ingesting unchanged chunks never re-embeds
+        embed = embedding_service.embed_many
+
+    pipeline = IngestionPipeline(
+        search_service.os_client,
+        index=args.index,
+        embed=embed,
+        chunk_tokens=args.chunk_tokens,
+        overlap_tokens=args.overlap_tokens,
+        batch_docs=args.batch_docs,
+        workers=args.workers,
+        bulk_threads=args.bulk_threads,
+        bulk_chunk_size=args.bulk_chunk_size,
+        bulk_retries=args.bulk_retries,
+        max_failures=args.max_failures,
+        checkpoint_path=args.checkpoint,
+        text_field=args.text_field,
+        vector_store=search_service.vector_store,
+        progress=lambda stats: print(
+            f"{stats['docs']:>10,} docs  {stats['chunks']:>12,} chunks  "
+            f"{stats['docs_per_sec'] or 0:>9,.1f} docs/s  {stats['chunks_per_sec'] or 0:>10,.1f} chunks/s",
+            file=sys.stderr
+        )
+    )
+    print(json.dumps(pipeline.run(args.paths), indent=2))
+
+if __name__ == "__main__":
+    main()
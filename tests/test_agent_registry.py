@@ -0,0 +1,43 @@
+from app.services.agents.registry import AgentRegistry
+
+def test_registry_hit_and_miss():
+    registry = AgentRegistry(max_size=4, ttl=60)
+    builds = []
+
+    def factory():
+        builds.append(1)
+        return object()
+
+    first = registry.get_or_create("agent-1", factory)
+    second = registry.get_or_create("agent-1", factory)
+
+    assert first is second
+    assert len(builds) == 1
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["misses"] == 1
+
+def test_registry_invalidate_rebuilds():
+    registry = AgentRegistry(max_size=4, ttl=60)
+    first = registry.get_or_create("agent-1", object)
+    registry.invalidate("agent-1")
+    second = registry.get_or_create("agent-1", object)
+    assert first is not second
+
+def test_registry_lru_eviction():
+    registry = AgentRegistry(max_size=2, ttl=60)
+    a = registry.get_or_create("a", object)
+    registry.get_or_create("b", object)
+    registry.get_or_create("a", object)  # a becomes most recently used
+    registry.get_or_create("c", object)  # evicts b
+
+    assert registry.get("a") is a
+    assert registry.get("b") is None
+    assert registry.stats()["evictions"] == 1
+
+def test_registry_ttl_expiry(monkeypatch):
+    registry = AgentRegistry(max_size=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr("app.services.agents.registry.time.monotonic", lambda: now[0])
+    registry.get_or_create("a", object)
+    now[0] += 11
+    assert registry.get("a") is None
@@ -0,0 +1,137 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models.models import Agent, AgentType, Tool, agent_tools
+from app.services import dynamodb_service as dynamodb_module
+from app.services.agent_repository import AgentRepository, DynamoAgentStore, SQLAgentStore
+from app.services.agents.registry import agent_registry
+from app.services.dynamodb_service import DynamoDBService
+from app.services.mcp_server import MCPServer
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for table in (Agent.__table__, Tool.__table__, agent_tools):
+        table.create(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([
+            Tool(id=f"t{i}", name=f"tool{i}", description="", schema={"type": "object", "properties": {}},
+                 code=f"def tool{i}():\n    return {i}")
+            for i in range(3)
+        ])
+        db.commit()
+    return factory
+
+def test_reads_are_cached_and_batched(session_factory):
+    repository = AgentRepository(SQLAgentStore(session_factory), ttl=60)
+    ids = [repository.create(f"agent{i}", AgentType.SUB, "prompt")["agent_id"] for i in range(5)]
+    repository.clear()
+
+    assert repository.get(ids[0])["name"] == "agent0"
+    assert repository.get(ids[0])["type"] == "sub"
+    found = repository.get_many(ids + ["missing"])
+    assert set(found) == set(ids)
+    # One read for the single get, one batch read for the other four and the missing id
+    assert repository.stats()["store_reads"] == 2
+    repository.get_many(ids)
+    assert repository.stats()["store_reads"] == 2
+
+def test_writes_go_through_to_store_cache_and_registry(session_factory):
+    repository = AgentRepository(SQLAgentStore(session_factory), ttl=60)
+    agent_id = repository.create("agent", AgentType.SUPER, "old prompt", {"search": {"weights": {"graph": 0.5}}})["agent_id"]
+    version = agent_registry.version(agent_id)
+
+    repository.assign_tool(agent_id, "t2")
+    repository.assign_tool(agent_id, "t0")
+    repository.update(agent_id, system_prompt="new prompt")
+    assert agent_registry.version(agent_id) == version + 3
+    assert repository.get(agent_id)["tool_ids"] == ["t0", "t2"]
+
+    # Another worker (a fresh cache) reads the same state from the store
+    other = AgentRepository(SQLAgentStore(session_factory), ttl=60).get(agent_id)
+    assert other["system_prompt"] == "new prompt" and other["tool_ids"] == ["t0", "t2"]
+    assert other["config"] == {"search": {"weights": {"graph": 0.5}}}
+
+    repository.delete(agent_id)
+    assert repository.get(agent_id) is None
+    assert repository.assign_tool(agent_id, "t1") is None
+
+def test_entries_expire_after_ttl(session_factory, monkeypatch):
+    repository = AgentRepository(SQLAgentStore(session_factory), ttl=10)
+    agent_id = repository.create("agent", AgentType.SUB, "prompt")["agent_id"]
+    now = [1000.0]
+    monkeypatch.setattr("app.services.agent_repository.time.monotonic", lambda: now[0])
+    repository._remember(repository.get(agent_id))
+    reads = repository.stats()["store_reads"]
+    now[0] += 11
+    repository.get(agent_id)
+    assert repository.stats()["store_reads"] == reads + 1
+
+def test_mcp_server_loads_agents_from_the_repository(session_factory):
+    repository = AgentRepository(SQLAgentStore(session_factory), ttl=60)
+    agent_id = repository.create("agent", AgentType.SUPER, "prompt", {"max_tool_concurrency": 2})["agent_id"]
+    repository.assign_tool(agent_id, "t1")
+    repository.assign_tool(agent_id, "t0")
+    with session_factory() as db:
+        mcp = MCPServer(db, sandbox=False, repository=repository)
+        metadata = mcp.load_tools(agent_id)
+    assert [tool["name"] for tool in metadata] == ["tool0", "tool1"]
+    assert mcp.max_concurrency == 2
+    assert MCPServer(None, repository=repository).load_tools("missing") == []
+
+class FakeDynamoService:
+    def __init__(self):
+        self.items = {}
+        self.batches = []
+
+    def save_agent(self, item):
+        self.items[item["agent_id"]] = item
+
+    def get_agent(self, agent_id):
+        return self.items.get(agent_id)
+
+    def batch_get_agents(self, agent_ids):
+        self.batches.append(list(agent_ids))
+        return [self.items[agent_id] for agent_id in agent_ids if agent_id in self.items]
+
+    def delete_agent(self, agent_id):
+        self.items.pop(agent_id, None)
+
+def test_dynamo_store_round_trips_numbers():
+    service = FakeDynamoService()
+    repository = AgentRepository(DynamoAgentStore(service), ttl=60)
+    agent_id = repository.create("agent", AgentType.SUB, "prompt", {"search": {"weights": {"graph": 0.5}, "top_k": 5}})["agent_id"]
+    assert service.items[agent_id]["config"]["search"]["weights"]["graph"] == Decimal("0.5")
+    repository.clear()
+    assert repository.get_many([agent_id, "missing"])[agent_id]["config"] == {"search": {"weights": {"graph": 0.5}, "top_k": 5}}
+    assert service.batches == [[agent_id, "missing"]]
+
+class FakeDynamoResource:
+    """batch_get_item that leaves the last key unprocessed on the first attempt of each request."""
+    def __init__(self, table_name, items):
+        self.table_name = table_name
+        self.items = items
+        self.requests = []
+
+    def batch_get_item(self, RequestItems):
+        keys = [key["agent_id"] for key in RequestItems[self.table_name]["Keys"]]
+        self.requests.append(keys)
+        served, unprocessed = (keys[:-1], keys[-1:]) if len(keys) > 1 else (keys, [])
+        response = {"Responses": {self.table_name: [self.items[k] for k in served if k in self.items]}}
+        if unprocessed:
+            response["UnprocessedKeys"] = {self.table_name: {"Keys": [{"agent_id": k} for k in unprocessed]}}
+        return response
+
+def test_batch_get_agents_chunks_and_retries_unprocessed_keys(monkeypatch):
+    monkeypatch.setattr(dynamodb_module.time, "sleep", lambda seconds: None)
+    service = DynamoDBService.__new__(DynamoDBService)
+    service.table_name = "AgentsMetadata"
+    ids = [f"a{i}" for i in range(150)]
+    service.dynamodb = FakeDynamoResource(service.table_name, {agent_id: {"agent_id": agent_id} for agent_id in ids})
+
+    items = service.batch_get_agents(ids + ids[:3])
+    assert sorted(item["agent_id"] for item in items) == sorted(ids)
+    assert [len(keys) for keys in service.dynamodb.requests] == [100, 1, 50, 1]
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.pool import StaticPool
+from app.utils.batch_writer import BatchWriter
+
+metadata = MetaData()
+items = Table("items", metadata, Column("id", Integer, primary_key=True))
+
+def make_writer(monkeypatch, **kwargs):
+    monkeypatch.setenv("BATCH_WRITER_RETRY_BACKOFF", "0")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    metadata.create_all(engine)
+    return BatchWriter(insert(items), bind=engine, flush_interval=60, **kwargs), engine
+
+def test_rows_are_inserted_in_batches(monkeypatch):
+    writer, engine = make_writer(monkeypatch, batch_size=4)
+    for i in range(10):
+        writer.add({"id": i})
+    assert [row["id"] for row in writer.queued()] == list(range(10))
+    writer.flush()
+    with engine.connect() as conn:
+        assert [row.id for row in conn.execute(select(items.c.id).order_by(items.c.id))] == list(range(10))
+    assert writer.stats() == {"queued": 0, "written": 10, "failed": 0, "batches": 3}
+    assert writer.queued() == []
+
+def test_failing_batch_is_retried_then_dropped(monkeypatch):
+    writer, engine = make_writer(monkeypatch, batch_size=2)
+    writer.add({"id": 1})
+    writer.add({"id": 1})
+    writer.add({"id": 2})
+    writer.flush()
+    # The duplicate key fails its batch every attempt; the next batch still goes in
+    assert writer.stats() == {"queued": 0, "written": 1, "failed": 2, "batches": 1}
+    assert writer.queued() == []
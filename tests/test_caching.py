@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from app.utils import cache_codec
+from app.utils.cache_codec import build_cache_payload, encode_payload, decode_payload
+from app.utils.caching import SingleFlight
+
+def test_payload_round_trip():
+    payload = build_cache_payload("answer", {"bm25": [1, 2]}, {"input_tokens": 10})
+    assert decode_payload(encode_payload(payload)) == payload
+
+def test_large_payload_is_compressed():
+    if cache_codec.zstandard is None:
+        pytest.skip("zstandard not installed")
+    payload = build_cache_payload("x" * 100_000)
+    raw = encode_payload(payload)
+    assert len(raw) < 10_000
+    assert decode_payload(raw) == payload
+
+def test_outdated_or_garbage_entries_are_misses():
+    stale = dict(build_cache_payload("old"), v=cache_codec.CACHE_PAYLOAD_VERSION + 1)
+    assert decode_payload(encode_payload(stale)) is None
+    assert decode_payload(b'{"legacy": "json"}') is None
+    assert decode_payload(None) is None
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", slow) for _ in range(10)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["result"] * 10
+    assert len(calls) == 1
+    assert flight.coalesced == 9
+
+def test_single_flight_propagates_errors():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("bedrock down")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", boom) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+def test_single_flight_survives_a_cancelled_leader():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def main():
+        flight = SingleFlight()
+        leader = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        result = await waiter
+        assert leader.cancelled() and not flight._inflight
+        # Finished calls aren't shared: the next caller starts afresh
+        assert await flight.do("key", slow) == "result"
+        return result
+
+    assert asyncio.run(main()) == "result"
+    assert len(calls) == 2
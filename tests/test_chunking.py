@@ -0,0 +1,78 @@
+import random
+import re
+import pytest
+from app.utils.chunking import chunking_utility, regex_token_count
+
+WORDS = ["alpha", "beta", "gamma", "internationalization", "x", "of", "the", "retrieval", "don't", "e.g.", "42", "naïve"]
+
+def random_text(rng: random.Random, sentences: int) -> str:
+    parts = []
+    for _ in range(sentences):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 25)))
+        parts.append(sentence.capitalize() + rng.choice([".", "!", "?", ",", ""]))
+        parts.append(rng.choice([" ", " ", "  ", "\n", "\n\n", "\t"]))
+    return "".join(parts)
+
+def cases(count: int = 150):
+    rng = random.Random(1234)
+    for _ in range(count):
+        max_tokens = rng.randint(1, 80)
+        yield random_text(rng, rng.randint(0, 60)), max_tokens, rng.randint(0, max_tokens - 1)
+
+@pytest.mark.parametrize("text,max_tokens,overlap", list(cases()))
+def test_span_properties(text, max_tokens, overlap):
+    spans = chunking_utility.split_spans(text, max_tokens, overlap)
+    covered = [False] * len(text)
+    previous = None
+    for start, end in spans:
+        # In bounds, non-empty, trimmed
+        assert 0 <= start < end <= len(text)
+        assert not text[start].isspace() and not text[end - 1].isspace()
+        # Within the token budget, unless a single token is already over it
+        assert regex_token_count(text, start, end) <= max_tokens or end - start == 1
+        if previous:
+            # Strictly forward, and no gap between consecutive chunks
+            assert start > previous[0]
+            assert start <= previous[1] or text[previous[1]:start].isspace()
+        for i in range(start, end):
+            covered[i] = True
+        previous = (start, end)
+    # Every non-whitespace character lands in some chunk
+    assert all(covered[i] for i, char in enumerate(text) if not char.isspace())
+
+def test_generator_matches_list_and_bytes_offsets():
+    text = random_text(random.Random(7), 200).encode("ascii", errors="ignore").decode()
+    spans = list(chunking_utility.iter_spans(text, 40, 8))
+    assert spans == chunking_utility.split_spans(text, 40, 8)
+    assert chunking_utility.split_spans(text.encode(), 40, 8) == spans
+    view = memoryview(text.encode())
+    assert bytes(view[spans[0][0]:spans[0][1]]).decode() == text[spans[0][0]:spans[0][1]]
+
+def test_prefers_paragraph_then_sentence_boundaries():
+    paragraph = "One short sentence here. Another sentence follows it. "
+    text = paragraph * 3 + "\n\n" + paragraph * 3
+    first = chunking_utility.split_spans(text, 80, 0)[0]
+    assert text[first[1]:].lstrip(" ").startswith("\n\n")
+
+    text = "word " * 10 + "Ends here. " + "tail " * 8
+    start, end = chunking_utility.split_spans(text, 16, 0)[0]
+    assert text[start:end].endswith("Ends here.")
+
+def test_overlap_near_chunk_size_terminates():
+    text = "token " * 2000
+    spans = chunking_utility.split_spans(text, 10, 9)
+    assert len(spans) < len(text)
+    assert spans[-1][1] == len(text.rstrip())
+
+def test_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        chunking_utility.split_spans("text", 0, 0)
+    with pytest.raises(ValueError):
+        chunking_utility.split_spans("text", 10, 10)
+
+def test_split_text_counts_characters():
+    text = "The quick brown fox. " * 100
+    chunks = chunking_utility.split_text(text, chunk_size=100, overlap=20)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert re.sub(r"\s+", "", "".join(chunks)).count("fox") >= 100
+    assert chunking_utility.split_text("") == []
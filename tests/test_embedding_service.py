@@ -0,0 +1,149 @@
+import asyncio
+import os
+import subprocess
+import sys
+import zlib
+import numpy as np
+import pytest
+from app.services.embedding_service import SEARCH_QUERY, EmbeddingCache, EmbeddingService, HashingEmbeddingBackend
+
+class CountingBackend(HashingEmbeddingBackend):
+    def __init__(self, dim: int = 8):
+        super().__init__(dim)
+        self.batches = []
+
+    def embed(self, texts):
+        self.batches.append(list(texts))
+        return super().embed(texts)
+
+def test_hashing_backend_is_deterministic_and_normalised():
+    backend = HashingEmbeddingBackend(dim=64)
+    first, second = backend.embed(["hybrid search with bm25", "hybrid search with bm25"])
+    assert np.allclose(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert not np.any(backend.embed([""]))
+
+def test_embed_many_deduplicates_and_caches(tmp_path):
+    backend = CountingBackend()
+    service = EmbeddingService(backend, cache_dir=str(tmp_path), max_batch=2)
+    vectors = service.embed_many(["a", "b", "a", "c"])
+    assert backend.batches == [["a", "b"], ["c"]]
+    assert vectors[0] == vectors[2]
+
+    service.embed_many(["a", "c"])
+    assert len(backend.batches) == 2
+    stats = service.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 3
+    assert stats["batch_size"]["count"] == 2 and stats["batch_size"]["buckets"]["2"] == 1
+
+def test_cache_survives_restart_and_grows(tmp_path):
+    backend = CountingBackend()
+    service = EmbeddingService(backend, cache_dir=str(tmp_path))
+    texts = [f"text {i}" for i in range(3000)]
+    expected = service.embed_many(texts)
+    service.close()
+
+    reopened_backend = CountingBackend()
+    reopened = EmbeddingService(reopened_backend, cache_dir=str(tmp_path))
+    assert reopened.embed_many(texts) == expected
+    assert reopened_backend.batches == []
+    assert reopened.cache.capacity >= 3000
+
+def test_cache_ignores_torn_index_tail(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dim=4)
+    cache.put_many([b"k" * 16], np.ones((1, 4), dtype=np.float32))
+    cache.close()
+    with open(tmp_path / "index.bin", "ab") as f:
+        f.write(b"partial")
+    reopened = EmbeddingCache.open_existing(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.get_many([b"k" * 16])[b"k" * 16].tolist() == [1.0] * 4
+
+def test_concurrent_aembed_calls_share_one_batch():
+    backend = CountingBackend()
+    service = EmbeddingService(backend, cache_dir="", max_batch=64, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(service.aembed(f"query {i}") for i in range(10)))
+
+    vectors = asyncio.run(run())
+    assert len(vectors) == 10
+    assert len(backend.batches) == 1 and len(backend.batches[0]) == 10
+
+def test_aembed_propagates_backend_errors():
+    class FailingBackend(HashingEmbeddingBackend):
+        def embed(self, texts):
+            raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(FailingBackend(), cache_dir="", max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.aembed("hello"))
+
+def test_instances_sharing_a_directory_never_reuse_rows(tmp_path):
+    apple, banana, cherry = (np.eye(4, dtype=np.float32)[i:i + 1] for i in range(3))
+    first = EmbeddingCache(str(tmp_path), dim=4)
+    second = EmbeddingCache(str(tmp_path), dim=4)
+    first.put_many([b"apple".ljust(16)], apple)
+    second.put_many([b"banana".ljust(16)], banana)
+    first.put_many([b"cherry".ljust(16), b"banana".ljust(16)], cherry.repeat(2, axis=0))
+    # Reserving its row made `second` read the record `first` appended
+    assert second.get_many([b"apple".ljust(16)])[b"apple".ljust(16)].tolist() == apple[0].tolist()
+    first.close()
+    second.close()
+
+    reopened = EmbeddingCache.open_existing(str(tmp_path))
+    assert len(reopened) == 3
+    found = reopened.get_many([b"apple".ljust(16), b"banana".ljust(16), b"cherry".ljust(16)])
+    assert found[b"apple".ljust(16)].tolist() == apple[0].tolist()
+    assert found[b"banana".ljust(16)].tolist() == banana[0].tolist()
+    assert found[b"cherry".ljust(16)].tolist() == cherry[0].tolist()
+
+def test_processes_writing_one_directory_concurrently(tmp_path):
+    # Each process grows the store past its initial capacity while the other appends
+    code = (
+        "import sys, zlib, numpy as np\n"
+        "from app.services.embedding_service import EmbeddingCache\n"
+        "cache = EmbeddingCache(sys.argv[1], dim=4, initial_capacity=8)\n"
+        "for i in range(200):\n"
+        "    key = f'{sys.argv[2]}{i}'.encode().ljust(16)\n"
+        "    cache.put_many([key], np.full((1, 4), zlib.crc32(key) % 1000, dtype=np.float32))\n"
+        "cache.close()\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [subprocess.Popen([sys.executable, "-c", code, str(tmp_path), prefix], cwd=root) for prefix in ("a", "b")]
+    assert [worker.wait() for worker in workers] == [0, 0]
+
+    reopened = EmbeddingCache.open_existing(str(tmp_path))
+    keys = [f"{prefix}{i}".encode().ljust(16) for prefix in ("a", "b") for i in range(200)]
+    assert len(reopened) == 400
+    found = reopened.get_many(keys)
+    assert all(found[key].tolist() == [zlib.crc32(key) % 1000] * 4 for key in keys)
+
+class CohereLikeBackend(CountingBackend):
+    """Embeds queries differently from documents, like Cohere's input_type."""
+    asymmetric = True
+
+    def embed(self, texts, input_type="search_document"):
+        self.batches.append((input_type, list(texts)))
+        vectors = HashingEmbeddingBackend.embed(self, texts)
+        return -vectors if input_type == "search_query" else vectors
+
+def test_query_embeddings_are_requested_and_cached_apart_from_documents(tmp_path):
+    backend = CohereLikeBackend()
+    service = EmbeddingService(backend, cache_dir=str(tmp_path), max_wait_ms=1)
+    document = service.embed("redis expiry")
+
+    async def main():
+        return await asyncio.gather(service.aembed("redis expiry", input_type=SEARCH_QUERY), service.aembed("pools"))
+
+    query, other = asyncio.run(main())
+    assert np.allclose(query, -np.asarray(document))
+    assert sorted(backend.batches) == [("search_document", ["pools"]), ("search_document", ["redis expiry"]),
+                                       ("search_query", ["redis expiry"])]
+    assert service.embed("redis expiry", SEARCH_QUERY) == query and len(backend.batches) == 3
+
+def test_symmetric_backends_share_one_cache_entry(tmp_path):
+    backend = CountingBackend()
+    service = EmbeddingService(backend, cache_dir=str(tmp_path))
+    assert service.embed("redis", SEARCH_QUERY) == service.embed("redis")
+    assert backend.batches == [["redis"]]
@@ -0,0 +1,63 @@
+from app.services.graph_retrieval import GraphRetriever, extract_entities, lucene_query
+from tests.test_search import StubNeo4j
+
+EDGES = [
+    ("Alice", "WORKS_AT", "Acme Corp"),
+    ("Acme Corp", "LOCATED_IN", "Berlin"),
+    ("Berlin", "CAPITAL_OF", "Germany"),
+    ("Bob", "KNOWS", "Alice"),
+] + [("Acme Corp", "EMPLOYS", f"Worker {i}") for i in range(10)]
+
+def test_extract_entities():
+    assert extract_entities("Who founded Acme Corp and where is Berlin?") == ["Acme Corp", "Berlin"]
+    assert extract_entities('What did "deep learning" change at OpenAI?') == ["deep learning", "OpenAI"]
+    assert extract_entities("how do transformers handle long context") == ["transformers", "handle", "long", "context"]
+    assert extract_entities("what is it?") == []
+
+def test_lucene_query_escapes_and_quotes_phrases():
+    assert lucene_query(["Acme Corp", "C++", "a:b"]) == '"Acme Corp" OR C\\+\\+ OR a\\:b'
+
+def test_multi_hop_expansion_respects_depth_and_fanout():
+    retriever = GraphRetriever(StubNeo4j(edges=EDGES), max_depth=2, max_fanout=3, cache_size=0)
+    facts = retriever.retrieve("Where does Alice work?", limit=50)
+    by_triple = {(f["subject"], f["relation"], f["object"]): f for f in facts}
+
+    assert by_triple[("Alice", "WORKS_AT", "Acme Corp")]["hops"] == 1
+    assert by_triple[("Alice", "WORKS_AT", "Acme Corp")]["score"] == 1.0
+    assert by_triple[("Acme Corp", "LOCATED_IN", "Berlin")] == {
+        "subject": "Acme Corp", "relation": "LOCATED_IN", "object": "Berlin", "score": 0.5, "hops": 2
+    }
+    # Three hops away
+    assert ("Berlin", "CAPITAL_OF", "Germany") not in by_triple
+    # Acme Corp has 12 relationships but only max_fanout of them are followed
+    assert sum(1 for f in facts if "Acme Corp" in (f["subject"], f["object"]) and f["hops"] == 2) <= 3
+    assert [f["score"] for f in facts] == sorted((f["score"] for f in facts), reverse=True)
+
+def test_scores_halve_with_each_hop():
+    retriever = GraphRetriever(StubNeo4j(edges=EDGES), max_depth=3, max_fanout=25, cache_size=0)
+    facts = {(f["subject"], f["relation"], f["object"]): f for f in retriever.retrieve("Where is Alice?", limit=50)}
+    assert facts[("Alice", "WORKS_AT", "Acme Corp")]["score"] == 1.0
+    assert facts[("Acme Corp", "LOCATED_IN", "Berlin")]["score"] == 0.5
+    assert facts[("Berlin", "CAPITAL_OF", "Germany")] == {
+        "subject": "Berlin", "relation": "CAPITAL_OF", "object": "Germany", "score": 0.25, "hops": 3
+    }
+
+def test_results_are_capped_and_cached_by_entity_set():
+    driver = StubNeo4j(edges=EDGES)
+    retriever = GraphRetriever(driver, max_depth=2, max_fanout=25)
+    first = retriever.retrieve("Acme Corp and Alice", limit=5)
+    assert len(first) == 5
+
+    again = retriever.retrieve("Tell me about Alice and Acme Corp!", limit=5)
+    assert again == first
+    assert retriever.stats()["hits"] == 1 and retriever.stats()["misses"] == 1
+    # One pooled session served the index creation and the lookup
+    assert len(driver.sessions) == 1
+    statements = driver.sessions[0].statements
+    assert sum("CREATE FULLTEXT INDEX" in s for s in statements) == 1
+    assert sum("queryNodes" in s for s in statements) == 1
+
+def test_unknown_entities_return_nothing():
+    retriever = GraphRetriever(StubNeo4j(edges=EDGES))
+    assert retriever.retrieve("Tell me about Zeus") == []
+    assert retriever.retrieve("what is it?") == []
@@ -0,0 +1,175 @@
+import json
+import os
+import pytest
+from opensearchpy.helpers import BulkIndexError
+from opensearchpy.serializer import JSONSerializer
+from app.services.ingestion import IngestionPipeline, read_documents
+from app.services.vector_store import LocalVectorStore
+
+class StubIndices:
+    def __init__(self):
+        self.created = None
+        self.settings = []
+        self.refresh_interval = None
+
+    def exists(self, index):
+        return self.created is not None
+
+    def create(self, index, body):
+        self.created = body
+
+    def get_settings(self, index, name):
+        settings = {"index": {"refresh_interval": self.refresh_interval}} if self.refresh_interval else {}
+        return {index: {"settings": settings}}
+
+    def put_settings(self, index, body):
+        self.settings.append(body["index"]["refresh_interval"])
+
+class StubTransport:
+    serializer = JSONSerializer()
+
+class StubOpenSearch:
+    """
+    Accepts _bulk requests; optionally fails once `fail_after` actions have
+    been indexed, or rejects each action with a 429 its first `rejections` times.
+    """
+    def __init__(self, fail_after: int = None, rejections: int = 0):
+        self.indices = StubIndices()
+        self.transport = StubTransport()
+        self.docs = {}
+        self.fail_after = fail_after
+        self.rejections = rejections
+        self.attempts = {}
+
+    def bulk(self, body, **kwargs):
+        lines = body.strip().split("\n")
+        if self.fail_after is not None and len(self.docs) >= self.fail_after:
+            raise ConnectionError("cluster went away")
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            meta = json.loads(action)["index"]
+            self.attempts[meta["_id"]] = self.attempts.get(meta["_id"], 0) + 1
+            if self.attempts[meta["_id"]] <= self.rejections:
+                items.append({"index": {"_id": meta["_id"], "status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+                continue
+            self.docs[meta["_id"]] = json.loads(source)
+            items.append({"index": {"_id": meta["_id"], "status": 201}})
+        return {"errors": any(item["index"]["status"] >= 300 for item in items), "items": items}
+
+def write_corpus(tmp_path, docs: int = 20):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    with open(corpus / "a.jsonl", "w") as f:
+        for i in range(docs):
+            f.write(json.dumps({"id": f"doc{i}", "text": f"document {i} " + "word " * 60, "metadata": {"n": i}}) + "\n")
+    (corpus / "b.txt").write_text("first paragraph here\n\nsecond paragraph here\n")
+    return corpus
+
+def test_read_documents_resumes_from_offset(tmp_path):
+    corpus = write_corpus(tmp_path, docs=3)
+    path = str(corpus / "a.jsonl")
+    docs = list(read_documents(path))
+    assert [doc["id"] for doc, _ in docs] == ["doc0", "doc1", "doc2"]
+    resumed = list(read_documents(path, offset=docs[0][1]))
+    assert [doc["id"] for doc, _ in resumed] == ["doc1", "doc2"]
+
+def test_pipeline_indexes_chunks_with_embeddings(tmp_path):
+    corpus = write_corpus(tmp_path)
+    client = StubOpenSearch()
+    pipeline = IngestionPipeline(
+        client, index="docs", embed=lambda texts: [[float(len(t)), 1.0] for t in texts],
+        chunk_tokens=25, overlap_tokens=5, batch_docs=4, workers=0, bulk_chunk_size=7
+    )
+    stats = pipeline.run([str(corpus)])
+
+    assert stats["docs"] == 21
+    assert stats["chunks"] == len(client.docs)
+    assert stats["failed"] == 0
+    assert client.indices.created["mappings"]["properties"]["embedding"]["dimension"] == 2
+    # No interval of its own on the index: null puts the cluster default back
+    assert client.indices.settings == ["-1", None]
+    first = client.docs["doc0:0"]
+    assert first["doc_id"] == "doc0" and first["metadata"] == {"n": 0} and len(first["embedding"]) == 2
+    assert first["start"] == 0 and first["text"].startswith("document 0")
+
+def test_pipeline_resumes_from_checkpoint(tmp_path):
+    corpus = write_corpus(tmp_path)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    failing = StubOpenSearch(fail_after=30)
+    pipeline = IngestionPipeline(failing, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=4,
+                                 workers=0, bulk_chunk_size=5, bulk_threads=1, checkpoint_path=checkpoint)
+    with pytest.raises(ConnectionError):
+        pipeline.run([str(corpus)])
+    saved = json.load(open(checkpoint))["files"]
+    assert 0 < saved[str(corpus / "a.jsonl")]["offset"]
+
+    client = StubOpenSearch()
+    client.indices.created = {}
+    resumed = IngestionPipeline(client, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=4,
+                                workers=0, checkpoint_path=checkpoint).run([str(corpus)])
+    assert 0 < resumed["docs"] < 21
+    assert set(failing.docs) | set(client.docs) >= {f"doc{i}:0" for i in range(20)}
+
+    again = IngestionPipeline(client, index="docs", workers=0, checkpoint_path=checkpoint).run([str(corpus)])
+    assert again["docs"] == 0 and again["chunks"] == 0
+
+def test_pipeline_chunks_in_process_pool(tmp_path):
+    corpus = write_corpus(tmp_path)
+    client = StubOpenSearch()
+    inline = IngestionPipeline(StubOpenSearch(), index="docs", chunk_tokens=25, overlap_tokens=5, workers=0).run([str(corpus)])
+    pooled = IngestionPipeline(client, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=3, workers=2).run([str(corpus)])
+    assert pooled["docs"] == inline["docs"] and pooled["chunks"] == inline["chunks"]
+
+def test_pipeline_writes_embeddings_to_local_vector_store(tmp_path):
+    corpus = write_corpus(tmp_path)
+    client = StubOpenSearch()
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    stats = IngestionPipeline(
+        client, index="docs", embed=lambda texts: [[float(len(t)), 1.0] for t in texts],
+        chunk_tokens=25, overlap_tokens=5, workers=0, vector_store=store
+    ).run([str(corpus)])
+
+    assert store.stats()["live"] == stats["chunks"]
+    assert "embedding" not in client.docs["doc0:0"]
+    assert "embedding" not in client.indices.created["mappings"]["properties"]
+    assert store.search([1.0, 0.0], top_k=1, filters={"n": 3})[0]["id"].startswith("doc3:")
+
+def test_refresh_interval_is_restored(tmp_path):
+    corpus = write_corpus(tmp_path, docs=2)
+    client = StubOpenSearch()
+    client.indices.refresh_interval = "30s"
+    IngestionPipeline(client, index="docs", workers=0).run([str(corpus)])
+    assert client.indices.settings == ["-1", "30s"]
+
+def test_rejected_chunks_are_retried(tmp_path):
+    corpus = write_corpus(tmp_path)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    client = StubOpenSearch(rejections=2)
+    stats = IngestionPipeline(client, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=4, workers=0,
+                              bulk_chunk_size=7, bulk_retries=2, bulk_backoff=0.001, checkpoint_path=checkpoint).run([str(corpus)])
+    assert stats["failed"] == 0 and stats["chunks"] == len(client.docs) > 0
+    assert set(client.attempts.values()) == {3}
+    assert all(entry["done"] for entry in json.load(open(checkpoint))["files"].values())
+
+def test_checkpoint_stops_at_failed_chunks(tmp_path):
+    corpus = write_corpus(tmp_path)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    overloaded = StubOpenSearch(rejections=10)
+    stats = IngestionPipeline(overloaded, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=4, workers=0,
+                              bulk_retries=1, bulk_backoff=0.001, checkpoint_path=checkpoint).run([str(corpus)])
+    assert stats["chunks"] == 0 and stats["failed"] > 0 and stats["errors"][0]["index"]["status"] == 429
+    assert not os.path.exists(checkpoint)
+
+    # Nothing was marked done, so a rerun indexes everything
+    client = StubOpenSearch()
+    client.indices.created = {}
+    rerun = IngestionPipeline(client, index="docs", chunk_tokens=25, overlap_tokens=5, batch_docs=4, workers=0,
+                              checkpoint_path=checkpoint).run([str(corpus)])
+    assert rerun["docs"] == 21 and rerun["chunks"] == stats["failed"]
+
+def test_run_stops_past_max_failures(tmp_path):
+    corpus = write_corpus(tmp_path)
+    pipeline = IngestionPipeline(StubOpenSearch(rejections=10), index="docs", chunk_tokens=25, overlap_tokens=5,
+                                 workers=0, bulk_retries=0, max_failures=5)
+    with pytest.raises(BulkIndexError):
+        pipeline.run([str(corpus)])
@@ -0,0 +1,66 @@
+from app.utils.logging import CloudWatchLogger, FileSink, iter_batches, MAX_BATCH_EVENTS, MAX_BATCH_BYTES
+
+class RecordingSink:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def send(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("throttled")
+        self.batches.append(list(events))
+
+def test_batches_respect_event_and_byte_limits():
+    events = [(i, "x") for i in range(MAX_BATCH_EVENTS + 5)]
+    assert [len(b) for b in iter_batches(events)] == [MAX_BATCH_EVENTS, 5]
+
+    big = [(i, "y" * 300_000) for i in range(5)]
+    for batch in iter_batches(big):
+        assert sum(len(m) + 26 for _, m in batch) <= MAX_BATCH_BYTES
+
+def test_flush_ships_sorted_events():
+    sink = RecordingSink()
+    logger = CloudWatchLogger(sink=sink)
+    logger._queue.extend([(3, "c"), (1, "a"), (2, "b")])
+    logger.flush()
+    assert [t for t, _ in sink.batches[0]] == [1, 2, 3]
+    assert logger.stats()["sent"] == 3
+
+def test_log_drops_when_buffer_full():
+    logger = CloudWatchLogger(sink=RecordingSink())
+    logger.max_buffer = 2
+    logger._thread = object()  # keep the shipper thread out of the test
+    for i in range(5):
+        logger.log(f"event {i}")
+    assert logger.stats()["dropped"] == 3
+    assert logger.stats()["queued"] == 2
+
+def test_send_retries_with_backoff():
+    sink = RecordingSink(failures=2)
+    logger = CloudWatchLogger(sink=sink)
+    logger.retry_backoff = 0
+    logger._queue.append((1, "a"))
+    logger.flush()
+    assert logger.stats()["sent"] == 1
+    assert logger.stats()["failed"] == 0
+
+def test_large_messages_wake_the_shipper_by_bytes():
+    logger = CloudWatchLogger(sink=RecordingSink())
+    logger._thread = object()
+    message = "z" * 200_000
+    for _ in range(5):
+        logger.log(message)
+    assert not logger._wakeup.is_set()
+    logger.log(message)
+    assert logger._wakeup.is_set()
+    logger.flush()
+    assert logger._queued_bytes == 0
+
+def test_close_flushes_and_closes_the_log_file(tmp_path):
+    path = tmp_path / "app.log"
+    logger = CloudWatchLogger(sink=FileSink(str(path)))
+    logger._queue.append((1, "[INFO] shutting down"))
+    logger.close()
+    assert path.read_text() == "1 [INFO] shutting down\n"
+    assert logger.sink.stream.closed
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+from app.services.mcp_server import MCPServer
+
+def make_tool(name, code, **options):
+    schema = {"type": "object", "properties": {}}
+    if options:
+        schema["x-mcp"] = options
+    return SimpleNamespace(name=name, description=name, schema=schema, code=code)
+
+def test_tool_options_are_stripped_from_llm_schema():
+    mcp = MCPServer(None)
+    metadata = mcp._register_tools([make_tool("heavy", "def heavy():\n    return 1", cpu_bound=True)])
+    assert "x-mcp" not in metadata[0]["parameters"]
+    assert mcp.tool_options["heavy"] == {"cpu_bound": True}
+
+def test_call_tools_runs_concurrently_and_keeps_order():
+    mcp = MCPServer(None)
+    mcp._register_tools([
+        make_tool("slow", "def slow(x):\n    import time\n    time.sleep(0.2)\n    return x"),
+        make_tool("fast", "async def fast(x):\n    return x * 2"),
+    ])
+    calls = [
+        {"name": "slow", "args": {"x": 1}, "id": "a"},
+        {"name": "fast", "args": {"x": 2}, "id": "b"},
+        {"name": "slow", "args": {"x": 3}, "id": "c"},
+    ]
+
+    async def main():
+        # Warm the tool worker pool so its start-up cost isn't counted
+        await mcp.call_tools(calls[1:2])
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        outputs = await mcp.call_tools(calls)
+        return outputs, loop.time() - start
+
+    outputs, elapsed = asyncio.run(main())
+    assert outputs == ["1", "4", "3"]
+    assert elapsed < 0.35
+
+def test_call_tools_reports_timeouts_and_errors():
+    mcp = MCPServer(None)
+    mcp._register_tools([
+        make_tool("hang", "async def hang():\n    import asyncio\n    await asyncio.sleep(5)", timeout=0.05),
+        make_tool("broken", "def broken():\n    raise RuntimeError('boom')"),
+    ])
+    outputs = asyncio.run(mcp.call_tools([
+        {"name": "hang", "args": {}, "id": "a"},
+        {"name": "broken", "args": {}, "id": "b"},
+    ]))
+    assert outputs[0] == "Error: tool hang timed out"
+    assert "boom" in outputs[1]
+
+class ScriptedLLM:
+    """Records the history of every call and answers from a script."""
+    def __init__(self, replies):
+        self.replies = iter(replies)
+        self.seen = []
+
+    async def ainvoke(self, messages, config=None):
+        self.seen.append(list(messages))
+        return next(self.replies)
+
+def test_tool_results_reach_the_planner_with_their_calls():
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+    from app.services.agents.super_agent import SuperAgent
+
+    mcp = MCPServer(None, sandbox=False, result_cache=None)
+    mcp._register_tools([make_tool("double", "def double(x):\n    return x * 2")])
+    calls = [{"name": "double", "args": {"x": 2}, "id": "a"}, {"name": "double", "args": {"x": 5}, "id": "b"}]
+    agent = SuperAgent.__new__(SuperAgent)
+    agent.retrieval = None
+    agent.mcp = mcp
+    agent.llm = agent.llm_with_tools = ScriptedLLM([
+        AIMessage(content="", tool_calls=calls), AIMessage(content="4 and 10"), AIMessage(content="done")
+    ])
+    agent.workflow = agent._create_workflow()
+
+    system, question = SystemMessage(content="be brief"), HumanMessage(content="double 2 and 5")
+    asyncio.run(agent.workflow.ainvoke({"messages": [system, question], "context": {}}))
+
+    # plan -> execute_tools -> plan: the second planner call still has the task and the tool_use its results answer
+    _, replanned, _ = agent.llm.seen
+    assert [type(m) for m in replanned] == [SystemMessage, HumanMessage, AIMessage, ToolMessage, ToolMessage]
+    assert replanned[1].content == question.content and replanned[2].tool_calls[0]["id"] == "a"
+    assert [(m.tool_call_id, m.content) for m in replanned[3:]] == [("a", "4"), ("b", "10")]
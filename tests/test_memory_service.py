@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models.models import Memory, MemoryTier
+from app.services.memory_service import HotMemoryCache, MemoryService, MemoryWriter
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Memory.__table__.create(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    engine.statements = statements
+    return engine
+
+@pytest.fixture
+def service(engine):
+    db = sessionmaker(bind=engine)()
+    writer = MemoryWriter(bind=engine, batch_size=50, flush_interval=60)
+    yield MemoryService(db, writer=writer, hot=HotMemoryCache(max_sessions=8, ttl=60), write_behind=True)
+    db.close()
+
+def count_rows(service):
+    return service.db.query(Memory).count()
+
+def test_writes_are_batched_and_visible_before_flush(service, engine):
+    for i in range(120):
+        service.add_memory(f"s{i % 3}", MemoryTier.SHORT_TERM, {"query": f"q{i}"})
+    asyncio.run(service.aadd_memory("s0", MemoryTier.LONG_TERM, {"query": "last"}))
+
+    assert len(service.get_memories("s0")) == 41
+    service.writer.flush()
+    assert count_rows(service) == 121
+    # One executemany per batch of at most 50 rows, whether the thread or flush() ran it
+    stats = service.writer.stats()
+    inserts = [statement for statement in engine.statements if statement.startswith("INSERT")]
+    assert stats["written"] == 121 and 3 <= stats["batches"] == len(inserts)
+    assert len(service.get_memories("s0")) == 41
+    assert service.writer.pending("s0") == []
+
+def test_temp_tier_is_served_from_the_hot_cache(service, engine):
+    service.add_memory("hot", MemoryTier.TEMP, {"query": "one"})
+    service.writer.flush()
+    assert [m.content["query"] for m in service.get_memories("hot", MemoryTier.TEMP)] == ["one"]
+
+    selects = len([s for s in engine.statements if s.startswith("SELECT")])
+    service.add_memory("hot", MemoryTier.TEMP, {"query": "two"})
+    assert [m.content["query"] for m in service.get_memories("hot", MemoryTier.TEMP)] == ["one", "two"]
+    assert len([s for s in engine.statements if s.startswith("SELECT")]) == selects
+    assert service.hot.stats()["hits"] == 1
+
+def test_purge_deletes_expired_rows_in_chunks(service):
+    past = datetime.utcnow() - timedelta(hours=1)
+    service.db.add_all(
+        [Memory(session_id="old", tier=MemoryTier.TEMP, content={}, expires_at=past) for _ in range(25)]
+        + [Memory(session_id="new", tier=MemoryTier.TEMP, content={}, expires_at=datetime.utcnow() + timedelta(hours=1))]
+        + [Memory(session_id="kept", tier=MemoryTier.LONG_TERM, content={}, expires_at=None)]
+    )
+    service.db.commit()
+
+    assert service.purge_expired(batch_size=10, max_batches=2) == 20
+    assert service.purge_expired(batch_size=10) == 5
+    assert sorted(m.session_id for m in service.db.query(Memory)) == ["kept", "new"]
+
+def test_lookup_uses_the_composite_index(engine):
+    indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("memories")}
+    assert indexes["ix_memories_session_tier_expires"] == ["session_id", "tier", "expires_at"]
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM memories WHERE session_id = 's' AND tier = 'TEMP' AND expires_at > '2024-01-01'"
+        ).fetchall()
+    assert "ix_memories_session_tier_expires" in str(plan)
+
+def test_write_through_mode_commits_immediately(engine):
+    db = sessionmaker(bind=engine)()
+    service = MemoryService(db, writer=MemoryWriter(bind=engine), hot=HotMemoryCache(), write_behind=False)
+    service.add_memory("s", MemoryTier.TEMP, {"query": "q"})
+    assert count_rows(service) == 1 and service.writer.stats()["queued"] == 0
+    db.close()
+
+def test_identical_content_is_stored_once_per_tier(service):
+    for _ in range(3):
+        service.add_memory("s", MemoryTier.SHORT_TERM, {"query": "same", "response": "answer"})
+    service.add_memory("s", MemoryTier.LONG_TERM, {"response": "answer", "query": "same"})
+    service.writer.flush()
+    assert service.writer.stats()["failed"] == 0
+    assert sorted(m.tier.value for m in service.db.query(Memory)) == ["long_term", "short_term"]
+
+def test_promotion_is_set_based_and_idempotent(service, engine):
+    for i in range(7):
+        service.add_memory("a", MemoryTier.SHORT_TERM, {"query": f"q{i}"})
+    service.add_memory("a", MemoryTier.LONG_TERM, {"query": "q0"})
+    service.add_memory("b", MemoryTier.SHORT_TERM, {"query": "b0"})
+    service.add_memory("c", MemoryTier.SHORT_TERM, {"query": "c0"})
+    service.writer.flush()
+    engine.statements.clear()
+
+    # 8 source rows in chunks of 3 -> 3 INSERT ... SELECT statements; q0 is already long-term
+    assert service.promote_sessions(["a", "b"], MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM, chunk_size=3) == 7
+    assert len([s for s in engine.statements if s.startswith("INSERT INTO memories") and "SELECT" in s]) == 3
+    assert not [s for s in engine.statements if s.startswith("INSERT") and "SELECT" not in s]
+
+    long_term = service.db.query(Memory).filter(Memory.tier == MemoryTier.LONG_TERM)
+    assert sorted(m.content["query"] for m in long_term) == ["b0"] + [f"q{i}" for i in range(7)]
+    assert all(m.expires_at is None for m in long_term)
+    sources = service.db.query(Memory).filter(Memory.tier == MemoryTier.SHORT_TERM, Memory.session_id.in_(["a", "b"]))
+    assert all(m.promoted_at is not None for m in sources)
+
+    assert service.promote_memory("a", MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM) == 0
+    assert service.promote_sessions(None, MemoryTier.SHORT_TERM, MemoryTier.LONG_TERM) == 1
+    assert long_term.count() == 9
+
+def test_pending_sees_each_row_once_while_flushing(engine):
+    writer = MemoryWriter(bind=engine, batch_size=1, flush_interval=60)
+    for i in range(300):
+        writer._queue.append(MemoryService._row("s", MemoryTier.SHORT_TERM, {"query": f"q{i}"}))
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    seen = []
+    while flusher.is_alive():
+        with writer.commit_lock:
+            with engine.connect() as conn:
+                committed = conn.exec_driver_sql("SELECT COUNT(*) FROM memories").scalar()
+            seen.append(committed + len(writer.pending("s")))
+    flusher.join()
+    assert set(seen) <= {300} and writer.stats()["written"] == 300
+
+def test_hot_cache_skips_contents_the_db_dedupes(service):
+    service.add_memory("hot", MemoryTier.TEMP, {"query": "one"})
+    service.get_memories("hot", MemoryTier.TEMP)
+    service.add_memory("hot", MemoryTier.TEMP, {"query": "one"})
+    service.add_memory("hot", MemoryTier.TEMP, {"query": "two"})
+    service.writer.flush()
+
+    cached = [m.content["query"] for m in service.get_memories("hot", MemoryTier.TEMP)]
+    assert cached == ["one", "two"]
+    assert sorted(m.content["query"] for m in service.db.query(Memory)) == cached
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from app.services.mcp_server import MCPServer
+from app.utils.metrics import GRAPH_NODE_SECONDS, instrument_engine, timed
+from app.utils.profiling import ProfilerMiddleware
+
+def count(name, **labels):
+    return REGISTRY.get_sample_value(f"{name}_count", labels) or 0
+
+def test_timed_wraps_sync_and_async_functions_and_blocks():
+    before = count("llmops_graph_node_seconds", node="test_node")
+
+    @timed(GRAPH_NODE_SECONDS, "test_node")
+    def sync_node(state):
+        return state
+
+    @timed(GRAPH_NODE_SECONDS, "test_node")
+    async def async_node(state):
+        await asyncio.sleep(0.01)
+        return state
+
+    assert sync_node(1) == 1 and asyncio.run(async_node(2)) == 2
+    with timed(GRAPH_NODE_SECONDS, "test_node"):
+        pass
+    assert count("llmops_graph_node_seconds", node="test_node") == before + 3
+    assert REGISTRY.get_sample_value("llmops_graph_node_seconds_sum", {"node": "test_node"}) >= 0.01
+
+def test_engine_statements_are_timed_by_verb():
+    engine = instrument_engine(instrument_engine(create_engine("sqlite://")))
+    before = {operation: count("llmops_db_query_seconds", operation=operation) for operation in ("select", "insert", "other")}
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+        conn.execute(text("SELECT x FROM t")).all()
+    # Instrumenting twice doesn't double count
+    assert count("llmops_db_query_seconds", operation="select") == before["select"] + 1
+    assert count("llmops_db_query_seconds", operation="insert") == before["insert"] + 1
+    assert count("llmops_db_query_seconds", operation="other") == before["other"] + 1
+
+def test_tool_calls_are_timed_by_outcome():
+    mcp = MCPServer(None, sandbox=False, result_cache=None)
+    mcp._register_tools([
+        SimpleNamespace(name="metric_echo", description="", code="def metric_echo(x):\n    return x",
+                        schema={"type": "object", "properties": {"x": {"type": "integer"}}}),
+        SimpleNamespace(name="metric_boom", description="", code="def metric_boom():\n    raise ValueError('boom')",
+                        schema={"type": "object", "properties": {}}),
+    ])
+    asyncio.run(mcp.call_tools([{"name": "metric_echo", "args": {"x": 1}, "id": "a"},
+                                {"name": "metric_boom", "args": {}, "id": "b"}]))
+    assert count("llmops_tool_call_seconds", tool="metric_echo", outcome="skipped") == 1
+    assert count("llmops_tool_call_seconds", tool="metric_boom", outcome="error") == 1
+
+def test_metrics_endpoint_reports_requests_by_route_template():
+    from app.main import app
+    client = TestClient(app)
+    assert client.get("/health/live").status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    assert 'llmops_http_request_seconds_count{method="GET",route="/health/live",status="200"}' in response.text
+    assert "llmops_graph_node_seconds_bucket" in response.text
+
+def test_samples_from_several_workers_are_merged(tmp_path):
+    # Separate processes stand in for uvicorn workers sharing PROMETHEUS_MULTIPROC_DIR
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run(code):
+        return subprocess.run([sys.executable, "-c", code], env=env, cwd=root, check=True,
+                              capture_output=True, text=True).stdout
+
+    for _ in range(2):
+        run("from app.utils.metrics import GRAPH_NODE_SECONDS; GRAPH_NODE_SECONDS.labels('worker').observe(0.1)")
+    exposition = run("from app.utils.metrics import render_metrics; print(render_metrics()[0].decode())")
+    assert 'llmops_graph_node_seconds_count{node="worker"} 2.0' in exposition
+
+def profiled_app(enabled=True):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        await asyncio.sleep(0.02)
+        return {"item_id": item_id}
+
+    app.add_middleware(ProfilerMiddleware, enabled=enabled)
+    return TestClient(app)
+
+def test_profiler_is_opt_in_per_request():
+    client = profiled_app()
+    assert client.get("/items/1").json() == {"item_id": 1}
+    response = client.get("/items/1", headers={"X-Profile": "text"})
+    assert response.headers["x-profiled-status"] == "200"
+    assert "read_item" in response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    assert profiled_app(enabled=False).get("/items/1", headers={"X-Profile": "html"}).json() == {"item_id": 1}
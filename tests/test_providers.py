@@ -0,0 +1,44 @@
+import asyncio
+import os
+import subprocess
+import sys
+from app.core.providers import ServiceRegistry
+
+class FakeCache:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+def test_lazy_service_builds_on_first_use():
+    registry = ServiceRegistry()
+    builds = []
+    cache = registry.register("cache", lambda: builds.append(1) or FakeCache())
+
+    assert not registry.is_initialized("cache")
+    assert cache.get("missing") is None  # forwarded, not the proxy's own method
+    assert cache.store == {}
+    assert len(builds) == 1
+    assert registry.is_initialized("cache")
+
+def failing_probe(instance):
+    raise ConnectionError("refused")
+
+def test_warm_up_and_readiness_report_failures():
+    registry = ServiceRegistry()
+    registry.register("ok", FakeCache)
+    registry.register("down", FakeCache, probe=failing_probe)
+
+    errors = asyncio.run(registry.warm_up())
+    assert errors == {"ok": None, "down": None}
+
+    status = asyncio.run(registry.readiness(timeout=1))
+    assert status["ok"]["ready"] is True
+    assert status["down"] == {"ready": False, "error": "refused", "latency_ms": status["down"]["latency_ms"]}
+
+def test_importing_app_does_not_touch_backends():
+    env = dict(os.environ, DATABASE_URL="postgresql://user:pw@127.0.0.1:1/none", REDIS_URL="redis://127.0.0.1:1/0")
+    env.pop("AWS_DEFAULT_REGION", None)
+    result = subprocess.run([sys.executable, "-c", "import app.main"], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import pytest
+import app.services.search_service as search_module
+from app.services.agents.sub_agents import RerankingAgent
+from app.services.reranker import LexicalReranker, Reranker
+from app.services.search_service import SearchService
+from app.utils.chunking import truncate_tokens
+from tests.test_search import StubEmbedder, StubNeo4j, StubOpenSearch
+
+class CountingModel(LexicalReranker):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def score(self, query, passages):
+        self.batches.append(list(passages))
+        return super().score(query, passages)
+
+HITS = [
+    {"id": "a", "text": "Redis is an in-memory data structure store."},
+    {"id": "b", "text": "Use EXPIRE key seconds, or SET key value EX seconds, to give a Redis key a time to live."},
+    {"id": "c", "text": "Swimming pools should be chlorinated regularly."},
+]
+
+def test_lexical_reranker_orders_by_relevance():
+    ranked = Reranker(LexicalReranker(), prior_weight=0.0).rerank("set an expire time on a redis key", HITS)
+    assert [hit["id"] for hit in ranked] == ["b", "a", "c"]
+    assert ranked[0]["rerank_score"] > ranked[1]["rerank_score"] > ranked[2]["rerank_score"]
+    assert ranked[0]["text"] == HITS[1]["text"]
+
+def test_prior_keeps_first_stage_order_on_ties():
+    hits = [{"id": str(i), "text": "identical passage"} for i in range(3)]
+    assert [hit["id"] for hit in Reranker(LexicalReranker()).rerank("passage", hits)] == ["0", "1", "2"]
+
+def test_passages_are_truncated_to_the_token_budget():
+    model = CountingModel()
+    text = "filler " * 100 + "redis expire"
+    Reranker(model, max_tokens=10).rerank("redis expire", [{"id": "x", "text": text}])
+    assert model.batches == [[truncate_tokens(text, 10)]]
+    assert model.batches[0][0] == "filler " * 9 + "filler"
+
+class PairwiseModel:
+    """Scores each pair on its own, like a cross-encoder, so scores can be cached."""
+    name = "pairwise"
+    cacheable = True
+
+    def __init__(self):
+        self.batches = []
+
+    def score(self, query, passages):
+        self.batches.append(list(passages))
+        terms = set(query.lower().split())
+        return [float(len(terms & set(passage.lower().rstrip(".").split()))) for passage in passages]
+
+def test_scores_are_cached_per_query_and_doc_id():
+    model = PairwiseModel()
+    reranker = Reranker(model)
+    first = reranker.rerank("Redis key TTL", HITS)
+    assert reranker.rerank("  redis   key ttl ", HITS) == first
+    assert len(model.batches) == 1
+    reranker.rerank("swimming pools", HITS)
+    assert len(model.batches) == 2
+    reranker.rerank("swimming pools", HITS + [{"id": "d", "text": "Pools need chlorine."}])
+    assert model.batches[-1] == ["Pools need chlorine."]
+    assert reranker.stats()["hits"] == 6 and reranker.stats()["pairs_scored"] == 7
+
+def test_lexical_scores_are_not_cached_across_batches():
+    # IDF and BM25 normalisation come from the candidate set, so the same passage scores differently
+    model = CountingModel()
+    reranker = Reranker(model, prior_weight=0.0)
+    alone = reranker.rerank("redis key", HITS[:1])[0]["rerank_score"]
+    together = {hit["id"]: hit["rerank_score"] for hit in reranker.rerank("redis key", HITS)}
+    assert len(model.batches) == 2 and together["a"] != alone
+    assert reranker.stats()["cache_size"] == 0
+
+def test_reranking_agent_keys_plain_strings_by_content():
+    model = PairwiseModel()
+    agent = RerankingAgent(Reranker(model, prior_weight=0.0))
+    agent.rerank("redis key", ["redis key ttl", "cooking pasta"])
+    ranked = agent.rerank("redis key", ["cooking pasta", "redis key ttl"])
+    assert [(hit["text"], hit["rerank_score"]) for hit in ranked] == [("redis key ttl", 2.0), ("cooking pasta", 0.0)]
+    assert not hasattr(agent, "llm")
+
+@pytest.mark.parametrize("stage", ["off", "fused", "lists"])
+def test_rerank_stage_in_search(monkeypatch, stage):
+    model = CountingModel()
+    monkeypatch.setattr(search_module, "reranker", Reranker(model))
+    monkeypatch.setattr(search_module, "RERANK_CANDIDATES", 10)
+    service = SearchService(os_client=StubOpenSearch(), neo4j_driver=StubNeo4j(), embedder=StubEmbedder())
+    result = service.hybrid_search("text d4", vector=[0.1], top_k=2, rerank=stage)
+
+    assert len(result["results"]) == 2
+    if stage == "off":
+        assert model.batches == [] and "rerank" not in result["timings_ms"]
+    elif stage == "fused":
+        # One batch over every fused candidate (d1-d4), cut to top_k afterwards
+        assert [len(batch) for batch in model.batches] == [4]
+        assert result["results"][0]["id"] == "d4"
+        assert "rerank" in result["timings_ms"]
+    else:
+        # Each backend list is reranked on its own before fusion
+        assert [len(batch) for batch in model.batches] == [3, 3]
+        assert "rerank" in result["timings_ms"]
+
+def test_unknown_stage_is_rejected():
+    service = SearchService(os_client=StubOpenSearch(), neo4j_driver=StubNeo4j(), embedder=StubEmbedder())
+    with pytest.raises(ValueError):
+        service.hybrid_search("text", vector=[0.1], rerank="sometimes")
+
+class ThreadRecordingModel(CountingModel):
+    def score(self, query, passages):
+        self.threads = getattr(self, "threads", []) + [threading.current_thread()]
+        return super().score(query, passages)
+
+def test_rerank_runs_off_the_event_loop(monkeypatch):
+    model = ThreadRecordingModel()
+    monkeypatch.setattr(search_module, "reranker", Reranker(model))
+    service = SearchService(os_client=StubOpenSearch(), neo4j_driver=StubNeo4j(), embedder=StubEmbedder())
+    asyncio.run(service.amulti_search(["text d4"], vectors=[[0.1]], top_k=2, rerank="fused"))
+    assert model.threads and threading.main_thread() not in model.threads
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from app.services.agents.sub_agents import ExpansionCache, RetrievalAgent, retrieval_options
+from app.services.agents.super_agent import SuperAgent
+from app.services.search_service import SearchService
+from tests.test_search import StubEmbedder, StubNeo4j, StubOpenSearch
+
+class StubLLM:
+    def __init__(self, content="1. redis key expiry\n2. \"set a TTL on a redis key\"\n- Redis key expiry\n3. EXPIRE command", fail=False):
+        self.content = content
+        self.fail = fail
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("throttled")
+        return SimpleNamespace(content=self.content)
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+def make_agent(llm=None, **kwargs):
+    os_client = StubOpenSearch()
+    search = SearchService(os_client=os_client, neo4j_driver=StubNeo4j(), embedder=StubEmbedder())
+    agent = RetrievalAgent(llm=llm or StubLLM(), search=search, cache=ExpansionCache(max_size=16, ttl=60), **kwargs)
+    return agent, os_client
+
+def test_short_queries_skip_expansion():
+    agent, _ = make_agent(min_words=4)
+    result = agent.retrieve("redis ttl", rerank="off")
+    assert agent.llm.calls == 0
+    assert result["queries"] == ["redis ttl"] and result["expansion"] == "skipped"
+
+def test_expansions_are_cleaned_cached_and_searched_together():
+    agent, os_client = make_agent()
+    query = "how do I expire a redis key"
+    result = asyncio.run(agent.aretrieve(query, top_k=3, rerank="off"))
+
+    assert result["queries"] == [query, "redis key expiry", "set a TTL on a redis key", "EXPIRE command"]
+    assert result["expansion"] == "llm"
+    # Every BM25 and kNN list of every phrasing in one _msearch round trip, fused into unique hits
+    assert os_client.round_trips == 1
+    assert {"bm25:3", "vector:3", "graph:3"} <= set(result["sources"])
+    ids = [hit["id"] for hit in result["results"]]
+    assert len(ids) == 3 and len(set(ids)) == 3
+    assert {"expand", "search", "fusion", "total"} <= set(result["timings_ms"])
+
+    again = agent.retrieve("  How do I EXPIRE a redis key ", rerank="off")
+    assert agent.llm.calls == 1
+    assert again["expansion"] == "cached" and again["queries"] == result["queries"]
+    assert agent.cache.stats()["hits"] == 1
+
+def test_failed_expansion_falls_back_to_the_question():
+    agent, _ = make_agent(llm=StubLLM(fail=True))
+    result = agent.retrieve("how do I expire a redis key", rerank="off")
+    assert result["queries"] == ["how do I expire a redis key"]
+    assert result["expansion"] == "failed" and result["errors"]["expand"] == "throttled"
+    assert result["partial"] and result["results"]
+
+def test_retrieval_options_from_agent_config():
+    assert retrieval_options({"retrieval": {"expand": False, "top_k": 8}})["top_k"] == 8
+    assert retrieval_options({"retrieval": {"enabled": False}})["enabled"] is False
+
+def test_retrieve_node_grounds_the_planner():
+    retrieval, _ = make_agent()
+    agent = SuperAgent.__new__(SuperAgent)
+    agent.retrieval = retrieval
+    agent.retrieval_options = {"enabled": True, "expand": True, "top_k": 2}
+    agent.search_options = {"rerank": "off"}
+
+    question = HumanMessage(content="how do I expire a redis key")
+    update = asyncio.run(agent.retrieve_node({"messages": [question], "context": {}}))
+
+    # Only the new message: the add_messages reducer appends it to the history
+    grounding, = update["messages"]
+    assert isinstance(grounding, SystemMessage) and "[1] text d" in grounding.content
+    retrieval_context = update["context"]["retrieval"]
+    assert len(retrieval_context["sources"]) == 2 and len(retrieval_context["queries"]) == 4
+    assert "expand" in retrieval_context["timings_ms"]
+
+class RecordingLLM:
+    """Chat model stand-in that records the history of every call and answers from a script."""
+    def __init__(self, replies):
+        self.replies = iter(replies)
+        self.seen = []
+
+    async def ainvoke(self, messages, config=None):
+        self.seen.append(list(messages))
+        return next(self.replies)
+
+def test_compiled_graph_keeps_the_question_and_grounding():
+    retrieval, _ = make_agent()
+    agent = SuperAgent.__new__(SuperAgent)
+    agent.retrieval = retrieval
+    agent.retrieval_options = {"enabled": True, "expand": True, "top_k": 2}
+    agent.search_options = {"rerank": "off"}
+    agent.llm = agent.llm_with_tools = RecordingLLM([AIMessage(content="plan"), AIMessage(content="answer")])
+    agent.workflow = agent._create_workflow()
+
+    question = HumanMessage(content="how do I expire a redis key")
+    result = asyncio.run(agent.workflow.ainvoke({"messages": [question], "context": {}}))
+
+    planned, synthesized = agent.llm.seen
+    assert [type(m).__name__ for m in planned] == ["SystemMessage", "HumanMessage"]
+    # synthesize sees the grounding, the question and the plan, with the system message first
+    assert [type(m).__name__ for m in synthesized] == ["SystemMessage", "HumanMessage", "AIMessage"]
+    assert "[1] text d" in synthesized[0].content and synthesized[1].content == question.content
+    assert [m.content for m in result["messages"]] == [question.content, synthesized[0].content, "plan", "answer"]
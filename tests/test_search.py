@@ -1,12 +1,250 @@
+import asyncio
+import time
 import pytest
-from app.services.search_service import SearchService
+import app.services.search_service as search_module
+from app.services.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from app.services.search_service import SearchService, search_options
+
+class StubOpenSearch:
+    def __init__(self, delay: float = 0.0, fail_knn: bool = False):
+        self.delay = delay
+        self.fail_knn = fail_knn
+        self.bodies = []
+        self.params = []
+        self.round_trips = 0
+
+    def search(self, index, body, params=None):
+        self.round_trips += 1
+        self.params.append(params)
+        time.sleep(self.delay)
+        return self._response(body)
+
+    def msearch(self, body, params=None):
+        self.round_trips += 1
+        self.params.append(params)
+        time.sleep(self.delay)
+        return {"responses": [self._response(item) for item in body[1::2]]}
+
+    def _response(self, body):
+        self.bodies.append(body)
+        if "knn" in body["query"]:
+            if self.fail_knn:
+                return {"error": {"reason": "knn unavailable"}}
+            ids = ["d2", "d3", "d4"]
+        else:
+            ids = ["d1", "d2", "d3"]
+        return {"hits": {"hits": [
+            {"_id": doc_id, "_score": 10.0 - i, "_source": {"text": f"text {doc_id}"}} for i, doc_id in enumerate(ids)
+        ]}}
+
+class StubSession:
+    """Answers GraphRetriever's seed and expand statements from a list of (subject, relation, object) edges."""
+    def __init__(self, delay: float, edges):
+        self.delay = delay
+        self.edges = edges
+        self.statements = []
+
+    def execute_read(self, work, *args):
+        time.sleep(self.delay)
+        return work(self, *args)
+
+    def run(self, cypher, **params):
+        self.statements.append(cypher)
+        return StubResult(self._rows(cypher, params))
+
+    def _rows(self, cypher, params):
+        if cypher.startswith("CREATE"):
+            return []
+        if "queryNodes" in cypher:
+            terms = {term.strip('"').lower() for term in params["search"].split(" OR ")}
+            names = {name for edge in self.edges for name in (edge[0], edge[2]) if name.lower() in terms}
+            return [StubRecord({"id": name, "name": name, "score": 2.0}) for name in sorted(names)][:params["limit"]]
+        rows = []
+        for node in params["frontier"]:
+            touching = [edge for edge in self.edges if node in (edge[0], edge[2])][:params["fanout"]]
+            for subject, relation, obj in touching:
+                outgoing = subject == node
+                rows.append(StubRecord({
+                    "from_id": node, "to_id": obj if outgoing else subject, "name": node,
+                    "relation": relation, "neighbour": obj if outgoing else subject, "outgoing": outgoing
+                }))
+        return rows[:params["limit"]]
+
+    def close(self):
+        pass
+
+class StubResult(list):
+    def consume(self):
+        pass
+
+class StubRecord:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return self._data
+
+class StubNeo4j:
+    def __init__(self, delay: float = 0.0, edges=(("Alice", "KNOWS", "Bob"),)):
+        self.delay = delay
+        self.edges = list(edges)
+        self.sessions = []
+
+    def session(self, **kwargs):
+        self.sessions.append(StubSession(self.delay, self.edges))
+        return self.sessions[-1]
+
+    def close(self):
+        pass
+
+class StubEmbedder:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+        self.input_types = []
+
+    def embed_many(self, texts, input_type="search_document"):
+        self.calls.append(list(texts))
+        self.input_types.append(input_type)
+        if self.fail:
+            raise RuntimeError("bedrock throttled")
+        return [[0.5, 0.5] for _ in texts]
+
+    async def aembed_many(self, texts, input_type="search_document"):
+        return self.embed_many(texts, input_type)
+
+@pytest.fixture(autouse=True)
+def stub_embedder(monkeypatch):
+    embedder = StubEmbedder()
+    monkeypatch.setattr(search_module, "embedding_service", embedder)
+    return embedder
+
+@pytest.fixture(autouse=True)
+def fusion_only(monkeypatch):
+    # These tests check fusion order; tests/test_reranker.py covers the rerank stages
+    monkeypatch.setattr(search_module, "RERANK_STAGE", "off")
 
 def test_search_init():
     service = SearchService()
     assert service.os_client is not None
     assert service.neo4j_driver is not None
 
-# These would require running services or better mocks
-def test_hybrid_search_structure():
-    # Structural check only
-    pass
+def test_rrf_deduplicates_and_rewards_agreement():
+    ranked = {
+        "bm25": [{"id": "a", "score": 9.0}, {"id": "b", "score": 5.0}],
+        "vector": [{"id": "b", "score": 0.9}, {"id": "c", "score": 0.8}],
+    }
+    results = reciprocal_rank_fusion(ranked, weights={"bm25": 1.0, "vector": 1.0}, top_k=5)
+    assert [hit["id"] for hit in results] == ["b", "a", "c"]
+    assert results[0]["sources"] == {"bm25": 5.0, "vector": 0.9}
+
+def test_weighted_fusion_respects_weights():
+    ranked = {
+        "bm25": [{"id": "a", "score": 9.0}, {"id": "b", "score": 1.0}],
+        "vector": [{"id": "b", "score": 0.9}, {"id": "a", "score": 0.1}],
+    }
+    results = weighted_score_fusion(ranked, weights={"bm25": 0.2, "vector": 1.0}, top_k=1)
+    assert [hit["id"] for hit in results] == ["b"]
+
+def test_search_options_merge_agent_weights():
+    options = search_options({"search": {"fusion": "weighted", "weights": {"graph": 0.0}}})
+    assert options["fusion"] == "weighted"
+    assert options["weights"]["graph"] == 0.0
+    assert options["weights"]["bm25"] == 1.0
+    assert options["rerank"] == "off"
+
+def test_hybrid_search_fuses_backends_with_source_filtering():
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    result = service.hybrid_search("alice", vector=[0.1, 0.2], top_k=3)
+
+    ids = [hit["id"] for hit in result["results"]]
+    assert len(ids) == len(set(ids)) == 3
+    assert ids[0] == "d2"
+    assert result["sources"] == {"bm25": 3, "vector": 3, "graph": 1}
+    assert not result["partial"]
+    assert all("embedding" not in body["_source"] for body in os_client.bodies)
+
+def test_hybrid_search_skips_zero_weight_backends(stub_embedder):
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    result = service.hybrid_search("alice", top_k=3, weights={"bm25": 1.0, "vector": 0.0, "graph": 0.0})
+    assert result["sources"] == {"bm25": 3}
+    assert len(os_client.bodies) == 1
+    assert os_client.round_trips == 1
+    assert stub_embedder.calls == []
+
+def test_hybrid_search_embeds_queries_without_vectors(stub_embedder):
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    result = service.multi_search(["alice", "who is alice"], [[0.1]], top_k=3)
+    assert stub_embedder.calls == [["who is alice"]]
+    assert {"vector:0", "vector:1"} <= set(result["sources"])
+    assert "embed" in result["timings_ms"]
+
+    result = asyncio.run(service.ahybrid_search("bob", top_k=3))
+    assert stub_embedder.calls[-1] == ["bob"]
+    assert "vector" in result["sources"]
+    assert stub_embedder.input_types == ["search_query", "search_query"]
+
+def test_embedding_failure_degrades_to_lexical(monkeypatch):
+    service = SearchService(os_client=StubOpenSearch(), neo4j_driver=StubNeo4j(), embedder=StubEmbedder(fail=True))
+    result = service.hybrid_search("alice", top_k=3)
+    assert result["partial"]
+    assert "embed" in result["errors"]
+    assert result["sources"] == {"bm25": 3, "graph": 1}
+
+def test_hybrid_search_returns_partial_results_on_timeout():
+    service = SearchService(os_client=StubOpenSearch(), neo4j_driver=StubNeo4j(delay=0.5))
+    service.timeouts["graph"] = 0.05
+    start = time.perf_counter()
+    result = service.hybrid_search("alice", vector=[0.1], top_k=3)
+    assert time.perf_counter() - start < 0.4
+    assert result["partial"]
+    assert "graph" in result["errors"]
+    assert len(result["results"]) == 3
+
+def test_ahybrid_search_runs_backends_concurrently():
+    service = SearchService(os_client=StubOpenSearch(delay=0.1), neo4j_driver=StubNeo4j(delay=0.1))
+    start = time.perf_counter()
+    result = asyncio.run(service.ahybrid_search("alice", vector=[0.1], top_k=3))
+    assert time.perf_counter() - start < 0.25
+    assert result["sources"] == {"bm25": 3, "vector": 3, "graph": 1}
+
+def test_msearch_mode_sends_bm25_and_knn_in_one_round_trip():
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    service.mode = "msearch"
+    result = service.hybrid_search("alice", vector=[0.1], top_k=3)
+    assert os_client.round_trips == 1
+    assert result["sources"] == {"bm25": 3, "vector": 3, "graph": 1}
+
+    service.mode = "separate"
+    service.hybrid_search("alice", vector=[0.1], top_k=3)
+    assert os_client.round_trips == 3
+
+def test_multi_search_batches_expansions_into_one_msearch(stub_embedder):
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    service.mode = "msearch"
+    result = service.multi_search(["alice", "who is alice", "alice bob"], [[0.1]], top_k=3)
+    assert os_client.round_trips == 1
+    assert stub_embedder.calls == [["who is alice", "alice bob"]]
+    assert set(result["sources"]) == {f"{source}:{i}" for source in ("bm25", "vector", "graph") for i in range(3)}
+    assert len({hit["id"] for hit in result["results"]}) == 3
+
+def test_msearch_item_error_only_drops_its_list():
+    service = SearchService(os_client=StubOpenSearch(fail_knn=True), neo4j_driver=StubNeo4j())
+    service.mode = "msearch"
+    result = service.hybrid_search("alice", vector=[0.1], top_k=3)
+    assert result["errors"] == {"vector": "knn unavailable"}
+    assert result["sources"] == {"bm25": 3, "graph": 1}
+
+def test_hybrid_mode_sends_one_hybrid_query():
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j())
+    service.mode = "hybrid"
+    result = service.hybrid_search("alice", vector=[0.1], top_k=3)
+    assert os_client.round_trips == 1
+    assert "hybrid" in os_client.bodies[0]["query"]
+    assert result["sources"] == {"hybrid": 3, "graph": 1}
@@ -0,0 +1,127 @@
+import asyncio
+import numpy as np
+from app.utils.semantic_cache import SemanticCache
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_semantic_hit_on_similar_embedding():
+    cache = SemanticCache(threshold=0.9, max_entries=10)
+    base = np.random.default_rng(0).normal(size=64)
+    run(cache.set("agent-1", base, {"response": "cached"}))
+
+    paraphrase = base + np.random.default_rng(1).normal(scale=0.05, size=64)
+    assert run(cache.get("agent-1", paraphrase)) == {"response": "cached"}
+    assert run(cache.get("agent-1", -base)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_semantic_namespaces_are_per_agent():
+    cache = SemanticCache(threshold=0.9)
+    vector = np.ones(8)
+    run(cache.set("agent-1", vector, {"response": "a"}))
+    assert run(cache.get("agent-2", vector)) is None
+
+def test_semantic_lru_eviction():
+    cache = SemanticCache(threshold=0.99, max_entries=2)
+    a, b, c = np.eye(3)
+    run(cache.set("agent", a, {"response": "a"}))
+    run(cache.set("agent", b, {"response": "b"}))
+    run(cache.get("agent", a))  # a is now most recently used
+    run(cache.set("agent", c, {"response": "c"}))
+
+    assert run(cache.get("agent", a)) == {"response": "a"}
+    assert run(cache.get("agent", b)) is None
+    assert cache.stats()["entries"]["agent"] == 2
+
+class StubRedis:
+    """The hash and sorted-set commands SemanticCache uses, keeping bytes like redis.asyncio."""
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            async def execute(self):
+                for name, args in self.calls:
+                    await getattr(redis, name)(*args)
+
+        return Pipeline()
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[self._bytes(field)] = self._bytes(value)
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(self._bytes(field))
+
+    async def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(self._bytes(field)) for field in fields]
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(self._bytes(field), None)
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update({self._bytes(member): score for member, score in mapping.items()})
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(self._bytes(member), None)
+
+    async def zrange(self, key, start, end, withscores=False):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.zsets.pop(key, None)
+
+def test_entries_expire_on_their_own(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.utils.semantic_cache.time.time", lambda: clock[0])
+    redis = StubRedis()
+    cache = SemanticCache(redis, threshold=0.99, expire=60)
+    a, b = np.eye(2)
+    run(cache.set("agent", a, {"response": "a"}))
+    clock[0] += 50
+    # A write to the namespace doesn't extend older entries
+    run(cache.set("agent", b, {"response": "b"}))
+    clock[0] += 20
+
+    assert run(cache.get("agent", a)) is None
+    assert run(cache.get("agent", b)) == {"response": "b"}
+    assert cache.stats()["entries"]["agent"] == 1
+    assert len(redis.hashes["semcache:agent:data"]) == len(redis.zsets["semcache:agent:created"]) == 1
+
+def test_reload_keeps_the_newest_unexpired_entries(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.utils.semantic_cache.time.time", lambda: clock[0])
+    redis = StubRedis()
+    writer = SemanticCache(redis, threshold=0.99, max_entries=10, expire=100)
+    vectors = np.eye(5)
+    for i, vector in enumerate(vectors):
+        run(writer.set("agent", vector, {"response": i}))
+        clock[0] += 30
+    # Hash order says nothing about age
+    for key in ("semcache:agent:vec", "semcache:agent:data"):
+        redis.hashes[key] = dict(reversed(list(redis.hashes[key].items())))
+
+    # Entries 0 and 1 are over 100s old; of the rest only the newest two fit
+    restarted = SemanticCache(redis, threshold=0.99, max_entries=2, expire=100)
+    assert [run(restarted.get("agent", vector)) for vector in vectors] == [None, None, None, {"response": 3}, {"response": 4}]
+    assert len(redis.zsets["semcache:agent:created"]) == len(redis.hashes["semcache:agent:vec"]) == 2
@@ -0,0 +1,158 @@
+import json
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessageChunk
+from app.api.v1.endpoints import rag
+from app.db.session import get_async_db
+from app.services.agents import super_agent as super_agent_module
+from app.services.agents.super_agent import SYNTHESIZE_TAG, StreamMetrics, SuperAgent
+
+class StubGraph:
+    """Replays a fixed astream_events sequence, optionally raising after `fail_after` events."""
+    def __init__(self, events, fail_after: int = None):
+        self.events = events
+        self.fail_after = fail_after
+
+    async def astream_events(self, state, config, version):
+        for i, event in enumerate(self.events):
+            if i == self.fail_after:
+                raise RuntimeError("bedrock throttled")
+            yield event
+
+def node(kind, name, **data):
+    return {"event": kind, "name": name, "tags": [], "data": data}
+
+def token(text):
+    return {"event": "on_chat_model_stream", "name": "ChatBedrock", "tags": [SYNTHESIZE_TAG],
+            "data": {"chunk": AIMessageChunk(content=text)}}
+
+EVENTS = [
+    node("on_chain_start", "plan_and_tool", input={}),
+    {"event": "on_chat_model_stream", "name": "ChatBedrock", "tags": [], "data": {"chunk": AIMessageChunk(content="plan")}},
+    node("on_chain_end", "plan_and_tool", output={"messages": []}),
+    node("on_chain_start", "synthesize", input={}),
+    token("Hello"),
+    token(" world"),
+    node("on_chain_end", "synthesize", output={"messages": []}),
+]
+
+@pytest.fixture
+def stubs(monkeypatch):
+    cached = {}
+
+    async def get(key):
+        return cached.get(key)
+
+    logged, rows = [], []
+    monkeypatch.setattr(super_agent_module, "cache_service", SimpleNamespace(
+        get=get, semantic_enabled=False, generate_cache_key=lambda query, agent_id: f"{agent_id}:{query}"
+    ))
+    monkeypatch.setattr(super_agent_module, "cloudwatch_logger", SimpleNamespace(log=lambda message, level: logged.append(level)))
+    monkeypatch.setattr(super_agent_module, "execution_log_writer", SimpleNamespace(add=rows.append))
+    return SimpleNamespace(cached=cached, logged=logged, rows=rows)
+
+def make_agent(events, fail_after=None):
+    agent = SuperAgent.__new__(SuperAgent)
+    agent.llm = SimpleNamespace(model_id="stub-model")
+    agent.workflow = StubGraph(events, fail_after)
+
+    async def store_result(session_id, agent_id, query, cache_key, query_embedding, answer, context, usage):
+        return {"answer": answer, "context": context, "usage": usage}
+
+    agent._store_result = store_result
+    return agent
+
+def make_client(monkeypatch, agent):
+    async def aget_super_agent(db, agent_id):
+        return agent
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(rag, "aget_super_agent", aget_super_agent)
+    app = FastAPI()
+    app.include_router(rag.router)
+    app.dependency_overrides[get_async_db] = no_db
+    return TestClient(app)
+
+def parse_sse(body):
+    events = []
+    for frame in body.split("\n\n"):
+        if frame:
+            event, data = frame.split("\n")
+            assert event.startswith("event: ") and data.startswith("data: ")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def without_metrics(events):
+    return [(event, {k: v for k, v in data.items() if k != "metrics"}) for event, data in events]
+
+def post_stream(client, fmt):
+    return client.post(f"/query/stream?format={fmt}", json={"query": "hi", "session_id": "s", "agent_id": "a"})
+
+def test_sse_framing_and_final_event(stubs, monkeypatch):
+    response = post_stream(make_client(monkeypatch, make_agent(EVENTS)), "sse")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.text.endswith("\n\n")
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["step", "step", "step", "token", "token", "step", "done"]
+    assert events[0][1] == {"node": "plan_and_tool", "status": "start"}
+    # Only the synthesize node's tokens are streamed
+    assert [data["text"] for event, data in events if event == "token"] == ["Hello", " world"]
+    done = events[-1][1]
+    assert done["answer"] == "Hello world" and done["cached"] is False
+    assert done["usage"] == {"input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+    assert len(stubs.rows) == 1
+
+def test_ndjson_framing_matches_sse(stubs, monkeypatch):
+    client = make_client(monkeypatch, make_agent(EVENTS))
+    response = post_stream(client, "ndjson")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.split("\n")
+    assert lines[-1] == ""
+    events = [(line["event"], line["data"]) for line in map(json.loads, lines[:-1])]
+    sse = parse_sse(post_stream(client, "sse").text)
+    # Timings differ between runs; everything else is framed the same way
+    assert without_metrics(events) == without_metrics(sse)
+
+def test_unknown_format_is_rejected(stubs, monkeypatch):
+    response = post_stream(make_client(monkeypatch, make_agent(EVENTS)), "xml")
+    assert response.status_code == 400
+
+def test_graph_failure_mid_stream_ends_with_an_error_event(stubs, monkeypatch):
+    response = post_stream(make_client(monkeypatch, make_agent(EVENTS, fail_after=5)), "sse")
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["step", "step", "step", "token", "error"]
+    assert events[-1][1] == {"detail": "bedrock throttled"}
+    assert "ERROR" in stubs.logged
+    assert stubs.rows[0]["status"] == "error" and stubs.rows[0]["metrics"]["error"] == "bedrock throttled"
+
+def test_cache_hit_is_replayed_as_tokens(stubs, monkeypatch):
+    stubs.cached["a:hi"] = {"answer": "cached answer here", "context": {}, "usage": {}}
+    events = parse_sse(post_stream(make_client(monkeypatch, make_agent(EVENTS, fail_after=0)), "sse").text)
+    assert [data["text"] for event, data in events if event == "token"] == ["cached ", "answer ", "here"]
+    assert events[-1][0] == "done" and events[-1][1]["cached"] is True
+    assert events[-1][1]["metrics"]["tokens"] == 3
+
+def test_done_event_carries_stream_metrics(stubs, monkeypatch):
+    events = parse_sse(post_stream(make_client(monkeypatch, make_agent(EVENTS)), "sse").text)
+    metrics = events[-1][1]["metrics"]
+    assert set(metrics) == {"ttft_ms", "total_ms", "tokens", "tokens_per_sec"}
+    assert metrics["tokens"] == 2
+    assert 0 <= metrics["ttft_ms"] <= metrics["total_ms"]
+
+def test_stream_metrics_summary(monkeypatch):
+    clock = iter([1.25, 1.5, 2.0])
+    monkeypatch.setattr(super_agent_module.time, "perf_counter", lambda: next(clock))
+    metrics = StreamMetrics(start=1.0)
+    assert metrics.summary() == {"ttft_ms": None, "total_ms": 250.0, "tokens": 0, "tokens_per_sec": None}
+    metrics.on_token()
+    metrics.on_token()
+    # 2 tokens over the 0.5s after the first one arrived
+    assert metrics.summary() == {"ttft_ms": 500.0, "total_ms": 1000.0, "tokens": 2, "tokens_per_sec": 4.0}
@@ -0,0 +1,133 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from app.services.mcp_server import MCPServer
+from app.utils import tool_cache
+from app.utils.tool_cache import ToolResultCache
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+def run(coro):
+    return asyncio.run(coro)
+
+def counter():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"rows": len(calls)}
+    return calls, call
+
+def test_memoizes_by_canonical_args_and_version():
+    cache = ToolResultCache(max_entries=10)
+    calls, call = counter()
+    assert run(cache.get_or_call("lookup", "v1", {"a": 1, "b": [1, 2]}, 60, call)) == ({"rows": 1}, "miss")
+    assert run(cache.get_or_call("lookup", "v1", {"b": [1, 2], "a": 1}, 60, call)) == ({"rows": 1}, "hit")
+    assert run(cache.get_or_call("lookup", "v2", {"a": 1, "b": [1, 2]}, 60, call))[1] == "miss"
+    assert run(cache.get_or_call("lookup", "v1", {"a": 2, "b": [1, 2]}, 60, call))[1] == "miss"
+    assert len(calls) == 3
+    assert cache.stats()["tools"]["lookup"] == {"hits": 1, "misses": 3}
+
+def test_concurrent_identical_calls_run_once():
+    cache = ToolResultCache()
+    calls, call = counter()
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_call("lookup", "v1", {"q": "x"}, 60, call) for _ in range(5)))
+
+    results = run(main())
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == ["coalesced"] * 4 + ["miss"]
+    assert cache.stats()["coalesced"] == 4
+
+def test_redis_tier_is_shared_and_entries_expire(monkeypatch):
+    redis = FakeRedis()
+    calls, call = counter()
+    run(ToolResultCache(redis).get_or_call("lookup", "v1", {"q": "x"}, 60, call))
+    other_worker = ToolResultCache(redis)
+    assert run(other_worker.get_or_call("lookup", "v1", {"q": "x"}, 60, call)) == ({"rows": 1}, "hit")
+    assert other_worker.stats()["redis_hits"] == 1
+
+    now = tool_cache.time.time()
+    monkeypatch.setattr(tool_cache.time, "time", lambda: now + 61)
+    # The local copy expires with the Redis entry (which FakeRedis doesn't expire itself)
+    redis.data.clear()
+    assert run(other_worker.get_or_call("lookup", "v1", {"q": "x"}, 60, call))[1] == "miss"
+
+def test_large_results_and_errors_are_not_cached():
+    cache = ToolResultCache(max_bytes=1024)
+    calls = []
+
+    async def big():
+        calls.append(1)
+        return os.urandom(5000).hex()
+
+    run(cache.get_or_call("dump", "v1", {}, 60, big))
+    run(cache.get_or_call("dump", "v1", {}, 60, big))
+    assert len(calls) == 2 and cache.stats()["too_large"] == 2
+
+    async def broken():
+        calls.append(1)
+        raise RuntimeError("down")
+
+    for _ in range(2):
+        try:
+            run(cache.get_or_call("flaky", "v1", {}, 60, broken))
+        except RuntimeError:
+            pass
+    assert len(calls) == 4
+
+def test_mcp_server_caches_declared_tools_and_reports_metrics():
+    cache = ToolResultCache()
+    mcp = MCPServer(None, sandbox=False, result_cache=cache)
+    mcp._register_tools([
+        SimpleNamespace(name="square", description="", code="def square(x, power=2):\n    return x ** power", schema={
+            "type": "object", "properties": {"x": {"type": "integer"}, "power": {"type": "integer", "default": 2}},
+            "x-mcp": {"cacheable": True, "cache_ttl": 60}
+        }),
+        SimpleNamespace(name="now", description="", code="def now():\n    import time\n    return time.time()",
+                        schema={"type": "object", "properties": {}}),
+    ])
+    metrics = {}
+    outputs = run(mcp.call_tools([
+        {"name": "square", "args": {"x": 3}, "id": "a"},
+        {"name": "now", "args": {}, "id": "b"},
+    ], metrics=metrics))
+    outputs += run(mcp.call_tools([
+        {"name": "square", "args": {"x": 3, "power": 2}, "id": "c"},
+        {"name": "now", "args": {}, "id": "d"},
+    ], metrics=metrics))
+    assert outputs[0] == outputs[2] == "9"
+    assert metrics["square"] == {"calls": 2, "errors": 0, "cache_hits": 1, "cache_misses": 1}
+    assert metrics["now"] == {"calls": 2, "errors": 0, "cache_hits": 0, "cache_misses": 0}
+
+def test_misses_and_hits_return_the_same_shape():
+    cache = ToolResultCache()
+
+    async def pair():
+        return {"point": (1, 2)}
+
+    first = run(cache.get_or_call("pair", "v1", {}, 60, pair))
+    second = run(cache.get_or_call("pair", "v1", {}, 60, pair))
+    assert first == ({"point": [1, 2]}, "miss") and second == ({"point": [1, 2]}, "hit")
+
+def test_unencodable_results_are_returned_but_not_cached():
+    cache = ToolResultCache()
+    calls = []
+
+    async def int_keys():
+        calls.append(1)
+        return {1: "a"}
+
+    assert run(cache.get_or_call("codes", "v1", {}, 60, int_keys)) == ({1: "a"}, "miss")
+    assert run(cache.get_or_call("codes", "v1", {}, 60, int_keys)) == ({1: "a"}, "miss")
+    assert len(calls) == 2 and cache.stats()["unencodable"] == 2
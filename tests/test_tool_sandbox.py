@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from app.services.tool_sandbox import BytecodeCache, ToolError, ToolTimeout, ToolWorkerPool
+
+cache = BytecodeCache(max_size=16)
+
+def tool(name, code):
+    return cache.get(name, name, code)
+
+ECHO = tool("echo", "def echo(value):\n    return value")
+DOUBLE = tool("double", "async def double(x):\n    return x * 2")
+
+@pytest.fixture(scope="module")
+def pool():
+    # One cached function per worker, so alternating tools exercises the resend path
+    pool = ToolWorkerPool(workers=2, max_calls=5, memory_mb=1024, cpu_seconds=10, code_cache_size=1)
+    yield pool
+    pool.close()
+
+def test_calls_round_trip_and_recycle_workers(pool):
+    for i in range(12):
+        assert pool.call(ECHO, {"value": {"i": i, "items": [1, "two"]}}) == {"i": i, "items": [1, "two"]}
+        assert pool.call(DOUBLE, {"x": i}) == 2 * i
+    assert pool.stats()["recycled"] >= 2
+    assert asyncio.run(pool.acall(DOUBLE, {"x": 21})) == 42
+
+def test_large_payloads_go_through_shared_memory(pool):
+    blob = "x" * (3 * 1024 * 1024)
+    assert pool.call(ECHO, {"value": blob}) == blob
+
+def test_errors_and_limits_are_contained(pool):
+    with pytest.raises(ToolError, match="ZeroDivisionError"):
+        pool.call(tool("div", "def div():\n    return 1 / 0"), {})
+    with pytest.raises(ToolError, match="memory"):
+        pool.call(tool("hog", "def hog():\n    return len(bytearray(900 * 1024 * 1024))"), {}, memory_mb=256)
+    with pytest.raises(ToolError, match="CPU"):
+        pool.call(tool("spin", "def spin():\n    while True:\n        pass"), {}, timeout=10, cpu_seconds=1)
+    with pytest.raises(ToolError, match="died"):
+        pool.call(tool("crash", "def crash():\n    import os\n    os._exit(1)"), {})
+    with pytest.raises(ToolTimeout):
+        pool.call(tool("hang", "def hang():\n    import time\n    time.sleep(30)"), {}, timeout=0.2)
+    stats = pool.stats()
+    assert stats["limit_kills"] == 2 and stats["crashes"] == 1 and stats["timeouts"] == 1
+    # Killed workers are replaced
+    assert pool.call(ECHO, {"value": 1}) == 1
+
+def test_bytecode_cache_keys_on_code_version():
+    local = BytecodeCache(max_size=2)
+    first = local.get("t1", "f", "def f():\n    return 1")
+    assert local.get("t1", "f", "def f():\n    return 1") is first
+    assert local.get("t1", "f", "def f():\n    return 2").key != first.key
+    assert local.stats()["hits"] == 1
+    with pytest.raises(ValueError):
+        local.get("t2", "g", "def f():\n    return 1")
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models.models import Memory, MemoryTier
+from app.services import training_export
+from app.services.training_export import BloomFilter, TrainingExporter
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Memory.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+# Older than the export lag unless a test says otherwise
+SETTLED = datetime.utcnow() - timedelta(hours=1)
+
+def add(db, prompts, tier=MemoryTier.LONG_TERM, created_at=SETTLED):
+    db.add_all([Memory(session_id="s", tier=tier, content={"query": p, "response": f"answer to {p}"}, created_at=created_at)
+                for p in prompts])
+    db.commit()
+
+def read_shards(paths):
+    lines = []
+    for path in paths:
+        with gzip.open(path, "rt") as f:
+            lines += [json.loads(line) for line in f]
+    return lines
+
+def test_export_dedups_shards_and_is_incremental(db, tmp_path):
+    # High-entropy prompts, so gzip emits blocks and the small shard cap rotates
+    prompts = [f"question number {i} " + hashlib.sha256(str(i).encode()).hexdigest() * 4 for i in range(300)]
+    add(db, prompts + ["  QUESTION   number 0 " + prompts[0].split()[-1].upper(), "no answer"])
+    db.add(Memory(session_id="s", tier=MemoryTier.LONG_TERM, content={"query": "no answer"}, created_at=SETTLED))
+    add(db, ["short-term only"], tier=MemoryTier.SHORT_TERM)
+    exporter = TrainingExporter(db, output_dir=str(tmp_path), shard_bytes=2048, workers=0, batch_rows=64, dedup_capacity=10_000)
+
+    first = exporter.run()
+    assert first["rows_read"] == 303
+    assert first["rows_written"] == 301 and first["duplicates"] == 1 and first["skipped"] == 1
+    assert len(first["shards"]) > 1 and not list(tmp_path.glob("*.part"))
+    exported = read_shards(first["shards"])
+    assert len(exported) == 301 and exported[0] == {"prompt": prompts[0], "completion": f"answer to {prompts[0]}"}
+    assert first["bytes_written"] < first["bytes_uncompressed"]
+
+    add(db, [prompts[5], "a brand new question"])
+    second = exporter.run()
+    assert second["rows_read"] == 2 and second["rows_written"] == 1
+    assert [line["prompt"] for line in read_shards(second["shards"])] == ["a brand new question"]
+    assert exporter.run()["rows_read"] == 0
+    assert exporter.run(full=True)["rows_written"] == 302
+
+def test_failed_export_leaves_no_shards_or_watermark(db, tmp_path, monkeypatch):
+    add(db, [f"q{i}" for i in range(50)])
+    exporter = TrainingExporter(db, output_dir=str(tmp_path), shard_bytes=64, workers=0, batch_rows=10, dedup_capacity=1000)
+
+    calls = []
+    def failing(rows):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("disk full")
+        return training_export._format_records(rows)
+    monkeypatch.setattr(training_export, "_format_records", failing)
+    with pytest.raises(RuntimeError):
+        exporter.run()
+    assert not list(tmp_path.iterdir())
+
+    monkeypatch.undo()
+    assert exporter.run()["rows_written"] == 50
+
+def test_process_pool_matches_inline(db, tmp_path):
+    add(db, [f"q{i % 40}" for i in range(120)])
+    inline = TrainingExporter(db, output_dir=str(tmp_path / "inline"), workers=0, batch_rows=16, dedup_capacity=1000).run()
+    pooled = TrainingExporter(db, output_dir=str(tmp_path / "pool"), workers=2, batch_rows=16, dedup_capacity=1000).run()
+    assert read_shards(inline["shards"]) == read_shards(pooled["shards"])
+    assert pooled["rows_written"] == 40
+
+def test_bloom_filter_persists(tmp_path):
+    bloom = BloomFilter(capacity=1000)
+    digests = [bytes([i]) * 16 for i in range(10)]
+    assert bloom.add_new(digests + digests[:2]) == [True] * 10 + [False] * 2
+    bloom.save(str(tmp_path / "bloom.npy"))
+    loaded = BloomFilter.load(str(tmp_path / "bloom.npy"))
+    assert loaded.hashes == bloom.hashes and loaded.add_new(digests[:1] + [b"x" * 16]) == [False, True]
+
+def test_zstd_shards(db, tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    add(db, ["Hello", "hello ", "world"])
+    summary = TrainingExporter(db, output_dir=str(tmp_path), compression="zstd", workers=0, dedup_capacity=1000).run()
+    assert summary["shards"][0].endswith(".jsonl.zst")
+    with open(summary["shards"][0], "rb") as f:
+        lines = zstandard.ZstdDecompressor().stream_reader(f).read().decode().splitlines()
+    assert [json.loads(line)["prompt"] for line in lines] == ["Hello", "world"]
+
+def test_rows_committed_out_of_id_order_are_not_skipped(db, tmp_path):
+    add(db, ["q1", "q2"])
+    # id 4 commits while id 3 is still in another writer's transaction
+    db.add(Memory(id=4, session_id="s", tier=MemoryTier.LONG_TERM, content={"query": "q4", "response": "a"},
+                  created_at=datetime.utcnow()))
+    db.commit()
+    exporter = TrainingExporter(db, output_dir=str(tmp_path), workers=0, dedup_capacity=1000, lag=60)
+    first = exporter.run()
+    assert first["rows_read"] == 2 and first["watermark"] == 2
+
+    db.add(Memory(id=3, session_id="s", tier=MemoryTier.LONG_TERM, content={"query": "q3", "response": "a"},
+                  created_at=datetime.utcnow()))
+    db.commit()
+    # Once both are older than the lag, the next run exports them in id order
+    exporter.lag = 0
+    second = exporter.run()
+    assert [line["prompt"] for line in read_shards(second["shards"])] == ["q3", "q4"]
+    assert second["watermark"] == 4
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models.models import ExecutionLog
+from app.services.agents import super_agent as super_agent_module
+from app.services.agents.super_agent import SuperAgent
+from app.utils.cost_management import CostManager
+from app.utils.usage import ExecutionLogWriter, PriceTable, execution_row
+
+PRICES = PriceTable({"test-model": {"input": 1.0, "output": 2.0}})
+
+def reply(content="", tool_calls=None, input_tokens=100, output_tokens=10):
+    return AIMessage(content=content, tool_calls=tool_calls or [], usage_metadata={
+        "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens
+    })
+
+def test_price_table_lookup():
+    prices = PriceTable({"custom.model-v1": {"input": 0.5, "output": 1.0}})
+    assert prices.cost("custom.model-v1", 1000, 2000) == 2.5
+    # Cross-region inference profiles are priced as the underlying model
+    assert prices.cost("us.anthropic.claude-3-haiku-20240307-v1:0", 1000, 1000) == 0.0015
+    assert prices.cost("unknown.model", 1000, 1000) is None
+
+class StubMCP:
+    async def call_tools(self, tool_calls, metrics=None):
+        return ["42" for _ in tool_calls]
+
+def test_run_usage_is_attributed_to_nodes_and_logged(monkeypatch):
+    agent = SuperAgent.__new__(SuperAgent)
+    agent.llm = agent.llm_with_tools = GenericFakeChatModel(messages=iter([
+        reply(tool_calls=[{"name": "lookup", "args": {}, "id": "call-1"}]),
+        reply(),
+        reply("the answer", input_tokens=300, output_tokens=50),
+    ]))
+    agent.llm.__dict__["model_id"] = "test-model"
+    agent.retrieval = None
+    agent.mcp = StubMCP()
+    agent.workflow = agent._create_workflow()
+    rows = []
+    monkeypatch.setattr(super_agent_module, "execution_log_writer", SimpleNamespace(add=rows.append))
+    monkeypatch.setattr(super_agent_module.cloudwatch_logger, "log", lambda *args, **kwargs: None)
+
+    initial_state, config, usage = agent._prepare_run("session", "agent", "what is it?")
+    usage.prices = PRICES
+    result = asyncio.run(agent.workflow.ainvoke(initial_state, config=config))
+    payload_usage = agent._record_usage("session", "agent", "what is it?", result["messages"][-1].content, usage, config)
+
+    assert payload_usage == {"input_tokens": 500, "output_tokens": 70, "cost_usd": 0.64}
+    nodes = usage.summary()["nodes"]
+    assert nodes["plan_and_tool"]["llm_calls"] == 2 and nodes["plan_and_tool"]["runs"] == 2
+    assert nodes["synthesize"]["input_tokens"] == 300 and nodes["synthesize"]["cost_usd"] == 0.4
+    assert nodes["execute_tools"] == {"runs": 1, "latency_ms": nodes["execute_tools"]["latency_ms"], "llm_calls": 0,
+                                      "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+    row, = rows
+    assert row["status"] == "ok" and row["plan"] == [["lookup"]] and row["cost_usd"] == 0.64
+    assert row["trace_id"] == config["metadata"]["trace_id"] and len(row["metrics"]["calls"]) == 3
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    ExecutionLog.__table__.create(engine)
+    return engine
+
+def usage(input_tokens, output_tokens, cost, latency):
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "cost_usd": cost, "latency_ms": latency}
+
+def test_writer_batches_rows_and_usage_is_aggregated():
+    engine = make_engine()
+    writer = ExecutionLogWriter(bind=engine, batch_size=2)
+    now = datetime.utcnow()
+    for i in range(5):
+        writer.add(execution_row("agent", "s", "q", "a", usage(100, 10, 0.01, 100.0 * (i + 1))))
+    writer.add(execution_row("agent", "s", "q", None, usage(50, 0, 0.001, 50.0), error="throttled"))
+    writer.add(execution_row("other", "s", "q", "a", usage(999, 999, 9.0, 1.0)))
+    old = execution_row("agent", "s", "q", "a", usage(999, 999, 9.0, 1.0))
+    old["created_at"] = now - timedelta(days=90)
+    writer.add(old)
+    writer.flush()
+    assert writer.stats() == {"queued": 0, "written": 8, "failed": 0, "batches": 4}
+
+    with sessionmaker(bind=engine)() as db:
+        metrics = CostManager(db).get_usage_metrics("agent", end=now + timedelta(minutes=1))
+        assert metrics["requests"] == 6 and metrics["errors"] == 1
+        assert metrics["input_tokens"] == 550 and metrics["tokens_used"] == 600
+        assert metrics["estimated_cost"] == 0.051
+        assert metrics["avg_latency_ms"] == 258.33 and metrics["max_latency_ms"] == 500.0
+        assert CostManager(db).get_usage_metrics("missing")["requests"] == 0
+
+def test_usage_query_uses_the_agent_time_index():
+    engine = make_engine()
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT count(*), sum(cost_usd) FROM execution_logs "
+            "WHERE agent_id = 'a' AND created_at >= '2024-01-01' AND created_at < '2024-02-01'"
+        )).all()
+    assert "ix_execution_logs_agent_created" in " ".join(str(row) for row in plan)
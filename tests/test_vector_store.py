@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import app.services.search_service as search_module
+from app.services.search_service import SearchService
+from app.services.vector_store import LocalVectorStore, VectorStore
+from tests.test_search import StubEmbedder, StubNeo4j, StubOpenSearch
+
+def clustered(n: int, dim: int = 16, clusters: int = 32, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+def brute_force(vectors, query, k):
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return set(np.argsort(-(normed @ (query / np.linalg.norm(query))))[:k])
+
+def test_exact_search_before_training():
+    vectors = clustered(200)
+    store = LocalVectorStore(dim=16, train_threshold=1000)
+    store.add([str(i) for i in range(200)], vectors, [f"text {i}" for i in range(200)])
+    hits = store.search(vectors[7], top_k=5)
+    assert hits[0]["id"] == "7" and hits[0]["text"] == "text 7"
+    assert {int(hit["id"]) for hit in hits} == brute_force(vectors, vectors[7], 5)
+    assert not store.stats()["trained"]
+
+def test_ivf_recall_after_auto_training():
+    vectors = clustered(5000)
+    store = LocalVectorStore(dim=16, nprobe=8, train_threshold=4000)
+    for start in range(0, 5000, 1000):
+        store.add([str(i) for i in range(start, start + 1000)], vectors[start:start + 1000])
+    assert store.stats()["trained"]
+    queries = clustered(50, seed=1)
+    recall = np.mean([
+        len({int(hit["id"]) for hit in store.search(query, top_k=10)} & brute_force(vectors, query, 10)) / 10
+        for query in queries
+    ])
+    assert recall >= 0.9
+
+def test_delete_and_overwrite_use_tombstones():
+    vectors = clustered(100)
+    store = LocalVectorStore(dim=16)
+    store.add([str(i) for i in range(100)], vectors)
+    store.delete(["3"])
+    assert "3" not in {hit["id"] for hit in store.search(vectors[3], top_k=10)}
+    store.add(["4"], vectors[50], ["moved"])
+    hits = store.search(vectors[50], top_k=2)
+    assert {hit["id"] for hit in hits} == {"4", "50"}
+    assert store.stats()["tombstones"] == 2
+
+    store.compact()
+    assert store.stats()["rows"] == 99 and store.stats()["tombstones"] == 0
+    assert {hit["text"] for hit in store.search(vectors[50], top_k=2)} == {"moved", ""}
+
+@pytest.mark.parametrize("train_threshold", [10_000, 1000])
+def test_metadata_filter_pre_pass(train_threshold):
+    vectors = clustered(2000)
+    store = LocalVectorStore(dim=16, train_threshold=train_threshold)
+    store.add(
+        [str(i) for i in range(2000)], vectors,
+        metadatas=[{"tenant": f"t{i % 4}", "lang": "en" if i % 2 else "de"} for i in range(2000)]
+    )
+    hits = store.search(vectors[5], top_k=10, filters={"tenant": "t1", "lang": "en"})
+    assert hits and all(int(hit["id"]) % 4 == 1 for hit in hits)
+    assert hits[0]["id"] == "5"
+    either = store.search(vectors[5], top_k=50, filters={"tenant": ["t0", "t2"]})
+    assert all(int(hit["id"]) % 2 == 0 for hit in either)
+    assert store.search(vectors[5], filters={"tenant": "missing"}) == []
+
+def test_persistence_round_trip(tmp_path):
+    vectors = clustered(3000)
+    store = LocalVectorStore(str(tmp_path), dim=16, train_threshold=2000)
+    store.add([str(i) for i in range(3000)], vectors, metadatas=[{"even": i % 2 == 0} for i in range(3000)])
+    store.delete(["10"])
+    expected = store.search(vectors[11], top_k=5)
+    store.close()
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.dim == 16 and reopened.stats()["trained"]
+    assert reopened.stats()["live"] == 2999
+    assert reopened.search(vectors[11], top_k=5) == expected
+    reopened.add(["new"], vectors[10])
+    assert reopened.search(vectors[10], top_k=1)[0]["id"] == "new"
+    assert reopened.search(vectors[12], top_k=3, filters={"even": True})[0]["id"] == "12"
+
+def test_local_store_replaces_the_knn_leg(monkeypatch):
+    monkeypatch.setattr(search_module, "SEARCH_MODE", "msearch")
+    vectors = clustered(10, dim=2)
+    store = LocalVectorStore(dim=2)
+    store.add([f"d{i}" for i in range(10)], vectors, [f"local {i}" for i in range(10)])
+    os_client = StubOpenSearch()
+    service = SearchService(os_client=os_client, neo4j_driver=StubNeo4j(), embedder=StubEmbedder(), vector_store=store)
+
+    result = service.hybrid_search("alice", top_k=3, filters={"lang": "en"})
+    assert result["sources"]["vector"] == 0
+    assert all("knn" not in body["query"] for body in os_client.bodies)
+    assert os_client.bodies[0]["query"]["bool"]["filter"] == [{"terms": {"metadata.lang": ["en"]}}]
+
+    result = service.hybrid_search("alice", vector=vectors[4].tolist(), top_k=3)
+    assert result["sources"]["vector"] == 3
+    assert "d4" in {hit["id"] for hit in result["results"]}
+
+def test_backend_missing_methods_cannot_be_built():
+    class AddOnly(VectorStore):
+        def add(self, ids, vectors, texts=None, metadatas=None):
+            pass
+
+    with pytest.raises(TypeError, match="delete"):
+        AddOnly()
+    with pytest.raises(TypeError):
+        VectorStore()